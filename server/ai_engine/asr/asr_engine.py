@@ -1,36 +1,34 @@
 import numpy as np
 import os
 from typing import Union
-from collections import deque
-import time
 from faster_whisper import WhisperModel
 
 class ASREngine:
-    def __init__(self, model_size: str = "base.en"):
+    def __init__(self, model_size: str = "base.en", num_workers: int = 1, cpu_threads: int = 0):
         # Faster Whisper handles device selection automatically relative to availability
         # On Mac, it uses CTranslate2 which is optimized for CPU/Arm
         device = "cpu" 
         compute_type = "int8" # Quantization for speed
         
+        # num_workers > 1 lets that many transcribe() calls run in parallel on one model,
+        # each using cpu_threads threads (0 = CTranslate2's default)
         print(f"Loading Faster Whisper model '{model_size}' on {device} with {compute_type}...")
         try:
-             self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
+             self.model = WhisperModel(model_size, device=device, compute_type=compute_type,
+                                       cpu_threads=cpu_threads, num_workers=num_workers)
              print("✓ Faster Whisper model loaded successfully.")
         except Exception as e:
              print(f"Error loading Faster Whisper: {e}")
              print("Falling back to tiny.en...")
-             self.model = WhisperModel("tiny.en", device=device, compute_type=compute_type)
-
-        # Cache for smoother transcription
-        self.last_transcript = ""
-        self.last_transcript_time = 0
-        self.transcript_cache = deque(maxlen=3)
+             self.model = WhisperModel("tiny.en", device=device, compute_type=compute_type,
+                                       cpu_threads=cpu_threads, num_workers=num_workers)
         
-    def transcribe_audio_chunk(self, audio_data: Union[np.ndarray, str]) -> str:
+    def transcribe_audio_chunk(self, audio_data: Union[np.ndarray, str], vad_filter: bool = True) -> str:
         """
         Transcribe audio chunk using Faster Whisper.
         Args:
             audio_data: Numpy array (float32) or file path
+            vad_filter: Skip silence with Whisper's VAD; off for audio that is already speech only
         """
         try:
             if not isinstance(audio_data, str):
@@ -49,20 +47,81 @@ class ASREngine:
                 beam_size=1,
                 language="en",
                 condition_on_previous_text=False, # Disable for short chunks to prevent hallucinations
-                vad_filter=True, # Enable VAD to skip silence
+                vad_filter=vad_filter, # Enable VAD to skip silence
                 vad_parameters=dict(min_silence_duration_ms=500)
             )
             
             # Combine segments
-            text = " ".join([segment.text for segment in segments]).strip()
-            
-            if text:
-                self.transcript_cache.append(text)
-                self.last_transcript = text
-                self.last_transcript_time = time.time()
-                
-            return text
+            return " ".join([segment.text for segment in segments]).strip()
 
         except Exception as e:
             print(f"Transcription error: {e}")
             return ""
+
+    def transcribe_segments(self, audio_data: np.ndarray, vad_filter: bool = True) -> list:
+        """
+        Transcribe audio and return (start, end, text) segments, times in seconds
+        from the start of audio_data. Pass vad_filter=False for audio that was
+        already cut at speech boundaries.
+        """
+        try:
+            if len(audio_data) == 0: return []
+            if audio_data.dtype != np.float32:
+                audio_data = audio_data.astype(np.float32)
+            
+            # Normalize
+            max_val = np.abs(audio_data).max()
+            if max_val > 0:
+                audio_data = audio_data / max_val * 0.95
+
+            segments, info = self.model.transcribe(
+                audio_data,
+                beam_size=1,
+                language="en",
+                condition_on_previous_text=False,
+                vad_filter=vad_filter,
+                vad_parameters=dict(min_silence_duration_ms=500)
+            )
+            return [(segment.start, segment.end, segment.text.strip()) for segment in segments if segment.text.strip()]
+
+        except Exception as e:
+            print(f"Transcription error: {e}")
+            return []
+
+    def transcribe_words(self, audio_data: np.ndarray, prompt: str = None, vad_filter: bool = True) -> list:
+        """
+        Transcribe audio with word timestamps for streaming decoding.
+        Returns a list of (start, end, word) tuples, times in seconds from the start of audio_data.
+        """
+        try:
+            if len(audio_data) == 0: return []
+            if audio_data.dtype != np.float32:
+                audio_data = audio_data.astype(np.float32)
+            
+            # Normalize
+            max_val = np.abs(audio_data).max()
+            if max_val > 0:
+                audio_data = audio_data / max_val * 0.95
+
+            segments, info = self.model.transcribe(
+                audio_data,
+                beam_size=1,
+                language="en",
+                initial_prompt=prompt or None,
+                condition_on_previous_text=False,
+                word_timestamps=True,
+                vad_filter=vad_filter,
+                vad_parameters=dict(min_silence_duration_ms=500)
+            )
+            
+            words = []
+            for segment in segments:
+                for word in segment.words or []:
+                    text = word.word.strip()
+                    if text:
+                        words.append((word.start, word.end, text))
+            return words
+
+        except Exception as e:
+            print(f"Transcription error: {e}")
+            return []
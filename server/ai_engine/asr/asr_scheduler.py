@@ -0,0 +1,155 @@
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import os
+import queue
+import threading
+import numpy as np
+
+from .asr_engine import ASREngine
+
+# Job priorities (lower runs first). Live subtitle passes always jump ahead of
+# finalizing the transcript of a session that has ended.
+PRIORITY_LIVE = 0
+PRIORITY_FINAL = 1
+
+ASR_MODEL_SIZE = os.getenv("ASR_MODEL_SIZE", "base.en")
+# Model replicas (CTranslate2 workers) and worker threads; at most this many
+# transcriptions run at once across all sessions
+ASR_REPLICAS = int(os.getenv("ASR_REPLICAS", "2"))
+# Threads per replica; by default the cores are split between replicas so
+# concurrent sessions don't oversubscribe the CPU
+ASR_CPU_THREADS = int(os.getenv("ASR_CPU_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, ASR_REPLICAS)))))
+
+
+class ASRScheduler:
+    """
+    Shared Whisper model for all ASR sessions.
+
+    Loads one ASREngine with `replicas` CTranslate2 workers and drives it from
+    as many worker threads, taking jobs from a priority queue. Jobs are plain
+    functions called as fn(engine, *args, **kwargs), so ASREngine methods can
+    be submitted unchanged. Jobs tagged with a session run one at a time for
+    that session; later jobs of a busy session wait without holding a worker.
+    """
+
+    def __init__(self, model_size: str = ASR_MODEL_SIZE, replicas: int = ASR_REPLICAS, cpu_threads: int = ASR_CPU_THREADS):
+        self.model_size = model_size
+        self.replicas = max(1, replicas)
+        self.cpu_threads = cpu_threads
+        self.engine = None
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._active_sessions = set()
+        self._waiting = {}  # session -> deque of queue items parked until it is free
+
+    @property
+    def ready(self) -> bool:
+        return self.engine is not None
+
+    def start(self):
+        """Load and warm up the model, then start the worker threads (idempotent)."""
+        with self._start_lock:
+            if self._threads:
+                return
+
+            if self.engine is None:
+                self.engine = ASREngine(model_size=self.model_size, num_workers=self.replicas, cpu_threads=self.cpu_threads)
+                # Run a dummy transcription to initialize CPU kernels before real traffic
+                self.engine.transcribe_audio_chunk(np.zeros(16000, dtype=np.float32))
+
+            for i in range(self.replicas):
+                thread = threading.Thread(target=self._worker, name=f"asr-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+            print(f"✓ ASR scheduler started with {self.replicas} replica(s) x {self.cpu_threads} thread(s)")
+
+    def stop(self):
+        """Ask the workers to exit once the jobs already queued have run."""
+        with self._start_lock:
+            for _ in self._threads:
+                self._queue.put((float("inf"), next(self._sequence), None))
+            self._threads = []
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            _, _, job = item
+            if job is None:
+                return
+
+            fn, args, kwargs, future, session = job
+            if session is not None:
+                with self._lock:
+                    if session in self._active_sessions:
+                        self._waiting.setdefault(session, collections.deque()).append(item)
+                        continue
+                    self._active_sessions.add(session)
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(self.engine, *args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                if session is not None:
+                    with self._lock:
+                        self._active_sessions.discard(session)
+                        waiting = self._waiting.get(session)
+                        if waiting:
+                            # Back into the queue with its original priority and order
+                            self._queue.put(waiting.popleft())
+                            if not waiting:
+                                del self._waiting[session]
+
+    def _enqueue(self, fn, args, kwargs, priority, session) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._queue.put((priority, next(self._sequence), (fn, args, kwargs, future, session)))
+        return future
+
+    async def submit(self, fn, *args, session=None, priority: int = PRIORITY_LIVE, **kwargs):
+        """Run fn(engine, *args, **kwargs) on an ASR worker and await the result."""
+        self.start()
+        return await asyncio.wrap_future(self._enqueue(fn, args, kwargs, priority, session))
+
+    def run(self, fn, *args, session=None, priority: int = PRIORITY_FINAL, **kwargs):
+        """Blocking variant of submit() for worker threads and background tasks."""
+        self.start()
+        return self._enqueue(fn, args, kwargs, priority, session).result()
+
+    def session(self, key=None, priority: int = PRIORITY_LIVE) -> "ASRSession":
+        return ASRSession(self, key, priority)
+
+
+class ASRSession:
+    """
+    ASREngine-like handle whose transcribe calls run on the scheduler as jobs
+    of one session (key=None: no per-session limit). Calls block, so it can
+    stand in for an ASREngine in code running on a worker thread. Set
+    `priority` to PRIORITY_FINAL once the session is only finalizing.
+    """
+
+    def __init__(self, scheduler: ASRScheduler, key=None, priority: int = PRIORITY_LIVE):
+        self.scheduler = scheduler
+        self.key = key
+        self.priority = priority
+
+    def transcribe_audio_chunk(self, *args, **kwargs):
+        return self.scheduler.run(ASREngine.transcribe_audio_chunk, *args, session=self.key, priority=self.priority, **kwargs)
+
+    def transcribe_words(self, *args, **kwargs):
+        return self.scheduler.run(ASREngine.transcribe_words, *args, session=self.key, priority=self.priority, **kwargs)
+
+    def transcribe_segments(self, *args, **kwargs):
+        return self.scheduler.run(ASREngine.transcribe_segments, *args, session=self.key, priority=self.priority, **kwargs)
+
+
+asr_scheduler = ASRScheduler()
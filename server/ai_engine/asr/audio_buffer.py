@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size window over the most recent float32 samples of a stream.
+
+    Storage is preallocated at twice the capacity and every sample is written
+    at both i and i + capacity, so the current window is always one contiguous
+    slice and window() returns a view instead of concatenating chunks. The sum
+    of squares is updated as samples enter and leave, so rms() is O(1).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=np.float32)
+        self._start = 0   # index of the oldest sample, in [0, capacity)
+        self._length = 0
+        self._sum_squares = 0.0
+        self._writes = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, chunk: np.ndarray):
+        if len(chunk) >= self.capacity:
+            # Only the newest `capacity` samples survive
+            chunk = chunk[-self.capacity:]
+            self._start = 0
+            self._length = 0
+            self._sum_squares = 0.0
+
+        n = len(chunk)
+        evicted = max(0, self._length + n - self.capacity)
+        if evicted:
+            self._sum_squares -= self._energy_of(self._start, evicted)
+            self._start = (self._start + evicted) % self.capacity
+            self._length -= evicted
+
+        end = (self._start + self._length) % self.capacity
+        first = min(n, self.capacity - end)
+        self._write(end, chunk[:first])
+        self._write(0, chunk[first:])
+        self._length += n
+        self._sum_squares += float(np.dot(chunk, chunk))
+
+        # Recompute now and then so float error from the running updates can't build up
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._sum_squares = self._energy_of(self._start, self._length)
+
+    def _write(self, position: int, samples: np.ndarray):
+        n = len(samples)
+        if n:
+            self._data[position:position + n] = samples
+            self._data[position + self.capacity:position + self.capacity + n] = samples
+
+    def _energy_of(self, position: int, n: int) -> float:
+        samples = self._data[position:position + n]
+        return float(np.dot(samples, samples))
+
+    def window(self) -> np.ndarray:
+        """The buffered samples, oldest first, as a view valid until the next append()."""
+        view = self._data[self._start:self._start + self._length]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def energy(self) -> float:
+        """Sum of squared samples in the window."""
+        return max(0.0, self._sum_squares)
+
+    def rms(self) -> float:
+        return float(np.sqrt(self.energy / self._length)) if self._length else 0.0
+
+    def clear(self):
+        self._start = 0
+        self._length = 0
+        self._sum_squares = 0.0
@@ -0,0 +1,183 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Appends reach the OS immediately; fsync runs once this many entries are
+# waiting, or at most this many seconds after the first unsynced append
+CONVERSATION_LOG_FSYNC_BATCH = int(os.getenv("CONVERSATION_LOG_FSYNC_BATCH", "16"))
+CONVERSATION_LOG_FSYNC_INTERVAL = float(os.getenv("CONVERSATION_LOG_FSYNC_INTERVAL", "1.0"))
+
+
+class ConversationLog:
+    """
+    Append-only JSON Lines file of conversation entries.
+
+    Saving writes one line at the end of the file instead of rewriting the
+    whole history, under a lock so concurrent saves can't lose each other.
+    The byte offset of every line is indexed by profile_id when the file is
+    opened (one pass) and as lines are appended, so a profile's entries are
+    read with one seek per entry instead of parsing the whole file.
+    """
+
+    def __init__(self, path: str, fsync_batch: int = CONVERSATION_LOG_FSYNC_BATCH,
+                 fsync_interval: float = CONVERSATION_LOG_FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_batch = max(1, fsync_batch)
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._offsets = {}   # profile_id -> [byte offset of each line]
+        self._count = 0
+        self._unsynced = 0
+        self._sync_due = threading.Event()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._build_index()
+        self._file = open(path, "ab")
+
+        threading.Thread(target=self._sync_loop, name="conversation-log-sync", daemon=True).start()
+        atexit.register(self.sync)
+
+    def _build_index(self):
+        if not os.path.exists(self.path):
+            return
+        good_end = 0
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial last line from an interrupted write
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"⚠ Skipping unreadable line at byte {offset} of {self.path}")
+                else:
+                    self._offsets.setdefault(entry.get("profile_id"), []).append(offset)
+                    self._count += 1
+                offset += len(line)
+                good_end = offset
+        if good_end != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+            print(f"⚠ Dropped an incomplete entry at the end of {self.path}")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, entry: Dict):
+        self.extend([entry])
+
+    def extend(self, entries: List[Dict]):
+        lines = [(entry, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")) for entry in entries]
+        with self._lock:
+            offset = self._file.tell()
+            for entry, line in lines:
+                self._file.write(line)
+                self._offsets.setdefault(entry.get("profile_id"), []).append(offset)
+                offset += len(line)
+            self._file.flush()
+            self._count += len(lines)
+            self._unsynced += len(lines)
+            if self._unsynced >= self.fsync_batch:
+                self._sync_locked()
+            else:
+                self._sync_due.set()
+
+    def sync(self):
+        """fsync everything appended so far."""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._unsynced and not self._file.closed:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def _sync_loop(self):
+        while True:
+            self._sync_due.wait()
+            time.sleep(self.fsync_interval)
+            self._sync_due.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"⚠ Error syncing conversation log: {e}")
+
+    def read(self, profile_id: Optional[str] = None) -> List[Dict]:
+        """All entries in the order they were saved, optionally only one profile's."""
+        with self._lock:
+            end = self._file.tell()
+            offsets = list(self._offsets.get(profile_id, [])) if profile_id else None
+
+        entries = []
+        with open(self.path, "rb") as f:
+            if offsets is None:
+                position = 0
+                for line in f:
+                    # Stop at what was written when the read started
+                    position += len(line)
+                    if position > end:
+                        break
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+            else:
+                for offset in offsets:
+                    f.seek(offset)
+                    entries.append(json.loads(f.readline()))
+        return entries
+
+
+def migrate_json_conversations(json_path: str, log_path: str) -> int:
+    """
+    One-time move of a legacy conversations.json array into the JSONL log.
+    The log is written in full and renamed into place before the JSON file is
+    renamed to *.migrated, so an interrupted migration is simply redone.
+    Returns the number of entries migrated.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    if os.path.exists(log_path):
+        # The log was written by an earlier migration that stopped before the rename
+        os.replace(json_path, json_path + ".migrated")
+        return 0
+
+    try:
+        with open(json_path, "r") as f:
+            conversations = json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"⚠ Could not migrate {json_path}: {e}")
+        return 0
+
+    tmp_path = log_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in conversations:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, log_path)
+    os.replace(json_path, json_path + ".migrated")
+    print(f"✓ Migrated {len(conversations)} conversations from {json_path} to {log_path}")
+    return len(conversations)
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_conversation_log(path: str, legacy_json_path: Optional[str] = None) -> ConversationLog:
+    """The process-wide log for a path (all stores share one lock and index), migrating legacy JSON first."""
+    path = os.path.abspath(path)
+    with _logs_lock:
+        log = _logs.get(path)
+        if log is None:
+            if legacy_json_path:
+                migrate_json_conversations(legacy_json_path, path)
+            log = _logs[path] = ConversationLog(path)
+        return log
@@ -1,31 +1,25 @@
-import json
 import os
 from datetime import datetime, timezone
 from typing import List, Dict, Optional
 from zoneinfo import ZoneInfo
 
+from .conversation_log import get_conversation_log
+
 class ConversationStore:
-    def __init__(self, storage_path: str = None, db_session=None, chroma_collection=None):
+    def __init__(self, storage_path: str = None, db_session=None):
+        legacy_path = None
         if storage_path is None:
-            # Resolves to server/data/conversations.json
+            # Resolves to server/data/conversations.jsonl; the old conversations.json
+            # array next to it is migrated on first use
             base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            self.storage_path = os.path.join(base_dir, "data", "conversations.json")
+            self.storage_path = os.path.join(base_dir, "data", "conversations.jsonl")
+            legacy_path = os.path.join(base_dir, "data", "conversations.json")
         else:
             self.storage_path = storage_path
         
         self.db_session = db_session
-        self.chroma_collection = chroma_collection
-        self._ensure_storage()
-
-    def _ensure_storage(self):
-        """Ensure the storage file and directory exist."""
-        directory = os.path.dirname(self.storage_path)
-        if directory and not os.path.exists(directory):
-            os.makedirs(directory, exist_ok=True)
-        
-        if not os.path.exists(self.storage_path):
-            with open(self.storage_path, 'w') as f:
-                json.dump([], f)
+        # Shared by every store on this path
+        self.log = get_conversation_log(self.storage_path, legacy_json_path=legacy_path)
 
     def save_conversation(self, profile_id: str, transcript: str, user_id: int = None, contact_id: int = None) -> Dict:
         """Save a conversation entry to JSON, database, and ChromaDB with improved error handling."""
@@ -38,22 +32,18 @@ class ConversationStore:
             "transcript": transcript
         }
         
-        # Save to JSON file (backward compatibility)
+        # Append to the local conversation log (backward compatibility)
         try:
-            conversations = self._load_conversations()
-            conversations.append(entry)
-            
-            with open(self.storage_path, 'w') as f:
-                json.dump(conversations, f, indent=2)
-            print(f"✓ Saved conversation to JSON file")
+            self.log.append(entry)
+            print(f"✓ Saved conversation to local log")
         except Exception as e:
-            print(f"⚠ Error saving conversation to JSON: {e}")
+            print(f"⚠ Error saving conversation to local log: {e}")
         
         # Save to database as Interaction if db_session is available
         interaction_id = None
         if self.db_session and user_id:
             try:
-                from app.models import Interaction
+                from app.models import Interaction, CONVERSATION_LOG_SOURCE
                 
                 # Create summary (first 200 chars)
                 summary = transcript[:200] + "..." if len(transcript) > 200 else transcript
@@ -64,7 +54,9 @@ class ConversationStore:
                     contact_name=profile_id,
                     summary=summary,
                     full_details=transcript,
-                    timestamp=timestamp
+                    timestamp=timestamp,
+                    # Also in the local log, so a later sync recognizes it
+                    source=CONVERSATION_LOG_SOURCE
                 )
                 
                 self.db_session.add(db_interaction)
@@ -72,6 +64,10 @@ class ConversationStore:
                 self.db_session.refresh(db_interaction)
                 interaction_id = db_interaction.id
                 
+                if contact_id:
+                    from app.services.enrichment_service import enrichment_service
+                    enrichment_service.invalidate(user_id, contact_id)
+                
                 print(f"✓ Saved conversation to database as interaction {interaction_id}")
             except Exception as e:
                 print(f"⚠ Error saving conversation to database: {e}")
@@ -82,10 +78,12 @@ class ConversationStore:
                 except:
                     pass
         
-        # Save to ChromaDB if collection is available
-        # ChromaDB will automatically generate embeddings for semantic search
-        if self.chroma_collection and interaction_id:
+        # Queue for ChromaDB; the indexer embeds it for semantic search in the
+        # background and retries while ChromaDB is unavailable
+        if interaction_id:
             try:
+                from app.services.chroma_indexer import chroma_indexer
+                
                 # Ensure metadata values are JSON-serializable
                 metadata = {
                     "type": "conversation",
@@ -95,41 +93,18 @@ class ConversationStore:
                     "contact_name": str(profile_id),
                     "timestamp": entry["timestamp"]
                 }
-                
-                # Add to ChromaDB - this will automatically generate embeddings
-                # using the default embedding function (all-MiniLM-L6-v2)
-                self.chroma_collection.add(
-                    ids=[f"interaction_{interaction_id}"],
-                    documents=[transcript],
-                    metadatas=[metadata]
-                )
-                print(f"✓ Saved conversation to ChromaDB with ID interaction_{interaction_id}")
-                print(f"✓ Voice-to-text embeddings generated and stored for semantic search")
+                chroma_indexer.enqueue(f"interaction_{interaction_id}", transcript, metadata)
+                print(f"✓ Queued conversation for ChromaDB as interaction_{interaction_id}")
             except Exception as e:
-                print(f"⚠ Error saving conversation to ChromaDB: {e}")
-                import traceback
-                traceback.print_exc()
-                # Don't fail the entire operation if ChromaDB fails
-        elif self.chroma_collection and not interaction_id:
+                print(f"⚠ Error queueing conversation for ChromaDB: {e}")
+        else:
             print(f"⚠ Skipping ChromaDB save: no interaction_id (database save may have failed)")
-        elif not self.chroma_collection:
-            print(f"⚠ Skipping ChromaDB save: collection not available")
             
         return entry
 
     def get_conversations(self, profile_id: Optional[str] = None) -> List[Dict]:
         """Retrieve conversations, optionally filtered by profile_id."""
-        conversations = self._load_conversations()
-        
-        if profile_id:
-            return [c for c in conversations if c["profile_id"] == profile_id]
-        
-        return conversations
-
-    def _load_conversations(self) -> List[Dict]:
-        """Load all conversations from storage."""
         try:
-            with open(self.storage_path, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+            return self.log.read(profile_id)
+        except FileNotFoundError:
             return []
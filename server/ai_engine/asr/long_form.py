@@ -0,0 +1,111 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from .vad_engine import VADEngine
+
+SAMPLE_RATE = 16000
+
+# Segments of one long-form session transcribed concurrently (by default)
+ASR_LONGFORM_WORKERS = int(os.getenv("ASR_LONGFORM_WORKERS", "2"))
+# Longest segment sent to Whisper in one call (its native window is 30 s)
+ASR_LONGFORM_MAX_SEGMENT_SEC = float(os.getenv("ASR_LONGFORM_MAX_SEGMENT_SEC", "30"))
+# Silence that counts as a boundary a segment may be split at
+MIN_SILENCE_MS = 300
+# Silence long enough to end a segment early rather than be transcribed
+SEGMENT_BREAK_MS = 2000
+# Audio read per VAD block, so memory stays bounded however long the session is
+VAD_BLOCK_SEC = 60
+
+
+def find_speech_segments(audio: np.ndarray, vad: VADEngine = None,
+                         max_segment_sec: float = ASR_LONGFORM_MAX_SEGMENT_SEC,
+                         min_silence_ms: int = MIN_SILENCE_MS):
+    """
+    Split audio (an array or memmap of float32 samples) into (start, end)
+    sample ranges of at most max_segment_sec, cut in the middle of silences
+    where possible. Ranges without any detected speech are left out.
+    """
+    vad = vad or VADEngine(sample_rate=SAMPLE_RATE)
+    frame = vad.frame_samples
+    max_frames = int(max_segment_sec * SAMPLE_RATE) // frame
+    min_silence_frames = max(1, min_silence_ms // vad.frame_duration_ms)
+    # Silence kept before speech at the start of a segment
+    lead_frames = min_silence_frames // 2
+    break_frames = max(min_silence_frames, SEGMENT_BREAK_MS // vad.frame_duration_ms)
+    block_frames = int(VAD_BLOCK_SEC * SAMPLE_RATE) // frame
+
+    segments = []
+    total_frames = len(audio) // frame
+    seg_start = 0           # first frame of the current segment
+    last_speech = -1        # last frame with speech
+    silence_run = 0
+    best_cut = None         # middle of the latest silence long enough to cut at
+
+    def close(end):
+        if last_speech >= seg_start and end > seg_start:
+            segments.append((seg_start * frame, end * frame))
+
+    for block_start in range(0, total_frames, block_frames):
+        block_end = min(block_start + block_frames, total_frames)
+        flags = vad.speech_flags(np.asarray(audio[block_start * frame:block_end * frame]))
+
+        for i, speech in enumerate(flags, start=block_start):
+            if speech:
+                last_speech = i
+                silence_run = 0
+            else:
+                silence_run += 1
+                if last_speech < seg_start:
+                    # No speech yet: move the start along instead of keeping the silence
+                    seg_start = max(seg_start, i + 1 - lead_frames)
+                elif silence_run >= min_silence_frames:
+                    best_cut = i + 1 - silence_run // 2
+                    if silence_run == break_frames:
+                        close(best_cut)
+                        seg_start, best_cut = best_cut, None
+
+            if i + 1 - seg_start >= max_frames:
+                # Cut at the latest silence, or mid-speech if there was none
+                cut = best_cut if best_cut is not None and best_cut > seg_start else i + 1
+                close(cut)
+                seg_start, best_cut = cut, None
+
+    close(total_frames)
+    return segments
+
+
+def transcribe_long_form(asr_engine, path: str, workers: int = ASR_LONGFORM_WORKERS):
+    """
+    Transcribe a raw float32 PCM session file.
+
+    The file is memory-mapped rather than read, split at silence into segments
+    of at most ASR_LONGFORM_MAX_SEGMENT_SEC, and the segments are transcribed
+    concurrently by `workers` calls (with at most 2 x workers segments held in
+    memory). Returns (text, segments) with segments as (start, end, text) in
+    session seconds.
+    """
+    if os.path.getsize(path) < 4:
+        return "", []
+
+    audio = np.memmap(path, dtype=np.float32, mode="r")
+    ranges = find_speech_segments(audio)
+    print(f"Long-form transcription: {len(audio) / SAMPLE_RATE:.1f}s of audio in {len(ranges)} speech segments")
+
+    def transcribe(sample_range):
+        start, end = sample_range
+        # Copy the slice out of the memmap; segments were cut at speech boundaries
+        pieces = asr_engine.transcribe_segments(np.array(audio[start:end]), vad_filter=False)
+        offset = start / SAMPLE_RATE
+        return [(offset + s, offset + e, text) for s, e, text in pieces]
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Submit in windows so only a bounded number of segments is in flight
+        window = max(1, workers) * 2
+        for i in range(0, len(ranges), window):
+            for pieces in executor.map(transcribe, ranges[i:i + window]):
+                results.extend(pieces)
+
+    del audio
+    return " ".join(text for _, _, text in results).strip(), results
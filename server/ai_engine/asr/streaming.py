@@ -0,0 +1,187 @@
+import os
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Run a decoding pass once this much new audio has arrived
+ASR_STREAM_MIN_CHUNK_SEC = float(os.getenv("ASR_STREAM_MIN_CHUNK_SEC", "1.0"))
+# Once the uncommitted buffer grows past this, drop audio that is already committed
+ASR_STREAM_TRIM_SEC = float(os.getenv("ASR_STREAM_TRIM_SEC", "3.0"))
+# Committed audio kept in front of the uncommitted tail as decoding context
+ASR_STREAM_OVERLAP_SEC = float(os.getenv("ASR_STREAM_OVERLAP_SEC", "0.5"))
+# Hard cap on the buffer: if passes keep disagreeing, the tail is committed as is
+ASR_STREAM_MAX_BUFFER_SEC = float(os.getenv("ASR_STREAM_MAX_BUFFER_SEC", "20.0"))
+# Characters of committed text passed to Whisper as the prompt
+ASR_STREAM_PROMPT_CHARS = 200
+
+
+class HypothesisBuffer:
+    """
+    LocalAgreement-2 over word hypotheses: a word is committed once two
+    consecutive decoding passes agree on it (as the longest common prefix of
+    their uncommitted words). Words are (start, end, text) in session seconds.
+    """
+
+    def __init__(self):
+        self.committed_in_buffer = []
+        self.buffer = []
+        self.new = []
+        self.last_committed_time = 0.0
+        self.last_committed_word = None
+
+    def insert(self, words, offset):
+        # Shift to session time and ignore what is already committed
+        words = [(start + offset, end + offset, text) for start, end, text in words]
+        self.new = [w for w in words if w[0] > self.last_committed_time - 0.1]
+
+        if self.new and self.committed_in_buffer and abs(self.new[0][0] - self.last_committed_time) < 1:
+            # The overlap can re-emit the last committed words; drop an n-gram
+            # at the start of new that repeats the tail of the committed text
+            committed_count = len(self.committed_in_buffer)
+            for n in range(min(min(committed_count, len(self.new)), 5), 0, -1):
+                tail = " ".join(self.committed_in_buffer[-j][2] for j in range(n, 0, -1))
+                head = " ".join(self.new[j][2] for j in range(n))
+                if tail == head:
+                    self.new = self.new[n:]
+                    break
+
+    def flush(self):
+        """Commit and return the agreed prefix of the previous and the new hypothesis."""
+        commit = []
+        while self.new and self.buffer:
+            if self.new[0][2] != self.buffer[0][2]:
+                break
+            commit.append(self.new[0])
+            self.last_committed_word = self.new[0][2]
+            self.last_committed_time = self.new[0][1]
+            self.buffer.pop(0)
+            self.new.pop(0)
+        self.buffer = self.new
+        self.new = []
+        self.committed_in_buffer.extend(commit)
+        return commit
+
+    def pop_committed(self, time):
+        while self.committed_in_buffer and self.committed_in_buffer[0][1] <= time:
+            self.committed_in_buffer.pop(0)
+
+    def complete(self):
+        return self.buffer
+
+
+class OnlineASRProcessor:
+    """
+    Incremental transcription of one audio stream.
+
+    Keeps the audio that is not yet committed (plus a short overlap of
+    committed audio for context) and re-decodes only that, prompting Whisper
+    with the committed text. Each pass returns newly committed text (stable,
+    "final") and the uncommitted tail (may still change, "partial").
+    """
+
+    def __init__(self, asr_engine, sample_rate: int = SAMPLE_RATE,
+                 trim_sec: float = ASR_STREAM_TRIM_SEC, overlap_sec: float = ASR_STREAM_OVERLAP_SEC,
+                 vad_filter: bool = True):
+        self.asr_engine = asr_engine
+        # Off when only speech is inserted (the caller already ran a VAD)
+        self.vad_filter = vad_filter
+        self.sample_rate = sample_rate
+        self.trim_sec = trim_sec
+        self.overlap_sec = overlap_sec
+
+        self.audio_buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_time_offset = 0.0
+        self.hypothesis = HypothesisBuffer()
+        self.committed = []
+        self.samples_since_process = 0
+
+    def insert_audio_chunk(self, audio: np.ndarray):
+        self.audio_buffer = np.concatenate([self.audio_buffer, audio])
+        self.samples_since_process += len(audio)
+
+    def ready(self, min_chunk_sec: float = ASR_STREAM_MIN_CHUNK_SEC) -> bool:
+        """Whether enough new audio has arrived to be worth a decoding pass."""
+        return self.samples_since_process >= min_chunk_sec * self.sample_rate
+
+    def has_pending(self) -> bool:
+        """Whether there are uncommitted words that later passes may still confirm."""
+        return bool(self.hypothesis.complete())
+
+    def _prompt(self):
+        # Committed text that has scrolled out of the audio buffer
+        words = [w[2] for w in self.committed if w[1] <= self.buffer_time_offset]
+        return " ".join(words)[-ASR_STREAM_PROMPT_CHARS:]
+
+    def process_iter(self):
+        """
+        Decode the current buffer. Returns (final_text, partial_text): text
+        committed by this pass and the still-uncommitted remainder.
+        """
+        self.samples_since_process = 0
+        words = self.asr_engine.transcribe_words(self.audio_buffer, prompt=self._prompt(), vad_filter=self.vad_filter)
+
+        self.hypothesis.insert(words, self.buffer_time_offset)
+        committed = self.hypothesis.flush()
+        self.committed.extend(committed)
+
+        # Drop committed audio so the next pass only decodes the tail and an overlap
+        buffer_sec = len(self.audio_buffer) / self.sample_rate
+        buffer_end = self.buffer_time_offset + buffer_sec
+        if buffer_sec > ASR_STREAM_MAX_BUFFER_SEC:
+            forced = self.hypothesis.complete()
+            self.hypothesis.buffer = []
+            if forced:
+                self.hypothesis.last_committed_time = forced[-1][1]
+                self.hypothesis.committed_in_buffer.extend(forced)
+                self.committed.extend(forced)
+                committed = committed + forced
+            self._trim(buffer_end - self.overlap_sec)
+        elif buffer_sec > self.trim_sec:
+            if self.hypothesis.complete():
+                if self.committed:
+                    self._trim(self.committed[-1][1] - self.overlap_sec)
+            else:
+                # Nothing pending (silence or everything committed)
+                self._trim(buffer_end - self.overlap_sec)
+
+        return _join(committed), _join(self.hypothesis.complete())
+
+    def _trim(self, time):
+        cut_seconds = time - self.buffer_time_offset
+        if cut_seconds <= 0:
+            return
+        self.hypothesis.pop_committed(time)
+        self.audio_buffer = self.audio_buffer[int(cut_seconds * self.sample_rate):]
+        self.buffer_time_offset = time
+
+    def finalize(self):
+        """
+        End of stream: decode the audio not covered by a pass yet, take that
+        last pass as final (there is no later pass to agree with) and commit
+        everything. Returns the text committed by this call.
+        """
+        if len(self.audio_buffer) and (self.samples_since_process or self.has_pending()):
+            self.samples_since_process = 0
+            words = self.asr_engine.transcribe_words(self.audio_buffer, prompt=self._prompt(), vad_filter=self.vad_filter)
+            self.hypothesis.insert(words, self.buffer_time_offset)
+            self.hypothesis.buffer = self.hypothesis.new
+            self.hypothesis.new = []
+        return self.finish()
+
+    def finish(self):
+        """Uncommitted text at the end of the stream, committed as is."""
+        remaining = self.hypothesis.complete()
+        self.committed.extend(remaining)
+        self.buffer_time_offset += len(self.audio_buffer) / self.sample_rate
+        self.audio_buffer = np.zeros(0, dtype=np.float32)
+        # Audio inserted afterwards (the next utterance) starts a fresh hypothesis
+        self.hypothesis = HypothesisBuffer()
+        self.hypothesis.last_committed_time = self.buffer_time_offset
+        return _join(remaining)
+
+    def committed_text(self):
+        return _join(self.committed)
+
+
+def _join(words):
+    return " ".join(w[2] for w in words).strip()
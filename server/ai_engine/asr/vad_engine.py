@@ -1,6 +1,12 @@
 import webrtcvad
 import collections
 import sys
+import numpy as np
+
+
+def float_to_pcm16(audio: np.ndarray) -> bytes:
+    """Convert float32 samples in [-1, 1] to 16-bit little-endian PCM bytes, as webrtcvad expects."""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
 
 class VADEngine:
     def __init__(self, aggressiveness: int = 2, sample_rate: int = 16000, frame_duration_ms: int = 30):
@@ -37,6 +43,83 @@ class VADEngine:
             print(f"VAD Error: {e}", file=sys.stderr)
             return False
 
+    @property
+    def frame_samples(self) -> int:
+        return self.frame_size_bytes // 2
+
+    def speech_flags(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Per-frame speech decisions for float32 audio; one bool per full frame
+        (a trailing partial frame is ignored).
+        """
+        n_frames = len(audio) // self.frame_samples
+        pcm = float_to_pcm16(audio[:n_frames * self.frame_samples])
+        flags = np.zeros(n_frames, dtype=bool)
+        for i in range(n_frames):
+            flags[i] = self.is_speech(pcm[i * self.frame_size_bytes:(i + 1) * self.frame_size_bytes])
+        return flags
+
+class SpeechSegmenter:
+    """
+    Frame-level VAD over a live float32 stream.
+
+    Audio is cut into frames of the VADEngine's size and each frame's speech
+    decision goes into a ring of the last padding_ms. Speech starts once
+    trigger_ratio of the ring is voiced (the ring's audio is kept as lead-in)
+    and ends once trigger_ratio of it is unvoiced. Only audio between a start
+    and an end is passed on.
+    """
+
+    def __init__(self, vad: VADEngine = None, padding_ms: int = 300, trigger_ratio: float = 0.9):
+        self.vad = vad or VADEngine()
+        self.ring = collections.deque(maxlen=max(1, padding_ms // self.vad.frame_duration_ms))
+        self.trigger_ratio = trigger_ratio
+        self.triggered = False
+        self._remainder = np.zeros(0, dtype=np.float32)
+
+    def process(self, chunk: np.ndarray) -> list:
+        """
+        Feed a chunk of float32 audio. Returns events in stream order:
+        ("start", None), ("audio", speech samples) and ("end", None).
+        """
+        frame_samples = self.vad.frame_samples
+        audio = np.concatenate([self._remainder, chunk]) if len(self._remainder) else chunk
+        n_frames = len(audio) // frame_samples
+        # A partial frame waits for the next chunk
+        self._remainder = audio[n_frames * frame_samples:].copy()
+
+        events = []
+        speech = []
+
+        def emit_speech():
+            if speech:
+                events.append(("audio", np.concatenate(speech)))
+                speech.clear()
+
+        flags = self.vad.speech_flags(audio[:n_frames * frame_samples])
+        for i, is_speech in enumerate(flags):
+            frame = audio[i * frame_samples:(i + 1) * frame_samples]
+            self.ring.append((frame, is_speech))
+            voiced = sum(1 for _, f in self.ring if f)
+
+            if not self.triggered:
+                if voiced > self.trigger_ratio * self.ring.maxlen:
+                    self.triggered = True
+                    events.append(("start", None))
+                    speech.extend(f for f, _ in self.ring)
+                    self.ring.clear()
+            else:
+                speech.append(frame)
+                if len(self.ring) - voiced > self.trigger_ratio * self.ring.maxlen:
+                    self.triggered = False
+                    emit_speech()
+                    events.append(("end", None))
+                    self.ring.clear()
+
+        emit_speech()
+        return events
+
+
 class Frame(object):
     """Represents a "frame" of audio data."""
     def __init__(self, bytes, timestamp, duration):
@@ -0,0 +1,96 @@
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of photo embeddings in the face_embeddings table, keyed by
+    (sha256 of the image bytes, model name, det_size).
+
+    Embedding a photo is deterministic for a given model, so enrollment and
+    re-sync only run ArcFace on photos the cache has never seen; re-indexing
+    after a restart or into a fresh ChromaDB collection is then I/O only.
+    Photos in which no face was found are cached too (as NULL) so they are
+    not retried on every sync.
+
+    Cache failures are never fatal: lookups fall back to computing the
+    embedding, and writes are best effort.
+    """
+
+    def __init__(self, model_name: str, det_size):
+        self.model_name = model_name
+        self.det_size = f"{det_size[0]}x{det_size[1]}"
+
+    def get_many(self, db_session, hashes):
+        """Return {photo_hash: embedding or None} for the hashes that are cached."""
+        from app.models import FaceEmbedding
+
+        hashes = list(set(hashes))
+        if not hashes:
+            return {}
+
+        try:
+            rows = db_session.query(FaceEmbedding.photo_hash, FaceEmbedding.embedding).filter(
+                FaceEmbedding.photo_hash.in_(hashes),
+                FaceEmbedding.model_name == self.model_name,
+                FaceEmbedding.det_size == self.det_size
+            ).all()
+        except Exception as e:
+            print(f"⚠ Embedding cache lookup failed: {e}")
+            db_session.rollback()
+            return {}
+
+        return {
+            row.photo_hash: np.frombuffer(row.embedding, dtype=np.float32).tolist() if row.embedding is not None else None
+            for row in rows
+        }
+
+    def put_many(self, db_session, embeddings):
+        """Store {photo_hash: embedding or None}; entries already cached are left alone."""
+        from app.models import FaceEmbedding
+
+        if not embeddings:
+            return
+
+        values = [
+            {
+                "photo_hash": key,
+                "model_name": self.model_name,
+                "det_size": self.det_size,
+                "embedding": np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+            }
+            for key, embedding in embeddings.items()
+        ]
+
+        try:
+            db_session.execute(insert(FaceEmbedding).values(values).on_conflict_do_nothing(
+                index_elements=["photo_hash", "model_name", "det_size"]
+            ))
+            db_session.commit()
+        except Exception as e:
+            print(f"⚠ Embedding cache write failed: {e}")
+            db_session.rollback()
+
+    def embed(self, db_session, photos, embed_all, hashes=None):
+        """
+        Return one embedding (or None) per photo, calling embed_all(photos) only
+        for photos whose hash is not cached, and caching what it produces.
+        `hashes` may be passed when the caller has already computed them.
+        """
+        if hashes is None:
+            from ai_engine.face_engine import photo_hash
+            hashes = [photo_hash(photo) for photo in photos]
+        cached = self.get_many(db_session, hashes)
+
+        # Identical photos in one call are embedded once
+        missing = {}
+        for key, photo in zip(hashes, photos):
+            if key not in cached and key not in missing:
+                missing[key] = photo
+
+        if missing:
+            computed = dict(zip(missing.keys(), embed_all(list(missing.values()))))
+            self.put_many(db_session, computed)
+            cached.update(computed)
+
+        return [cached[key] for key in hashes]
@@ -1,21 +1,59 @@
 import insightface
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
 import cv2
 import numpy as np
+import hashlib
+import io
+import itertools
 import json
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
 
 # Add parent directory to path to import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import ChromaDB client
 try:
-    from app.chroma_client import get_face_collection
+    from app.chroma_client import get_face_collection, ChromaUnavailableError
 except ImportError:
     # Fallback for when running as script
     sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
-    from app.chroma_client import get_face_collection
+    from app.chroma_client import get_face_collection, ChromaUnavailableError
+
+from ai_engine.face_gallery import face_gallery
+from ai_engine.embedding_cache import EmbeddingCache
+
+# Where recognize_face looks up identities:
+#   "gallery" - in-memory per-user gallery (default, no network on the hot path)
+#   "chroma"  - one batched ChromaDB query per frame with top-k voting per contact
+FACE_MATCH_BACKEND = os.getenv("FACE_MATCH_BACKEND", "gallery")
+# Nearest embeddings fetched per face in "chroma" mode; contacts enrolled with
+# several photos contribute several of these hits
+FACE_MATCH_TOP_K = int(os.getenv("FACE_MATCH_TOP_K", "5"))
+# How a contact's hits are combined before thresholding: "max" or "mean"
+FACE_MATCH_AGGREGATE = os.getenv("FACE_MATCH_AGGREGATE", "max")
+
+# Strict confidence filtering for cleanliness
+# Buffalo_S might be slightly noisier, so we keep a reasonable threshold
+MIN_DET_SCORE = 0.5
+
+# Model pack and default detector input size; together they identify the embedding space.
+# The pack is chosen per deployment (e.g. buffalo_s on an edge box, buffalo_l on a
+# server) since every enrolled embedding must come from the same recognition model.
+# Live connections with a latency budget may still vary the detector size per frame.
+FACE_MODEL_NAME = os.getenv("FACE_MODEL_NAME", "buffalo_s")
+FACE_DET_SIZE = (int(os.getenv("FACE_DET_SIZE", "320")),) * 2
+# Stored with every indexed embedding so incremental re-syncs can tell which
+# entries were produced by a different model and must be recomputed
+FACE_MODEL_VERSION = f"{FACE_MODEL_NAME}@{FACE_DET_SIZE[0]}x{FACE_DET_SIZE[1]}"
+
+# Embeddings of already-seen photos, persisted in the database across restarts
+embedding_cache = EmbeddingCache(FACE_MODEL_NAME, FACE_DET_SIZE)
 
 def load_models():
     """
@@ -24,32 +62,142 @@ def load_models():
     """
     # This provides a ~3x speedup with minimal accuracy loss for close-range faces
     # CoreML disabled due to shape mismatch errors on some MacOS versions
-    app = FaceAnalysis(name="buffalo_s", providers=['CPUExecutionProvider'])
+    app = FaceAnalysis(name=FACE_MODEL_NAME, providers=['CPUExecutionProvider'])
     
     # Use (320, 320) - slightly larger than 224 for better detection of small faces but still very fast
-    app.prepare(ctx_id=0, det_size=(320, 320))
+    app.prepare(ctx_id=0, det_size=FACE_DET_SIZE)
     return app
 
-def detect_and_embed(app, image):
+class DecodedFrame:
     """
-    Detect all faces and return their embedding vectors.
-    Optimized for real-time performance.
+    An uploaded image decoded at reduced scale for detection.
+    RetinaFace resizes its input to det_size anyway, so detection runs on the
+    small image and boxes are scaled back up; the full-resolution image is only
+    decoded if a face actually needs an ArcFace crop.
+    """
+
+    def __init__(self, data, image, scale_x=1.0, scale_y=1.0):
+        self.data = data
+        self.image = image
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        self._full = image if scale_x == 1.0 and scale_y == 1.0 else None
+
+    @property
+    def full(self):
+        if self._full is None:
+            self._full = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+        return self._full
+
+def decode_for_detection(data: bytes, det_size=FACE_DET_SIZE):
+    """
+    Decode image bytes for recognition, using libjpeg's DCT downscaling
+    (IMREAD_REDUCED_COLOR_2/4) when the image is much larger than det_size.
+    Returns a DecodedFrame, or None if the data is not a decodable image.
+    """
+    nparr = np.frombuffer(data, np.uint8)
+    
+    # Reading the header is cheap; only reduce when the longer side stays >= det_size
+    factor = 1
+    try:
+        width, height = Image.open(io.BytesIO(data)).size
+        for candidate in (4, 2):
+            if max(width, height) / candidate >= max(det_size):
+                factor = candidate
+                break
+    except Exception:
+        pass
+    
+    if factor == 1:
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        return DecodedFrame(data, img) if img is not None else None
+    
+    flag = cv2.IMREAD_REDUCED_COLOR_4 if factor == 4 else cv2.IMREAD_REDUCED_COLOR_2
+    img = cv2.imdecode(nparr, flag)
+    if img is None:
+        return None
+    
+    # imdecode applies EXIF rotation, so the header's width/height may be swapped
+    reduced_h, reduced_w = img.shape[:2]
+    if abs(width / factor - reduced_w) > 1:
+        width, height = height, width
+    return DecodedFrame(data, img, width / reduced_w, height / reduced_h)
+
+def _as_frame(image):
+    return image if isinstance(image, DecodedFrame) else DecodedFrame(None, image)
+
+def detect_faces(app, image, det_size=None):
+    """
+    Run RetinaFace detection only.
+    Returns insightface Face objects with bbox, kps and det_score but no embedding,
+    so callers can decide which faces are worth running ArcFace on.
+    `image` is a BGR array or a DecodedFrame; boxes are always in full-resolution coordinates.
+    `det_size` overrides the detector input size prepared in load_models() for this call.
     """
     if image is None:
         return []
     
+    frame = _as_frame(image)
+    
     # Ensure image is in correct format
     # Simple check for efficiency
-    if getattr(image, 'ndim', 0) != 3:
+    if getattr(frame.image, 'ndim', 0) != 3:
         return []
     
+    bboxes, kpss = app.det_model.detect(frame.image, input_size=det_size, max_num=0, metric='default')
+    
+    # Map detections on the reduced image back to original coordinates
+    scale = np.array([frame.scale_x, frame.scale_y], dtype=np.float32)
+    
+    faces = []
+    for i in range(bboxes.shape[0]):
+        faces.append(Face(
+            bbox=bboxes[i, 0:4] * np.tile(scale, 2),
+            kps=kpss[i] * scale if kpss is not None else None,
+            det_score=bboxes[i, 4]
+        ))
+    return faces
+
+def embed_faces(app, image, faces):
+    """
+    Compute ArcFace embeddings for already-detected faces (sets face.embedding).
+    Skips the landmark and gender/age models FaceAnalysis.get() would also run.
+    When the shared inference pool has attached an embedding batcher to `app`,
+    the aligned crops are batched with those of other concurrent frames.
+    """
+    if not faces:
+        return faces
+    
+    # Crops come from the full-resolution image (decoded now if detection ran on a reduced one)
+    image = _as_frame(image).full
+    
+    rec_model = app.models['recognition']
+    batcher = getattr(app, "embedding_batcher", None)
+    if batcher is None:
+        for face in faces:
+            rec_model.get(image, face)
+        return faces
+    
+    # Same alignment ArcFaceONNX.get() does, but the model runs once on the stacked crops
+    crops = [face_align.norm_crop(image, landmark=face.kps, image_size=rec_model.input_size[0]) for face in faces]
+    for face, embedding in zip(faces, batcher.embed(crops)):
+        face.embedding = embedding
+    return faces
+
+def detect_and_embed(app, image):
+    """
+    Detect all faces and return their embedding vectors.
+    Optimized for real-time performance.
+    """
     # Direct detection
     # Using the smaller model allows for faster inference
-    faces = app.get(image)
+    faces = detect_faces(app, image)
     
     if len(faces) == 0:
         return []
     
+    embed_faces(app, image, faces)
+    
     results = []
     for face in faces:
         results.append({
@@ -60,9 +208,109 @@ def detect_and_embed(app, image):
     
     return results
 
-def recognize_face(app, image, threshold=0.45, user_id=None):
+def _vote_on_hits(distances, metadatas, threshold, aggregate):
+    """
+    Combine the top-k ChromaDB hits for one face into a single identity.
+    Hits are grouped per contact so every enrolled photo of a contact counts,
+    then the best contact's aggregated similarity is thresholded.
+    """
+    scores = {}
+    best_metadata = {}
+    for distance, metadata in zip(distances, metadatas):
+        if not metadata:
+            continue
+        similarity = 1.0 - distance
+        key = metadata.get("contact_id", metadata.get("name"))
+        scores.setdefault(key, []).append(similarity)
+        # Keep the metadata of the closest photo for each contact
+        if similarity >= max(scores[key]):
+            best_metadata[key] = metadata
+
+    if not scores:
+        return None, 0.0
+
+    if aggregate == "mean":
+        combined = {key: sum(values) / len(values) for key, values in scores.items()}
+    else:
+        combined = {key: max(values) for key, values in scores.items()}
+
+    best_key = max(combined, key=combined.get)
+    similarity = float(combined[best_key])
+    if similarity > threshold:
+        return best_metadata[best_key], similarity
+    return None, similarity
+
+def _match_with_chroma(embeddings, threshold, user_id, top_k, aggregate):
+    """Match all of a frame's embeddings with one batched ChromaDB query."""
+    collection = get_face_collection()
+    query_result = collection.query(
+        query_embeddings=embeddings,
+        n_results=top_k,
+        where={"user_id": user_id} if user_id else None,
+        include=["metadatas", "distances"]
+    )
+
+    matches = []
+    for face_idx in range(len(embeddings)):
+        distances = query_result["distances"][face_idx] if query_result.get("distances") else []
+        metadatas = query_result["metadatas"][face_idx] if query_result.get("metadatas") else []
+        matches.append(_vote_on_hits(distances, metadatas, threshold, aggregate))
+    return matches
+
+def match_embeddings(embeddings, threshold=0.45, user_id=None, backend=None, top_k=None, aggregate=None):
     """
-    Compare input face embeddings to stored embeddings using ChromaDB.
+    Resolve face embeddings to enrolled contacts.
+    Returns one (metadata, similarity) tuple per embedding, in order;
+    metadata is None when no contact clears the threshold.
+    """
+    if not embeddings:
+        return []
+
+    backend = backend or FACE_MATCH_BACKEND
+    if backend == "chroma":
+        try:
+            return _match_with_chroma(
+                embeddings,
+                threshold,
+                user_id,
+                top_k or FACE_MATCH_TOP_K,
+                aggregate or FACE_MATCH_AGGREGATE
+            )
+        except ChromaUnavailableError as e:
+            # Circuit open: match against the in-memory gallery instead of failing the frame
+            print(f"⚠ {e}; matching faces against the gallery")
+
+    # All faces in the frame are matched with a single matrix multiply
+    gallery = face_gallery.get(user_id)
+    return gallery.match(embeddings, threshold)
+
+def _recognition_result(metadata, similarity, bbox, det_score):
+    """Build the per-face response entry for a match (or an unknown face)."""
+    # Buffalo_S produces slightly different embedding space
+    # 0.45 is a good safe threshold
+    if metadata is not None:
+        return {
+            "name": metadata["name"],
+            "relation": metadata["relation"],
+            "confidence": float(similarity),
+            "bbox": bbox,
+            "det_score": det_score,
+            "contact_id": metadata.get("contact_id")
+        }
+    return {
+        "name": "Unknown", 
+        "relation": "Unidentified Person", 
+        "confidence": 0.0,
+        "bbox": bbox,
+        "det_score": det_score
+    }
+
+def recognize_face(app, image, threshold=0.45, user_id=None, backend=None):
+    """
+    Compare input face embeddings to the user's enrolled embeddings.
+    By default matching runs against the in-memory face gallery; with
+    backend="chroma" every face in the frame is resolved by a single
+    batched ChromaDB query (see FACE_MATCH_BACKEND).
     Returns a list of recognition results sorted by confidence.
     """
     # Detect faces
@@ -71,132 +319,259 @@ def recognize_face(app, image, threshold=0.45, user_id=None):
     if not detected_faces:
         return []
 
-    # Strict confidence filtering for cleanliness
-    # Buffalo_S might be slightly noisier, so we keep a reasonable threshold
-    MIN_DET_SCORE = 0.5 
     detected_faces = [f for f in detected_faces if f.get("det_score", 0) >= MIN_DET_SCORE]
     
     if not detected_faces:
         return []
 
-    # Get ChromaDB collection
     try:
-        collection = get_face_collection()
-        if collection.count() == 0:
-            return [{
-                "name": "Unknown", 
-                "relation": "Unidentified Person", 
-                "confidence": 0.0,
-                "bbox": f["bbox"],
-                "det_score": f["det_score"]
-            } for f in detected_faces]
-    except:
-        return []
+        matches = match_embeddings(
+            [f["embedding"] for f in detected_faces],
+            threshold=threshold,
+            user_id=user_id,
+            backend=backend
+        )
+    except Exception as e:
+        print(f"Recog error: {e}")
+        return [{
+            "name": "Unknown", "relation": "Error", "confidence": 0, "bbox": f["bbox"]
+        } for f in detected_faces]
 
-    results = []
-    where_filter = {"user_id": user_id} if user_id else None
+    results = [
+        _recognition_result(metadata, similarity, face_data["bbox"], face_data["det_score"])
+        for face_data, (metadata, similarity) in zip(detected_faces, matches)
+    ]
+
+    # Sort results
+    results.sort(key=lambda x: x.get("confidence", 0), reverse=True)
+    return results
 
-    # Batch query could be implemented here but sequential is fast enough for 1-3 faces
-    for face_data in detected_faces:
-        current_emb = face_data["embedding"]
-        current_bbox = face_data["bbox"]
-        
+def recognize_face_tracked(app, image, tracker, threshold=0.45, user_id=None, backend=None, det_size=None, timings=None):
+    """
+    Recognition for a video stream using a per-connection FaceTracker.
+    Detection runs every frame, but ArcFace and the identity lookup only run
+    for tracks the tracker flags (new, unknown/low-confidence, or due for a
+    periodic refresh); stable tracks reuse their last identity.
+    Each result carries "track_id" and "identity_age" (frames since the
+    identity was computed). `det_size` is passed through to detect_faces.
+    If a `timings` dict is given, detection time is stored in it as "detect_ms".
+    """
+    detect_started = time.perf_counter()
+    faces = [f for f in detect_faces(app, image, det_size) if float(f.det_score) >= MIN_DET_SCORE]
+    if timings is not None:
+        timings["detect_ms"] = (time.perf_counter() - detect_started) * 1000
+    tracks = tracker.update([f.bbox.tolist() for f in faces])
+    
+    stale = [i for i, track in enumerate(tracks) if tracker.needs_identity(track)]
+    if stale:
+        embed_faces(app, image, [faces[i] for i in stale])
         try:
-            # Query top 1
-            query_result = collection.query(
-                query_embeddings=[current_emb],
-                n_results=1,
-                where=where_filter
+            matches = match_embeddings(
+                [faces[i].embedding.tolist() for i in stale],
+                threshold=threshold,
+                user_id=user_id,
+                backend=backend
             )
-            
-            match_found = False
-            if query_result and query_result['ids'] and len(query_result['ids'][0]) > 0:
-                distance = query_result['distances'][0][0]
-                similarity = 1.0 - distance
-                
-                # Buffalo_S produces slightly different embedding space
-                # 0.45 is a good safe threshold
-                if similarity > threshold:
-                    metadata = query_result['metadatas'][0][0]
-                    results.append({
-                        "name": metadata["name"],
-                        "relation": metadata["relation"],
-                        "confidence": float(similarity),
-                        "bbox": current_bbox,
-                        "det_score": face_data["det_score"],
-                        "contact_id": metadata.get("contact_id")
-                    })
-                    match_found = True
-            
-            if not match_found:
-                results.append({
-                    "name": "Unknown", 
-                    "relation": "Unidentified Person", 
-                    "confidence": 0.0,
-                    "bbox": current_bbox,
-                    "det_score": face_data["det_score"]
-                })
-                
+            for i, (metadata, similarity) in zip(stale, matches):
+                tracker.set_identity(tracks[i], _recognition_result(metadata, similarity, None, None))
         except Exception as e:
+            # Leave the identities unset so the next frame retries the lookup
             print(f"Recog error: {e}")
-            results.append({
-                "name": "Unknown", "relation": "Error", "confidence": 0, "bbox": current_bbox
-            })
-
+    
+    results = []
+    for face, track in zip(faces, tracks):
+        identity = track.identity or {"name": "Unknown", "relation": "Error", "confidence": 0}
+        results.append({
+            **identity,
+            "bbox": face.bbox.tolist(),
+            "det_score": float(face.det_score),
+            "track_id": track.track_id,
+            "identity_age": tracker.identity_age(track)
+        })
+    
     # Sort results
     results.sort(key=lambda x: x.get("confidence", 0), reverse=True)
     return results
 
-def sync_embeddings_from_db(app, db_session):
+def photo_hash(photo: bytes) -> str:
+    """Content hash of a stored photo, used to detect unchanged photos."""
+    return hashlib.sha256(photo).hexdigest()
+
+def embed_photo(app, photo: bytes):
+    """
+    Decode a stored photo and return the embedding of its largest face,
+    or None if it cannot be decoded or contains no face.
+    """
+    nparr = np.frombuffer(photo, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    
+    faces = detect_and_embed(app, img)
+    if not faces:
+        return None
+    
+    # Take largest face (assuming profile photo has main subject largest)
+    faces.sort(key=lambda x: (x["bbox"][2]-x["bbox"][0]) * (x["bbox"][3]-x["bbox"][1]), reverse=True)
+    return faces[0]["embedding"]
+
+# Model loaded once per process-pool worker by _init_sync_worker
+_sync_worker_app = None
+
+def _init_sync_worker():
+    global _sync_worker_app
+    _sync_worker_app = load_models()
+
+def _embed_photo_in_worker(photo: bytes):
+    return embed_photo(_sync_worker_app, photo)
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def sync_embeddings_from_db(app, db_session, incremental=False, workers=0, batch_size=64):
     """
     Sync face embeddings from database contacts with profile photos.
+    
+    Contacts are streamed from the database in pages (yield_per) rather than
+    loaded all at once, and embeddings are upserted to ChromaDB in batches of
+    batch_size as they are produced, so an interrupted run can simply be resumed
+    with incremental=True. In incremental mode, contacts whose photo hash and
+    model version match what is already indexed are skipped. Photos whose
+    embedding is in the embedding cache are indexed without running the model.
+    
+    Photos are embedded by `app`, which is either a loaded FaceAnalysis or the
+    shared FaceInferenceService (each photo is then queued at sync priority, so
+    live recognition keeps running), or across a process pool of `workers`
+    processes with one model each when workers > 0.
     """
     from app.models import Contact
-    
-    contacts = db_session.query(Contact).filter(
-        Contact.profile_photo.isnot(None),
-        Contact.is_active == True
-    ).all()
+    from app.services.blob_store import photo_store, read_contact_photo
+    from sqlalchemy import or_
+    from sqlalchemy.orm import Session
     
     try:
         collection = get_face_collection()
     except Exception as e:
         return {"success": False, "error": str(e)}
     
-    ids = []
-    embeddings = []
-    metadatas = []
+    start_time = time.time()
+    stats = {"count": 0, "skipped": 0, "failed": 0}
     
-    for contact in contacts:
-        if not contact.profile_photo: continue
+    if workers > 0:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_sync_worker)
+        embed_all = lambda photos: list(executor.map(_embed_photo_in_worker, photos))
+    elif hasattr(app, "run"):
+        from ai_engine.face_inference import PRIORITY_SYNC
+        executor = None
+        embed_all = lambda photos: [app.run(embed_photo, photo, priority=PRIORITY_SYNC) for photo in photos]
+    else:
+        executor = None
+        embed_all = lambda photos: [embed_photo(app, photo) for photo in photos]
+    
+    # Only the columns needed for indexing; rows are fetched batch_size at a time
+    rows = db_session.query(
+        Contact.id,
+        Contact.name,
+        Contact.relationship,
+        Contact.relationship_detail,
+        Contact.user_id,
+        Contact.profile_photo_key,
+        Contact.profile_photo
+    ).filter(
+        or_(Contact.profile_photo_key.isnot(None), Contact.profile_photo.isnot(None)),
+        Contact.is_active == True
+    ).order_by(Contact.id).yield_per(batch_size)
+    
+    # Cache reads/writes commit, which would close the streaming cursor above,
+    # so they go through their own session
+    cache_session = Session(bind=db_session.get_bind())
+    
+    try:
+        for batch in _batched(rows, batch_size):
+            # Photo store keys are the sha256 of the photo, so no photo needs reading here
+            hashes = {row.id: row.profile_photo_key or photo_hash(row.profile_photo) for row in batch}
             
-        nparr = np.frombuffer(contact.profile_photo, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None: continue
-        
-        # Detect
-        # Note: We must use the same model (app) as used for recognition
-        faces = app.get(img)
-        if not faces:
-            print(f"Warning: No face found in profile photo for {contact.name}")
-            continue
+            if incremental:
+                # A contact has one vector per enrolled photo; it is indexed if any of
+                # them is for its current profile photo and model
+                indexed = collection.get(
+                    where={"contact_id": {"$in": [row.id for row in batch]}},
+                    include=["metadatas"]
+                )
+                indexed_photos = set()
+                for metadata in indexed["metadatas"] or []:
+                    if metadata and metadata.get("model_version") == FACE_MODEL_VERSION:
+                        indexed_photos.add((metadata.get("contact_id"), metadata.get("photo_hash")))
+                pending = []
+                for row in batch:
+                    if (row.id, hashes[row.id]) in indexed_photos:
+                        stats["skipped"] += 1
+                    else:
+                        pending.append(row)
+                batch = pending
             
-        # Take largest face (assuming profile photo has main subject largest)
-        faces.sort(key=lambda x: (x.bbox[2]-x.bbox[0]) * (x.bbox[3]-x.bbox[1]), reverse=True)
-        face = faces[0]
-        
-        ids.append(f"contact_{contact.id}")
-        embeddings.append(face.embedding.tolist())
-        metadatas.append({
-            "name": contact.name,
-            "relation": contact.relationship_detail or contact.relationship,
-            "contact_id": contact.id,
-            "user_id": contact.user_id
-        })
+            missing = [row for row in batch if row.profile_photo_key and not photo_store.exists(row.profile_photo_key)]
+            for row in missing:
+                print(f"Warning: Profile photo for {row.name} is missing from the photo store")
+                stats["failed"] += 1
+            batch = [row for row in batch if row not in missing]
+            
+            if not batch:
+                continue
+            
+            ids = []
+            embeddings = []
+            metadatas = []
+            # Photos are only read from the store for embedding-cache misses
+            photo_embeddings = embedding_cache.embed(
+                cache_session,
+                batch,
+                lambda rows: embed_all([read_contact_photo(row) for row in rows]),
+                hashes=[hashes[row.id] for row in batch]
+            )
+            for row, embedding in zip(batch, photo_embeddings):
+                if embedding is None:
+                    print(f"Warning: No face found in profile photo for {row.name}")
+                    stats["failed"] += 1
+                    continue
+                
+                # The profile photo is the first enrolled photo; same id scheme as
+                # sync_contact_to_chroma_multiple
+                ids.append(f"contact_{row.id}_photo_0")
+                embeddings.append(embedding)
+                metadatas.append({
+                    "name": row.name,
+                    "relation": row.relationship_detail or row.relationship,
+                    "contact_id": row.id,
+                    "user_id": row.user_id,
+                    "photo_index": 0,
+                    "photo_hash": hashes[row.id],
+                    "model_version": FACE_MODEL_VERSION
+                })
+            
+            if ids:
+                collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
+                # Drop vectors left by earlier syncs under the old single-photo id
+                collection.delete(ids=[f"contact_{metadata['contact_id']}" for metadata in metadatas])
+                stats["count"] += len(ids)
+    finally:
+        cache_session.close()
+        if executor is not None:
+            executor.shutdown()
+        if stats["count"]:
+            # Galleries are rebuilt from ChromaDB on next recognition
+            face_gallery.invalidate()
     
-    if ids:
-        collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
-        return {"success": True, "count": len(ids)}
-    else:
-        return {"success": True, "count": 0}
+    elapsed = time.time() - start_time
+    processed = stats["count"] + stats["failed"]
+    return {
+        "success": True,
+        **stats,
+        "elapsed_seconds": round(elapsed, 2),
+        "photos_per_second": round(processed / elapsed, 2) if elapsed > 0 else 0.0
+    }
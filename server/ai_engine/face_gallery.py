@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+import numpy as np
+
+# How long a loaded gallery is trusted before it is re-read from ChromaDB.
+# Writes made through this process update the gallery immediately; the reload
+# only matters for writers outside it (e.g. sync_faces.py run from a shell).
+GALLERY_MAX_AGE = float(os.getenv("FACE_GALLERY_MAX_AGE", "300"))
+
+
+def _normalize(matrix):
+    """L2-normalize the rows of a float32 matrix (zero rows are left as zeros)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class FaceGallery:
+    """
+    Immutable in-memory snapshot of a user's enrolled face embeddings.
+
+    Embeddings are kept L2-normalized in one contiguous float32 matrix with a
+    parallel metadata list, so matching every face in a frame is a single
+    matrix multiply plus argmax. Mutations return a new gallery, which lets
+    recognition threads read a snapshot without taking a lock.
+    """
+
+    def __init__(self, ids=None, embeddings=None, metadatas=None):
+        self.ids = list(ids) if ids is not None else []
+        self.metadatas = list(metadatas) if metadatas is not None else [{} for _ in self.ids]
+
+        if self.ids:
+            matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(self.ids), -1)
+            self.matrix = np.ascontiguousarray(_normalize(matrix))
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def match(self, embeddings, threshold):
+        """
+        Find the best gallery entry for each query embedding.
+
+        Returns a list of (metadata, similarity) tuples in query order;
+        metadata is None when the best similarity does not exceed threshold.
+        """
+        if not len(embeddings):
+            return []
+        if not self.ids:
+            return [(None, 0.0) for _ in embeddings]
+
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        similarities = queries @ self.matrix.T
+        best = similarities.argmax(axis=1)
+        best_scores = similarities[np.arange(len(best)), best]
+
+        matches = []
+        for idx, score in zip(best, best_scores):
+            score = float(score)
+            if score > threshold:
+                matches.append((self.metadatas[idx], score))
+            else:
+                matches.append((None, score))
+        return matches
+
+    def upserted(self, ids, embeddings, metadatas):
+        """Return a copy of this gallery with the given entries added or replaced."""
+        replaced = set(ids)
+        keep = [i for i, existing_id in enumerate(self.ids) if existing_id not in replaced]
+
+        new_matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        if keep:
+            new_matrix = np.vstack([self.matrix[keep], new_matrix])
+
+        return self._derive(
+            ids=[self.ids[i] for i in keep] + list(ids),
+            embeddings=new_matrix,
+            metadatas=[self.metadatas[i] for i in keep] + list(metadatas)
+        )
+
+    def without_contact(self, contact_id):
+        """Return a copy of this gallery without any of the contact's embeddings."""
+        keep = [i for i, metadata in enumerate(self.metadatas) if metadata.get("contact_id") != contact_id]
+        if len(keep) == len(self.ids):
+            return self
+
+        return self._derive(
+            ids=[self.ids[i] for i in keep],
+            embeddings=self.matrix[keep] if keep else None,
+            metadatas=[self.metadatas[i] for i in keep]
+        )
+
+    def with_contact_metadata(self, contact_id, updates):
+        """Return a copy of this gallery with metadata fields updated for one contact."""
+        if not any(metadata.get("contact_id") == contact_id for metadata in self.metadatas):
+            return self
+
+        metadatas = [
+            {**metadata, **updates} if metadata.get("contact_id") == contact_id else metadata
+            for metadata in self.metadatas
+        ]
+        return self._derive(ids=self.ids, embeddings=self.matrix if self.ids else None, metadatas=metadatas)
+
+    def _derive(self, ids, embeddings, metadatas):
+        # Derived snapshots keep the original load time so the max-age reload
+        # from ChromaDB still happens on schedule.
+        gallery = FaceGallery(ids, embeddings, metadatas)
+        gallery.loaded_at = self.loaded_at
+        return gallery
+
+
+class FaceGalleryStore:
+    """
+    Per-user cache of FaceGallery snapshots backed by the ChromaDB 'faces' collection.
+
+    ChromaDB stays the persistence layer; the gallery is loaded from it on first
+    use and then kept in sync by the contact create/update/delete paths.
+    The None key holds an unscoped gallery for recognition without a user_id.
+    """
+
+    def __init__(self, max_age: float = GALLERY_MAX_AGE):
+        self.max_age = max_age
+        self._galleries = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, user_id=None) -> FaceGallery:
+        """Return the gallery for a user, loading it from ChromaDB if needed."""
+        gallery = self._galleries.get(user_id)
+        if gallery is not None and time.time() - gallery.loaded_at < self.max_age:
+            return gallery
+        return self._load(user_id)
+
+    def _load(self, user_id) -> FaceGallery:
+        from app.chroma_client import get_face_collection
+
+        generation = self._generation
+        collection = get_face_collection()
+        data = collection.get(
+            where={"user_id": user_id} if user_id is not None else None,
+            include=["embeddings", "metadatas"]
+        )
+
+        ids = data.get("ids") or []
+        embeddings = data.get("embeddings")
+        gallery = FaceGallery(ids, embeddings if len(ids) else None, data.get("metadatas"))
+
+        with self._lock:
+            # A write landed while we were reading ChromaDB; don't cache a
+            # snapshot that may predate it, the next call will reload.
+            if generation == self._generation:
+                self._galleries[user_id] = gallery
+
+        print(f"Loaded face gallery for user {user_id}: {len(gallery)} embeddings")
+        return gallery
+
+    def upsert(self, user_id, ids, embeddings, metadatas):
+        """Apply an upsert that was just written to ChromaDB to the cached galleries."""
+        with self._lock:
+            self._generation += 1
+            for key in {user_id, None}:
+                gallery = self._galleries.get(key)
+                if gallery is not None:
+                    self._galleries[key] = gallery.upserted(ids, embeddings, metadatas)
+
+    def remove_contact(self, contact_id):
+        """Drop all of a contact's embeddings from the cached galleries."""
+        with self._lock:
+            self._generation += 1
+            for key, gallery in list(self._galleries.items()):
+                self._galleries[key] = gallery.without_contact(contact_id)
+
+    def update_contact_metadata(self, contact_id, updates):
+        """Apply metadata changes (name, relation) for a contact to the cached galleries."""
+        with self._lock:
+            self._generation += 1
+            for key, gallery in list(self._galleries.items()):
+                self._galleries[key] = gallery.with_contact_metadata(contact_id, updates)
+
+    def invalidate(self):
+        """Forget every cached gallery; each is reloaded from ChromaDB on next use."""
+        with self._lock:
+            self._generation += 1
+            self._galleries.clear()
+
+
+face_gallery = FaceGalleryStore()
@@ -0,0 +1,238 @@
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+from ai_engine.face_engine import load_models
+
+# Job priorities (lower runs first). Live recognition always jumps ahead of
+# enrollment, which in turn jumps ahead of bulk re-sync work.
+PRIORITY_LIVE = 0
+PRIORITY_ENROLL = 1
+PRIORITY_SYNC = 2
+
+# Number of model instances (each with its own ONNX sessions) and worker threads
+FACE_INFERENCE_WORKERS = int(os.getenv("FACE_INFERENCE_WORKERS", "1"))
+# Maximum jobs waiting or running at once; background work may only use half,
+# so a burst of enrollments can never fill the queue ahead of live frames
+FACE_INFERENCE_QUEUE_SIZE = int(os.getenv("FACE_INFERENCE_QUEUE_SIZE", "32"))
+# Micro-batching of ArcFace across concurrent frames: how long to hold a batch
+# open for other workers' crops (0 disables batching) and the largest batch
+FACE_BATCH_WINDOW_MS = float(os.getenv("FACE_BATCH_WINDOW_MS", "8"))
+FACE_BATCH_MAX = int(os.getenv("FACE_BATCH_MAX", "32"))
+
+
+class FaceInferenceBusy(Exception):
+    """Raised when the inference queue has no room for a job."""
+
+
+class EmbeddingBatcher:
+    """
+    Collects aligned face crops from concurrent inference workers and runs the
+    ArcFace model once on the stacked batch, scattering embeddings back to
+    each caller. Detection stays per-image; only recognition is batched.
+
+    A batch is closed after window_ms, at max_batch crops, or as soon as every
+    job currently running on the pool has contributed, so a lone frame is
+    never held back waiting for company.
+    """
+
+    def __init__(self, rec_model, running_jobs, window_ms: float = FACE_BATCH_WINDOW_MS, max_batch: int = FACE_BATCH_MAX):
+        self.rec_model = rec_model
+        self.running_jobs = running_jobs
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        # Some exported models have a fixed batch dimension of 1; those get one
+        # call per crop. Decided once from the model's input shape, so an
+        # inference error never turns batching off
+        self.batched = self._supports_batches(rec_model)
+        if not self.batched:
+            print("⚠ ArcFace model has a fixed batch size; embedding faces one at a time")
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="face-embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, crops):
+        """Blocking: return one embedding per crop, computed as part of a shared batch."""
+        future = concurrent.futures.Future()
+        self._queue.put((crops, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.window
+
+            while size < self.max_batch and len(batch) < self.running_jobs():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            crops = [crop for item_crops, _ in batch for crop in item_crops]
+            try:
+                embeddings = self._run(crops)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_crops, future in batch:
+                future.set_result(list(embeddings[offset:offset + len(item_crops)]))
+                offset += len(item_crops)
+
+    @staticmethod
+    def _supports_batches(rec_model) -> bool:
+        shape = getattr(rec_model, "input_shape", None)
+        if shape is None:
+            session = getattr(rec_model, "session", None)
+            shape = session.get_inputs()[0].shape if session is not None else None
+        # A symbolic or None batch dimension is dynamic
+        return not shape or not isinstance(shape[0], int) or shape[0] < 0
+
+    def _run(self, crops):
+        if self.batched:
+            return self.rec_model.get_feat(crops)
+        return np.vstack([self.rec_model.get_feat([crop]) for crop in crops])
+
+
+class FaceInferenceService:
+    """
+    Shared InsightFace inference pool for the HTTP, WebSocket and enrollment paths.
+
+    Owns a fixed number of FaceAnalysis instances, each driven by its own
+    worker thread, and a bounded priority queue in front of them. Jobs are
+    plain functions called as fn(app, *args, **kwargs) on a worker, so the
+    existing face_engine functions can be submitted unchanged.
+    """
+
+    def __init__(self, workers: int = FACE_INFERENCE_WORKERS, queue_size: int = FACE_INFERENCE_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = max(2, queue_size)
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+        self._pending = 0
+        self._running = 0
+        self._space = threading.Condition()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def start(self):
+        """Load and warm up the models, then start the worker threads (idempotent)."""
+        with self._start_lock:
+            if self._threads:
+                return
+
+            dummy_image = np.zeros((480, 480, 3), dtype=np.uint8)
+            batcher = None
+            for i in range(self.workers):
+                app = load_models()
+                # Run a dummy inference to initialize CPU kernels before real traffic
+                app.get(dummy_image)
+
+                # All workers share one batcher (ONNX sessions are thread-safe).
+                # With a single worker it still embeds all faces of a frame in one
+                # call, and never waits: a batch closes once every running job is in
+                if FACE_BATCH_WINDOW_MS > 0:
+                    if batcher is None:
+                        batcher = EmbeddingBatcher(app.models['recognition'], lambda: self._running)
+                    app.embedding_batcher = batcher
+
+                thread = threading.Thread(target=self._worker, args=(app,), name=f"face-inference-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+            print(f"✓ Face inference service started with {self.workers} worker(s)")
+
+    def stop(self):
+        """Ask the workers to exit once the jobs already queued have run."""
+        with self._start_lock:
+            for _ in self._threads:
+                self._queue.put((float("inf"), next(self._sequence), None))
+            self._threads = []
+
+    def _worker(self, app):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+
+            fn, args, kwargs, future = job
+            try:
+                if future.set_running_or_notify_cancel():
+                    with self._space:
+                        self._running += 1
+                    try:
+                        future.set_result(fn(app, *args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+                    finally:
+                        with self._space:
+                            self._running -= 1
+            finally:
+                with self._space:
+                    self._pending -= 1
+                    self._space.notify_all()
+
+    def _admit(self, priority: int, block: bool, timeout=None):
+        limit = self.queue_size if priority == PRIORITY_LIVE else self.queue_size // 2
+        with self._space:
+            if block:
+                if not self._space.wait_for(lambda: self._pending < limit, timeout):
+                    raise FaceInferenceBusy("Face inference queue is full")
+            elif self._pending >= limit:
+                raise FaceInferenceBusy("Face inference queue is full")
+            self._pending += 1
+
+    def _enqueue(self, fn, args, kwargs, priority, block, timeout=None) -> concurrent.futures.Future:
+        # Admission and enqueue happen together so a caller cancelled while
+        # waiting for space can never leave a slot counted without a job
+        self._admit(priority, block, timeout)
+        future = concurrent.futures.Future()
+        self._queue.put((priority, next(self._sequence), (fn, args, kwargs, future)))
+        return future
+
+    async def submit(self, fn, *args, priority: int = PRIORITY_LIVE, wait: bool = False, **kwargs):
+        """
+        Run fn(app, *args, **kwargs) on an inference worker and await the result.
+        Raises FaceInferenceBusy if the queue is full, unless wait=True.
+        """
+        self.start()
+        if wait:
+            future = await asyncio.to_thread(self._enqueue, fn, args, kwargs, priority, True)
+        else:
+            future = self._enqueue(fn, args, kwargs, priority, False)
+        return await asyncio.wrap_future(future)
+
+    def run(self, fn, *args, priority: int = PRIORITY_ENROLL, timeout=None, **kwargs):
+        """
+        Blocking variant of submit() for background tasks and scripts.
+        Waits for queue space (up to timeout seconds) and then for the result.
+        """
+        self.start()
+        return self._enqueue(fn, args, kwargs, priority, True, timeout).result()
+
+
+face_inference = FaceInferenceService()
@@ -0,0 +1,118 @@
+import itertools
+
+
+def _iou(a, b):
+    """Intersection-over-union of two [x1, y1, x2, y2] boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter <= 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter)
+
+
+def _centroid_distance(a, b):
+    """Distance between box centers, relative to the width of box a."""
+    ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    width = max(a[2] - a[0], 1.0)
+    return (((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5) / width
+
+
+class Track:
+    """A face followed across frames, with the identity last computed for it."""
+
+    def __init__(self, track_id, bbox, frame_index):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.last_seen = frame_index
+        self.identity = None
+        self.identified_at = None
+
+
+class FaceTracker:
+    """
+    Per-connection IoU/centroid tracker for the recognition WebSocket.
+
+    Detections are associated with existing tracks frame to frame so a
+    stable track can reuse its last identity instead of re-running ArcFace
+    and the gallery lookup. A track needs a fresh identity when it is new,
+    when its last match was unknown or low-confidence, or every
+    refresh_interval frames.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_missed=5,
+                 refresh_interval=15, min_confidence=0.55):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed = max_missed
+        self.refresh_interval = refresh_interval
+        self.min_confidence = min_confidence
+
+        self.frame_index = 0
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, bboxes):
+        """
+        Associate this frame's detections with tracks.
+        Returns a list of tracks aligned with bboxes; unmatched detections start new tracks.
+        """
+        self.frame_index += 1
+
+        # Greedy association: best IoU pairs first, then centroid distance
+        # for fast movers whose boxes no longer overlap much
+        candidates = []
+        for t_idx, track in enumerate(self.tracks):
+            for d_idx, bbox in enumerate(bboxes):
+                iou = _iou(track.bbox, bbox)
+                if iou >= self.iou_threshold:
+                    candidates.append((0, -iou, t_idx, d_idx))
+                else:
+                    distance = _centroid_distance(track.bbox, bbox)
+                    if distance <= self.max_centroid_distance:
+                        candidates.append((1, distance, t_idx, d_idx))
+        candidates.sort()
+
+        assigned = [None] * len(bboxes)
+        used_tracks = set()
+        for _, _, t_idx, d_idx in candidates:
+            if t_idx in used_tracks or assigned[d_idx] is not None:
+                continue
+            used_tracks.add(t_idx)
+            assigned[d_idx] = self.tracks[t_idx]
+
+        for d_idx, bbox in enumerate(bboxes):
+            track = assigned[d_idx]
+            if track is None:
+                track = Track(next(self._ids), bbox, self.frame_index)
+                self.tracks.append(track)
+                assigned[d_idx] = track
+            track.bbox = bbox
+            track.last_seen = self.frame_index
+
+        # Forget tracks that have been out of view for a while
+        self.tracks = [t for t in self.tracks if self.frame_index - t.last_seen <= self.max_missed]
+        return assigned
+
+    def needs_identity(self, track):
+        """Whether ArcFace and the identity lookup should run for this track on the current frame."""
+        if track.identity is None:
+            return True
+        if track.identity.get("name") == "Unknown":
+            return True
+        if track.identity.get("confidence", 0) < self.min_confidence:
+            return True
+        return self.frame_index - track.identified_at >= self.refresh_interval
+
+    def set_identity(self, track, identity):
+        track.identity = identity
+        track.identified_at = self.frame_index
+
+    def identity_age(self, track):
+        """Frames since the track's identity was last computed (0 = this frame)."""
+        if track.identified_at is None:
+            return 0
+        return self.frame_index - track.identified_at
@@ -0,0 +1,73 @@
+import os
+
+# Detector input sizes a connection may switch between, smallest first
+DET_SIZE_LEVELS = [int(size) for size in os.getenv("FACE_DET_SIZE_LEVELS", "224,320,480").split(",")]
+
+
+class DetSizeController:
+    """
+    Picks the RetinaFace input size for one recognition connection so that
+    measured inference time stays within the latency budget the client declared.
+
+    Inference time is tracked as an exponential moving average. When it exceeds
+    the target the controller steps down to a smaller detection size; when the
+    next size up is predicted to fit comfortably (cost grows roughly with pixel
+    count) it steps back up. A cooldown between switches keeps it from flapping.
+    """
+
+    def __init__(self, target_latency_ms: float, levels=None, initial_size: int = 320,
+                 alpha: float = 0.2, cooldown_frames: int = 10, headroom: float = 0.8):
+        self.target_latency_ms = target_latency_ms
+        self.levels = sorted(levels or DET_SIZE_LEVELS)
+        self.alpha = alpha
+        self.cooldown_frames = cooldown_frames
+        self.headroom = headroom
+
+        # Start at the configured default (or the closest level to it)
+        self.level = min(range(len(self.levels)), key=lambda i: abs(self.levels[i] - initial_size))
+        self.avg_inference_ms = None
+        self._frames_since_change = 0
+
+    @property
+    def det_size(self):
+        size = self.levels[self.level]
+        return (size, size)
+
+    def record(self, inference_ms: float) -> bool:
+        """Add a measurement; returns True if the detection size changed."""
+        if self.avg_inference_ms is None:
+            self.avg_inference_ms = inference_ms
+        else:
+            self.avg_inference_ms += self.alpha * (inference_ms - self.avg_inference_ms)
+
+        self._frames_since_change += 1
+        if self._frames_since_change < self.cooldown_frames:
+            return False
+
+        current = self.levels[self.level]
+        if self.avg_inference_ms > self.target_latency_ms and self.level > 0:
+            self._switch(self.level - 1, current)
+            return True
+
+        if self.level < len(self.levels) - 1:
+            larger = self.levels[self.level + 1]
+            predicted = self.avg_inference_ms * (larger / current) ** 2
+            if predicted < self.target_latency_ms * self.headroom:
+                self._switch(self.level + 1, current)
+                return True
+
+        return False
+
+    def _switch(self, level, previous_size):
+        self.level = level
+        # Rescale the average to the new size so the next decision starts from an estimate
+        self.avg_inference_ms *= (self.levels[level] / previous_size) ** 2
+        self._frames_since_change = 0
+
+    def settings(self) -> dict:
+        return {
+            "type": "settings",
+            "det_size": list(self.det_size),
+            "target_latency_ms": self.target_latency_ms,
+            "avg_inference_ms": round(self.avg_inference_ms, 1) if self.avg_inference_ms is not None else None
+        }
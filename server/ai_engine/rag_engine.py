@@ -9,6 +9,8 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
+from .text_embedder import text_embedder
+
 class InteractionRAG:
     def __init__(self, chroma_collection, db_session: Optional[Session] = None):
         """
@@ -268,7 +270,7 @@ class InteractionRAG:
             
             # Step 4: Retrieve relevant interactions from ChromaDB
             results = self.collection.query(
-                query_texts=[question],
+                query_embeddings=text_embedder.embed([question]),
                 n_results=n_results,
                 where={"user_id": user_id}
             )
@@ -447,7 +449,7 @@ Answer:"""
             query_text = topic if topic else "recent conversations and interactions"
             
             results = self.collection.query(
-                query_texts=[query_text],
+                query_embeddings=text_embedder.embed([query_text]),
                 n_results=30,
                 where={"user_id": user_id}
             )
@@ -0,0 +1,260 @@
+import collections
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Directory with the all-MiniLM-L6-v2 ONNX export (model.onnx, tokenizer.json).
+# Defaults to where Chroma's default embedding function downloads it, so
+# existing documents and new queries share one embedding space.
+TEXT_EMBEDDING_MODEL_DIR = os.getenv(
+    "TEXT_EMBEDDING_MODEL_DIR",
+    str(Path.home() / ".cache" / "chroma" / "onnx_models" / "all-MiniLM-L6-v2" / "onnx")
+)
+# Fetched into TEXT_EMBEDDING_MODEL_DIR when model.onnx is missing; the archive
+# is Chroma's own MiniLM export, checked against its sha256 (empty skips the check)
+TEXT_EMBEDDING_MODEL_URL = os.getenv(
+    "TEXT_EMBEDDING_MODEL_URL", "https://chroma-onnx-models.s3.amazonaws.com/all-MiniLM-L6-v2/onnx.tar.gz"
+)
+TEXT_EMBEDDING_MODEL_SHA256 = os.getenv(
+    "TEXT_EMBEDDING_MODEL_SHA256", "913d7300ceae3b2dbc2c50d1de4baacab4be7b9380491c27fab7418616a16ec3"
+)
+# Run a dynamically int8-quantized copy of the model (created next to it on first use)
+TEXT_EMBEDDING_QUANTIZE = os.getenv("TEXT_EMBEDDING_QUANTIZE", "true").lower() in ("1", "true", "yes")
+TEXT_EMBEDDING_BATCH_SIZE = int(os.getenv("TEXT_EMBEDDING_BATCH_SIZE", "32"))
+TEXT_EMBEDDING_THREADS = int(os.getenv("TEXT_EMBEDDING_THREADS", "0"))  # 0 = onnxruntime default
+# Embeddings kept in memory, and the on-disk cache behind them
+TEXT_EMBEDDING_CACHE_SIZE = int(os.getenv("TEXT_EMBEDDING_CACHE_SIZE", "4096"))
+TEXT_EMBEDDING_CACHE_PATH = os.getenv(
+    "TEXT_EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "text_embeddings.sqlite3")
+)
+# Same truncation as Chroma's default embedding function
+MAX_TOKENS = 256
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TextEmbedder:
+    """
+    Sentence embeddings (all-MiniLM-L6-v2, mean pooled and L2 normalized) for
+    the conversations collection, computed locally with onnxruntime on CPU.
+
+    Texts are embedded in batches padded only to the longest text in the
+    batch, and every embedding is cached by the sha256 of the model and text:
+    in an in-memory LRU and in a SQLite file, so the same query or document is
+    embedded once across requests and restarts. Callers pass the results to
+    Chroma explicitly (embeddings= / query_embeddings=).
+    """
+
+    def __init__(self, model_dir: str = TEXT_EMBEDDING_MODEL_DIR, quantize: bool = TEXT_EMBEDDING_QUANTIZE,
+                 batch_size: int = TEXT_EMBEDDING_BATCH_SIZE, cache_size: int = TEXT_EMBEDDING_CACHE_SIZE,
+                 cache_path: str = TEXT_EMBEDDING_CACHE_PATH):
+        self.model_dir = model_dir
+        self.quantize = quantize
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self.cache_path = cache_path
+
+        self._session = None
+        self._tokenizer = None
+        self._model_id = None
+        self._load_lock = threading.Lock()
+
+        self._lru = collections.OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            model_path = os.path.join(self.model_dir, "model.onnx")
+            if not os.path.exists(model_path):
+                self._download()
+
+            if self.quantize:
+                model_path = self._quantized(model_path)
+
+            options = ort.SessionOptions()
+            if TEXT_EMBEDDING_THREADS:
+                options.intra_op_num_threads = TEXT_EMBEDDING_THREADS
+            self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=MAX_TOKENS)
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+            self._tokenizer = tokenizer
+
+            # Cache keys depend on the model's contents, so a different model dir or
+            # switching between the int8 and float32 models never reuses old vectors
+            self._model_id = _file_sha256(model_path)
+            print(f"✓ Text embedding model loaded ({model_path}, {self._model_id[:12]})")
+
+    def _download(self):
+        import tarfile
+        import tempfile
+        import urllib.request
+
+        os.makedirs(self.model_dir, exist_ok=True)
+        print(f"Downloading text embedding model into {self.model_dir}...")
+        with tempfile.TemporaryDirectory(dir=self.model_dir) as tmp_dir:
+            archive_path = os.path.join(tmp_dir, "model.tar.gz")
+            try:
+                urllib.request.urlretrieve(TEXT_EMBEDDING_MODEL_URL, archive_path)
+            except Exception as e:
+                raise RuntimeError(
+                    f"No model.onnx in {self.model_dir} and downloading {TEXT_EMBEDDING_MODEL_URL} failed: {e}"
+                ) from e
+            if TEXT_EMBEDDING_MODEL_SHA256 and _file_sha256(archive_path) != TEXT_EMBEDDING_MODEL_SHA256:
+                raise RuntimeError(
+                    f"Downloaded text embedding model from {TEXT_EMBEDDING_MODEL_URL} does not match "
+                    f"TEXT_EMBEDDING_MODEL_SHA256"
+                )
+
+            # The archive holds one folder of files; they go straight into model_dir,
+            # with model.onnx last so its presence means the download is complete
+            with tarfile.open(archive_path) as tar:
+                members = [member for member in tar.getmembers() if member.isfile()]
+                members.sort(key=lambda member: os.path.basename(member.name) == "model.onnx")
+                for member in members:
+                    name = os.path.basename(member.name)
+                    tmp_path = os.path.join(tmp_dir, name)
+                    with tar.extractfile(member) as src, open(tmp_path, "wb") as dst:
+                        dst.write(src.read())
+                    os.replace(tmp_path, os.path.join(self.model_dir, name))
+        print(f"✓ Downloaded text embedding model into {self.model_dir}")
+
+    def _quantized(self, model_path):
+        quantized_path = os.path.join(self.model_dir, "model_int8.onnx")
+        if os.path.exists(quantized_path):
+            return quantized_path
+        try:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            tmp_path = quantized_path + ".tmp"
+            quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+            print(f"✓ Created int8 text embedding model at {quantized_path}")
+            return quantized_path
+        except Exception as e:
+            print(f"⚠ Could not quantize text embedding model ({e}); using the float32 model")
+            return model_path
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self._model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        if self._db is None:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS text_embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)")
+        return self._db
+
+    def _disk_get(self, keys):
+        found = {}
+        try:
+            with self._db_lock:
+                db = self._connect()
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows = db.execute(
+                        f"SELECT key, embedding FROM text_embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+        except Exception as e:
+            print(f"⚠ Text embedding cache lookup failed: {e}")
+        return found
+
+    def _disk_put(self, items):
+        try:
+            with self._db_lock:
+                db = self._connect()
+                db.executemany(
+                    "INSERT OR IGNORE INTO text_embeddings (key, embedding) VALUES (?, ?)",
+                    [(key, embedding.astype(np.float32).tobytes()) for key, embedding in items.items()]
+                )
+                db.commit()
+        except Exception as e:
+            print(f"⚠ Text embedding cache write failed: {e}")
+
+    def _remember(self, items):
+        with self._lru_lock:
+            for key, embedding in items.items():
+                self._lru[key] = embedding
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.cache_size:
+                self._lru.popitem(last=False)
+
+    def _forward(self, texts):
+        encoded = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        hidden = self._session.run(None, {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        })[0]
+        # Mean pooling over real tokens, then L2 normalization
+        mask = attention_mask[..., None].astype(np.float32)
+        embeddings = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1e-12
+        return (embeddings / norms).astype(np.float32)
+
+    def embed(self, texts):
+        """Embeddings for texts, as lists of floats in the same order."""
+        self._load()
+        keys = [self._key(text) for text in texts]
+
+        found = {}
+        with self._lru_lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+
+        missing = list({key: None for key in keys if key not in found})
+        if missing:
+            from_disk = self._disk_get(missing)
+            found.update(from_disk)
+            self._remember(from_disk)
+
+        todo = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                todo.setdefault(key, text)
+        if todo:
+            # Similar lengths batch together so little of each batch is padding
+            pending = sorted(todo.items(), key=lambda item: len(item[1]))
+            computed = {}
+            for i in range(0, len(pending), self.batch_size):
+                batch = pending[i:i + self.batch_size]
+                for (key, _), embedding in zip(batch, self._forward([text for _, text in batch])):
+                    computed[key] = embedding
+            self._disk_put(computed)
+            self._remember(computed)
+            found.update(computed)
+
+        return [found[key].tolist() for key in keys]
+
+    def __call__(self, input):
+        # Chroma EmbeddingFunction interface
+        return self.embed(list(input))
+
+
+text_embedder = TextEmbedder()
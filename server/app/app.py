@@ -12,7 +12,7 @@ from fastapi.responses import JSONResponse
 
 from starlette.middleware.sessions import SessionMiddleware
 
-from .database import Base, engine
+from .database import Base, engine, ensure_columns, ensure_indexes
 from .routes.authRoutes import router as auth_router
 from .routes.faceRoutes import router as face_router
 from .routes.contactRoutes import router as contact_router
@@ -34,38 +34,60 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-should-be-in-env")
 
 # Create Database Tables
 Base.metadata.create_all(bind=engine)
+ensure_columns()
+ensure_indexes()
+
+def log_photo_migration_result(task: asyncio.Task):
+    """Report a failed photo migration when it happens, not when the task is collected."""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        print(f"⚠ Contact photo migration failed: {error}")
 
 # Lifespan context manager for startup and shutdown events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Pre-load face recognition models to avoid cold start delays
+    # Startup: Pre-load and warm up the shared face inference pool to avoid cold start delays
+    from ai_engine.face_inference import face_inference
     try:
-        from .routes.contactRoutes import get_face_app
-        import numpy as np
-        import cv2
-        
         print("Pre-loading face recognition models...")
-        face_app = get_face_app()
-        print("✓ Face recognition models loaded")
-        
-        # Warmup: Run a dummy inference to initialize CUDA/CPU kernels
-        print("Warming up face recognition engine...")
-        dummy_image = np.zeros((480, 480, 3), dtype=np.uint8)
-        face_app.get(dummy_image)
+        face_inference.start()
         print("✓ Face recognition engine warmed up and ready")
     except Exception as e:
         print(f"⚠ Warning: Failed to pre-load face recognition models: {e}")
     
+    # Startup: Move any photos still stored in contact rows into the photo store
+    # (in the background; readers fall back to the old column until then)
+    from .services.blob_store import migrate_contact_photos
+    photo_migration = asyncio.create_task(asyncio.to_thread(migrate_contact_photos))
+    photo_migration.add_done_callback(log_photo_migration_result)
+    
+    # Startup: Start the background ChromaDB indexer
+    from .services.chroma_indexer import chroma_indexer
+    chroma_indexer.start()
+    
     # Startup: Start the reminder scheduler
     scheduler_task = asyncio.create_task(scheduler.start())
     yield
-    # Shutdown: Stop the scheduler
+    # Shutdown: Stop the scheduler and the face and ASR inference workers
+    from ai_engine.asr.asr_scheduler import asr_scheduler
     scheduler.stop()
+    face_inference.stop()
+    asr_scheduler.stop()
+    # Shutdown: Index what is still queued
+    await asyncio.to_thread(chroma_indexer.stop)
     scheduler_task.cancel()
     try:
         await scheduler_task
     except asyncio.CancelledError:
         pass
+    # An unfinished photo migration resumes on the next startup
+    photo_migration.cancel()
+    try:
+        await photo_migration
+    except (asyncio.CancelledError, Exception):
+        pass
 
 app = FastAPI(
     title="MindTrace",
@@ -118,4 +140,16 @@ def scheduler_health():
         "running": scheduler.running,
         "check_interval": scheduler.check_interval,
         "last_reset_date": str(scheduler.last_reset_date) if scheduler.last_reset_date else None
-    }
\ No newline at end of file
+    }
+
+@app.get("/health/indexer")
+def indexer_health():
+    """Queue depth, lag and error state of the background ChromaDB indexer"""
+    from .services.chroma_indexer import chroma_indexer
+    return chroma_indexer.stats()
+
+@app.get("/health/chroma")
+def chroma_health():
+    """Circuit breaker state of the ChromaDB client (closed, open or half_open)"""
+    from .chroma_client import chroma_breaker
+    return chroma_breaker.stats()
@@ -1,59 +1,171 @@
+import asyncio
+import contextlib
 import os
+import threading
+import time
 import chromadb
+import httpx
 from chromadb.config import Settings
 from functools import lru_cache
 
-@lru_cache()
-def get_chroma_client():
+# Longest a single ChromaDB call may take (sync and async clients)
+CHROMA_REQUEST_TIMEOUT = float(os.getenv("CHROMA_REQUEST_TIMEOUT", "10"))
+# Consecutive failed calls that open the circuit, and how long it stays open
+# before one trial call is let through
+CHROMA_BREAKER_FAILURES = int(os.getenv("CHROMA_BREAKER_FAILURES", "5"))
+CHROMA_BREAKER_RESET = float(os.getenv("CHROMA_BREAKER_RESET", "30"))
+
+# Collections by name, with the metadata they are created with
+COLLECTIONS = {
+    # Face embeddings (already computed by InsightFace), cosine similarity
+    "faces": {"hnsw:space": "cosine"},
+    # Conversation history, embedded by ai_engine.text_embedder
+    "conversations": {"hnsw:space": "cosine"},
+}
+
+
+class ChromaUnavailableError(RuntimeError):
+    """Raised instead of calling ChromaDB while the circuit breaker is open."""
+
+
+def _is_outage(error: Exception) -> bool:
+    # Bad arguments are the caller's problem, not a sign ChromaDB is down
+    return not isinstance(error, (ValueError, TypeError, ChromaUnavailableError))
+
+
+class CircuitBreaker:
     """
-    Get a singleton ChromaDB client instance.
-    Uses environment variables for configuration.
-    Connection is cached for performance.
+    Stops calls to ChromaDB after repeated failures, so requests fail fast
+    (and can fall back) instead of each waiting for a timeout.
+
+    After `failure_threshold` consecutive failures the circuit opens for
+    `reset_timeout` seconds; then a single trial call is allowed through and
+    its result closes or re-opens the circuit. Shared by threads and the
+    event loop.
     """
+
+    def __init__(self, failure_threshold: int = CHROMA_BREAKER_FAILURES, reset_timeout: float = CHROMA_BREAKER_RESET):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._trial_running or time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raise ChromaUnavailableError while open; True if this call is the trial call."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            raise ChromaUnavailableError(
+                f"ChromaDB unavailable (circuit open, retrying in {retry_in:.0f}s): {self.last_error}"
+            )
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print("✓ ChromaDB reachable again; circuit closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self._failures += 1
+            self.last_error = str(error) or type(error).__name__
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"⚠ ChromaDB failing ({self.last_error}); circuit open for {self.reset_timeout:.0f}s")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    @contextlib.contextmanager
+    def guard(self):
+        """Wrap one ChromaDB call: fail fast while open, and record how it went."""
+        trial = self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if _is_outage(e):
+                self.record_failure(e)
+            raise
+        else:
+            self.record_success()
+        finally:
+            if trial:
+                # A trial that ended without a verdict (bad arguments, cancellation) frees the slot
+                with self._lock:
+                    self._trial_running = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._state(),
+                "consecutive_failures": self._failures,
+                "last_error": self.last_error,
+            }
+
+
+chroma_breaker = CircuitBreaker()
+
+
+def _connection_kwargs() -> dict:
     host = os.getenv("CHROMA_HOST", "localhost")
     port = os.getenv("CHROMA_PORT", "8000")
     api_key = os.getenv("CHROMA_API_KEY", "").strip("'\"")  # Remove quotes if present
     tenant = os.getenv("CHROMA_TENANT", "default_tenant").strip("'\"")
     database = os.getenv("CHROMA_DATABASE", "default_database").strip("'\"")
-    
-    print(f"Connecting to ChromaDB at {host}:{port} (Tenant: {tenant}, Database: {database})")
-    
+
+    kwargs = {
+        "host": host,
+        "port": int(port),
+        "tenant": tenant,
+        "database": database,
+        # A fresh Settings per client; the client constructors modify it
+        "settings": Settings(
+            allow_reset=True,
+            anonymized_telemetry=False
+        ),
+    }
+    # If API key is present, assume we need authentication
+    if api_key:
+        # For cloud ChromaDB (api.trychroma.com), use SSL
+        kwargs["ssl"] = host == "api.trychroma.com" or port == "443"
+        kwargs["headers"] = {"X-Chroma-Token": api_key}
+    return kwargs
+
+
+@lru_cache()
+def get_chroma_client():
+    """
+    Get a singleton ChromaDB client instance.
+    Uses environment variables for configuration.
+    Connection is cached for performance.
+    """
+    kwargs = _connection_kwargs()
+    print(f"Connecting to ChromaDB at {kwargs['host']}:{kwargs['port']} (Tenant: {kwargs['tenant']}, Database: {kwargs['database']})")
+
     try:
-        # If API key is present, assume we need authentication
-        if api_key:
-            # For cloud ChromaDB (api.trychroma.com), use SSL
-            ssl = host == "api.trychroma.com" or port == "443"
-            
-            # Configure settings
-            settings = Settings(
-                allow_reset=True,
-                anonymized_telemetry=False
-            )
-            
-            client = chromadb.HttpClient(
-                host=host,
-                port=int(port),
-                ssl=ssl,
-                headers={"X-Chroma-Token": api_key},
-                tenant=tenant,
-                database=database,
-                settings=settings
-            )
-        else:
-            # Fallback to HttpClient without auth
-            settings = Settings(
-                allow_reset=True,
-                anonymized_telemetry=False
-            )
-            
-            client = chromadb.HttpClient(
-                host=host,
-                port=int(port),
-                tenant=tenant,
-                database=database,
-                settings=settings
-            )
-            
+        client = chromadb.HttpClient(**kwargs)
+        _bound_request_time(client)
         # Test connection
         client.heartbeat()
         print(f"✓ ChromaDB connection established successfully")
@@ -62,20 +174,140 @@ def get_chroma_client():
         print(f"✗ Error connecting to ChromaDB: {e}")
         raise e
 
+
+def _bound_request_time(client):
+    # The sync client has no timeout setting and its httpx session waits
+    # forever; collections send their requests through the same session
+    session = getattr(getattr(client, "_server", None), "_session", None)
+    if isinstance(session, httpx.Client):
+        session.timeout = httpx.Timeout(CHROMA_REQUEST_TIMEOUT)
+    else:
+        print("⚠ Could not set a request timeout on the ChromaDB client; calls may wait indefinitely")
+
+
+class _GuardedCollection:
+    """
+    A collection handle whose calls go through the circuit breaker. Each
+    request is bounded by CHROMA_REQUEST_TIMEOUT on the client's HTTP session.
+    """
+
+    def __init__(self, name, collection):
+        self._name = name
+        self._collection = collection
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            try:
+                with chroma_breaker.guard():
+                    return value(*args, **kwargs)
+            except Exception as e:
+                if _is_outage(e):
+                    # The collection may be gone (e.g. after a server reset); look it up again next time
+                    _collections.pop(self._name, None)
+                raise
+        return call
+
+
+class _AsyncGuardedCollection:
+    """
+    An async collection handle: every call is awaited with a timeout
+    (CHROMA_REQUEST_TIMEOUT, or timeout=) and goes through the circuit breaker.
+    """
+
+    def __init__(self, name, collection):
+        self._name = name
+        self._collection = collection
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if not callable(value):
+            return value
+
+        async def call(*args, timeout: float = None, **kwargs):
+            timeout = timeout or CHROMA_REQUEST_TIMEOUT
+            try:
+                with chroma_breaker.guard():
+                    try:
+                        return await asyncio.wait_for(value(*args, **kwargs), timeout)
+                    except asyncio.TimeoutError:
+                        raise TimeoutError(f"ChromaDB {attr} timed out after {timeout:.0f}s") from None
+            except Exception as e:
+                if _is_outage(e):
+                    _async_collections.pop(self._name, None)
+                raise
+        return call
+
+
+# Collection handles, created once instead of a get_or_create round trip per call
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def get_collection(name: str):
+    collection = _collections.get(name)
+    if collection is not None:
+        return collection
+    with _collections_lock:
+        collection = _collections.get(name)
+        if collection is None:
+            with chroma_breaker.guard():
+                handle = get_chroma_client().get_or_create_collection(name=name, metadata=COLLECTIONS[name])
+            collection = _collections[name] = _GuardedCollection(name, handle)
+        return collection
+
+
 def get_face_collection():
-    client = get_chroma_client()
-    # Collection for face embeddings (already computed by InsightFace)
     # We don't need an embedding function because we provide embeddings directly
-    return client.get_or_create_collection(
-        name="faces",
-        metadata={"hnsw:space": "cosine"} # Use cosine similarity for face embeddings
-    )
+    return get_collection("faces")
 
 def get_conversation_collection():
-    client = get_chroma_client()
-    # Collection for conversation history
-    # Uses default embedding function (all-MiniLM-L6-v2) for text
-    return client.get_or_create_collection(
-        name="conversations",
-        metadata={"hnsw:space": "cosine"}
-    )
+    return get_collection("conversations")
+
+
+_async_client = None
+_async_collections = {}
+_async_lock = asyncio.Lock()
+
+
+async def get_async_chroma_client():
+    """
+    The shared async ChromaDB client, for use inside async routes. Requests go
+    through a pooled httpx.AsyncClient, so they never block the event loop.
+    """
+    global _async_client
+    if _async_client is None:
+        async with _async_lock:
+            if _async_client is None:
+                with chroma_breaker.guard():
+                    _async_client = await asyncio.wait_for(
+                        chromadb.AsyncHttpClient(**_connection_kwargs()), CHROMA_REQUEST_TIMEOUT
+                    )
+                print(f"✓ Async ChromaDB client connected")
+    return _async_client
+
+
+async def get_async_collection(name: str):
+    collection = _async_collections.get(name)
+    if collection is not None:
+        return collection
+    client = await get_async_chroma_client()
+    async with _async_lock:
+        collection = _async_collections.get(name)
+        if collection is None:
+            with chroma_breaker.guard():
+                handle = await asyncio.wait_for(
+                    client.get_or_create_collection(name=name, metadata=COLLECTIONS[name]), CHROMA_REQUEST_TIMEOUT
+                )
+            collection = _async_collections[name] = _AsyncGuardedCollection(name, handle)
+        return collection
+
+
+async def get_async_face_collection():
+    return await get_async_collection("faces")
+
+async def get_async_conversation_collection():
+    return await get_async_collection("conversations")
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -22,3 +22,71 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Names of unique indexes that could not be created. Code that relies on one for
+# ON CONFLICT idempotency checks this and warns that it is degraded.
+missing_unique_indexes = set()
+
+# Indexes replaced by differently defined ones; dropped before the new ones are created
+RETIRED_INDEXES = [
+    "uq_interactions_user_contact_name_timestamp",  # now partial: uq_interactions_log_user_contact_name_timestamp
+]
+
+def ensure_indexes():
+    """
+    Create indexes declared on the models that are missing from existing tables.
+    create_all() only builds indexes together with new tables.
+    """
+    with engine.begin() as conn:
+        for name in RETIRED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                if not index.unique:
+                    print(f"⚠ Could not create index {index.name}: {e}")
+                    continue
+                # Usually rows that already hold duplicates. Inserts can no longer
+                # conflict on this key, so duplicates are only caught by pre-checks
+                missing_unique_indexes.add(index.name)
+                columns = ", ".join(column.name for column in index.columns)
+                print(f"⚠ Could not create unique index {index.name} on {table.name} ({columns}): {e}")
+                try:
+                    # Partial indexes only cover the rows matching their WHERE clause
+                    where = index.dialect_options[engine.dialect.name].get("where") \
+                        if engine.dialect.name in ("postgresql", "sqlite") else None
+                    condition = ""
+                    if where is not None:
+                        condition = " WHERE " + str(where.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+                    with engine.connect() as conn:
+                        duplicates = conn.execute(text(
+                            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table.name}{condition} GROUP BY {columns} HAVING COUNT(*) > 1) AS d"
+                        )).scalar()
+                    print(f"⚠ {duplicates} groups of rows share a {index.name} key")
+                except Exception:
+                    pass
+                print(f"⚠ Idempotency on {index.name} is DEGRADED: remove the duplicates and restart the server")
+
+def ensure_columns():
+    """
+    Add nullable columns declared on the models that are missing from existing tables.
+    create_all() never alters a table that already exists.
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+                print(f"✓ Added column {table.name}.{column.name}")
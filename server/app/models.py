@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, JSON, LargeBinary
-from sqlalchemy.orm import relationship as sa_relationship
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, JSON, LargeBinary, UniqueConstraint, Index
+from sqlalchemy.orm import relationship as sa_relationship, deferred
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -39,11 +39,31 @@ class Contact(Base):
     visit_frequency = Column(String, nullable=True)
     last_seen = Column(DateTime(timezone=True), nullable=True)
     is_active = Column(Boolean, default=True)
-    profile_photo = Column(LargeBinary, nullable=True) # Binary image data for face recognition
+    profile_photo = deferred(Column(LargeBinary, nullable=True)) # Legacy in-row image data, moved to the photo store on startup
+    profile_photo_key = Column(String(64), nullable=True) # sha256 key of the photo in the photo store
     profile_photo_filename = Column(String, nullable=True) # Original filename for reference
     
     user = sa_relationship("User", back_populates="contacts")
 
+    @property
+    def has_profile_photo(self) -> bool:
+        # Checking the key first avoids loading the deferred legacy column
+        return self.profile_photo_key is not None or self.profile_photo is not None
+
+class FaceEmbedding(Base):
+    """Cached ArcFace embedding of a photo, so unchanged photos are never re-embedded."""
+    __tablename__ = "face_embeddings"
+    __table_args__ = (
+        UniqueConstraint("photo_hash", "model_name", "det_size", name="uq_face_embeddings_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    photo_hash = Column(String(64), nullable=False) # sha256 of the image bytes
+    model_name = Column(String, nullable=False)
+    det_size = Column(String, nullable=False) # e.g. "320x320"
+    embedding = Column(LargeBinary, nullable=True) # float32 vector; NULL when the photo has no face
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Interaction(Base):
     __tablename__ = "interactions"
 
@@ -58,9 +78,25 @@ class Interaction(Base):
     duration = Column(String, nullable=True)
     location = Column(String, nullable=True)
     starred = Column(Boolean, default=False)
+    source = Column(String, nullable=True) # CONVERSATION_LOG_SOURCE for conversations also kept in the local log
 
     user = sa_relationship("User", back_populates="interactions")
 
+# Interaction.source of rows for conversations recorded in the local conversation log
+CONVERSATION_LOG_SOURCE = "conversation_log"
+
+# Serves "latest interaction(s) per contact" lookups without sorting
+Index("ix_interactions_contact_id_timestamp", Interaction.contact_id, Interaction.timestamp.desc())
+# Natural key of a conversation from the local log; makes re-syncs idempotent.
+# Only log rows are covered, so manual and chat interactions may share a key
+Index(
+    "uq_interactions_log_user_contact_name_timestamp",
+    Interaction.user_id, Interaction.contact_name, Interaction.timestamp,
+    unique=True,
+    postgresql_where=Interaction.source == CONVERSATION_LOG_SOURCE,
+    sqlite_where=Interaction.source == CONVERSATION_LOG_SOURCE
+)
+
 class Alert(Base):
     __tablename__ = "alerts"
 
@@ -9,7 +9,7 @@ from pydantic import BaseModel
 from ..database import get_db
 from ..models import Interaction, User
 from ..utils.auth import get_current_user
-from ..chroma_client import get_conversation_collection
+from ..chroma_client import get_conversation_collection, chroma_breaker
 from ai_engine.summarizer import InteractionSummarizer
 from ai_engine.rag_engine import InteractionRAG
 
@@ -299,6 +299,7 @@ def ai_health_check():
     return {
         "gemini_configured": gemini_configured,
         "chroma_available": chroma_available,
+        "chroma_circuit": chroma_breaker.state,
         "indexed_interactions": chroma_count,
         "status": "healthy" if (gemini_configured and chroma_available) else "degraded"
     }
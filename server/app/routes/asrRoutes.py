@@ -14,31 +14,49 @@ from jose import jwt, JWTError
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from ai_engine.asr import ASREngine, ConversationStore, ConversationLinker
+from ai_engine.asr.asr_scheduler import asr_scheduler, PRIORITY_LIVE, PRIORITY_FINAL
+from ai_engine.asr.streaming import OnlineASRProcessor
+from ai_engine.asr.vad_engine import SpeechSegmenter
+from ai_engine.asr.audio_buffer import AudioRingBuffer
+from ai_engine.asr.long_form import transcribe_long_form
+from ai_engine.text_embedder import text_embedder
 from ..database import get_db
 from ..models import Contact, User
-from ..chroma_client import get_conversation_collection
+from ..chroma_client import get_conversation_collection, get_async_conversation_collection
 from ..utils.auth import SECRET_KEY, ALGORITHM
+from ..services.interaction_service import sync_conversations, keyword_search_interactions
 
 router = APIRouter(
     prefix="/asr",
     tags=["ASR"]
 )
 
-# Initialize engines
-# Use 'base.en' model which is optimized for English (better accuracy/speed than generic base)
+# Live subtitles: "streaming" decodes incrementally with LocalAgreement
+# (partial/final events); "window" re-transcribes a rolling 6 s window
+ASR_SUBTITLE_MODE = os.getenv("ASR_SUBTITLE_MODE", "streaming")
+# Final transcript on disconnect: "incremental" reuses the text committed by the
+# streaming decoder and only decodes the uncommitted tail; "full" re-transcribes
+# the whole session audio (always used in "window" subtitle mode)
+ASR_FINAL_TRANSCRIPT = os.getenv("ASR_FINAL_TRANSCRIPT", "incremental")
+# Words of committed text kept on screen in front of the partial text
+SUBTITLE_TAIL_WORDS = 12
+# How long the last subtitle stays up after speech ends
+SUBTITLE_HOLD_SEC = float(os.getenv("SUBTITLE_HOLD_SEC", "3.0"))
+
+# Initialize the shared model and job queue for all sessions
+# ('base.en' by default, which is optimized for English; see ASR_MODEL_SIZE)
 try:
-    asr_engine = ASREngine(model_size="base.en")
-    print("ASR Engine initialized in routes.")
+    asr_scheduler.start()
+    print("ASR scheduler initialized in routes.")
 except Exception as e:
-    print(f"Failed to initialize ASR Engine: {e}")
-    asr_engine = None
+    print(f"Failed to initialize ASR scheduler: {e}")
 
 @router.get("/conversations")
 async def get_conversations(
     profile_id: str = None,
     db: Session = Depends(get_db)
 ):
-    """Get conversations from JSON file (backward compatibility)"""
+    """Get conversations from the local conversation log (backward compatibility)"""
     try:
         store = ConversationStore()
         conversations = store.get_conversations(profile_id=profile_id)
@@ -52,86 +70,29 @@ async def sync_conversations_to_db(
     user_id: int,
     db: Session = Depends(get_db)
 ):
-    """Sync conversations from JSON file to database and ChromaDB"""
+    """Sync conversations from the local conversation log to database and ChromaDB"""
     try:
-        from ..models import Interaction, Contact
-        
-        # Load conversations from JSON
+        # Load conversations from the local log
         store = ConversationStore()
         conversations = store.get_conversations()
         
-        chroma_collection = get_conversation_collection()
-        synced_count = 0
-        
-        for conv in conversations:
-            profile_id = conv.get("profile_id")
-            transcript = conv.get("transcript")
-            timestamp = conv.get("timestamp")
-            
-            if not profile_id or not transcript:
-                continue
-            
-            # Try to find contact
-            contact_id = None
-            contact = db.query(Contact).filter(
-                Contact.user_id == user_id,
-                Contact.name == profile_id,
-                Contact.is_active == True
-            ).first()
-            if contact:
-                contact_id = contact.id
-            
-            # Check if already exists in database
-            existing = db.query(Interaction).filter(
-                Interaction.user_id == user_id,
-                Interaction.contact_name == profile_id,
-                Interaction.timestamp == timestamp
-            ).first()
-            
-            if existing:
-                continue
-            
-            # Create interaction
-            db_interaction = Interaction(
-                user_id=user_id,
-                contact_id=contact_id,
-                contact_name=profile_id,
-                summary=transcript[:200] + "..." if len(transcript) > 200 else transcript,
-                full_details=transcript,
-                timestamp=timestamp
-            )
-            
-            db.add(db_interaction)
-            db.commit()
-            db.refresh(db_interaction)
-            
-            # Add to ChromaDB
-            try:
-                chroma_collection.add(
-                    ids=[f"interaction_{db_interaction.id}"],
-                    documents=[transcript],
-                    metadatas=[{
-                        "type": "conversation",
-                        "interaction_id": db_interaction.id,
-                        "user_id": user_id,
-                        "contact_id": contact_id or -1,
-                        "contact_name": profile_id,
-                        "timestamp": timestamp
-                    }]
-                )
-            except Exception as e:
-                print(f"Error adding to ChromaDB: {e}")
-            
-            synced_count += 1
+        # Bulk and idempotent: entries already in the database are skipped.
+        # Off the event loop, since it talks to the database and ChromaDB synchronously
+        synced = await asyncio.to_thread(
+            lambda: sync_conversations(db, user_id, conversations, get_conversation_collection())
+        )
         
         return {
-            "message": f"Synced {synced_count} conversations to database and ChromaDB",
-            "count": synced_count
+            "message": f"Synced {synced['count']} conversations to database and ChromaDB",
+            "count": synced["count"],
+            # Entries without a timestamp in the log, inserted at sync time
+            "undated": synced["undated"]
         }
     except Exception as e:
         print(f"Error syncing conversations: {e}")
         import traceback
         traceback.print_exc()
+        db.rollback()
         return {"error": str(e), "count": 0}
 
 @router.get("/search-conversations")
@@ -148,34 +109,43 @@ async def search_conversations(
     try:
         from ..models import Interaction, Contact
         
-        chroma_collection = get_conversation_collection()
-        
-        # Query ChromaDB for similar conversations
-        results = chroma_collection.query(
-            query_texts=[query],
-            n_results=limit,
-            where={"user_id": user_id}
-        )
+        results = None
+        try:
+            chroma_collection = await get_async_conversation_collection()
+            
+            # Query ChromaDB for similar conversations
+            query_embeddings = await asyncio.to_thread(text_embedder.embed, [query])
+            results = await chroma_collection.query(
+                query_embeddings=query_embeddings,
+                n_results=limit,
+                where={"user_id": user_id}
+            )
+        except Exception as e:
+            # ChromaDB is down or slow: keep search working with keyword matching
+            print(f"⚠ Semantic search unavailable ({e}); falling back to keyword search")
         
-        if not results or not results['ids'] or not results['ids'][0]:
-            return {"results": [], "count": 0}
+        if results is None:
+            interaction_ids = keyword_search_interactions(db, user_id, query, limit)
+        else:
+            if not results or not results['ids'] or not results['ids'][0]:
+                return {"results": [], "count": 0}
         
-        # Extract interaction IDs from ChromaDB results
-        interaction_ids = []
-        distances = results['distances'][0] if results.get('distances') else []
-        metadatas = results['metadatas'][0] if results.get('metadatas') else []
-        documents = results['documents'][0] if results.get('documents') else []
+            # Extract interaction IDs from ChromaDB results
+            interaction_ids = []
+            distances = results['distances'][0] if results.get('distances') else []
+            metadatas = results['metadatas'][0] if results.get('metadatas') else []
+            documents = results['documents'][0] if results.get('documents') else []
         
-        for i, chroma_id in enumerate(results['ids'][0]):
-            # Extract interaction_id from "interaction_{id}" format
-            if chroma_id.startswith("interaction_"):
-                interaction_id = int(chroma_id.split("_")[1])
-                interaction_ids.append({
-                    "id": interaction_id,
-                    "distance": distances[i] if i < len(distances) else None,
-                    "metadata": metadatas[i] if i < len(metadatas) else {},
-                    "snippet": documents[i][:200] if i < len(documents) else ""
-                })
+            for i, chroma_id in enumerate(results['ids'][0]):
+                # Extract interaction_id from "interaction_{id}" format
+                if chroma_id.startswith("interaction_"):
+                    interaction_id = int(chroma_id.split("_")[1])
+                    interaction_ids.append({
+                        "id": interaction_id,
+                        "distance": distances[i] if i < len(distances) else None,
+                        "metadata": metadatas[i] if i < len(metadatas) else {},
+                        "snippet": documents[i][:200] if i < len(documents) else ""
+                    })
         
         # Fetch full interaction details from database
         search_results = []
@@ -220,7 +190,8 @@ async def search_conversations(
         return {
             "results": search_results,
             "count": len(search_results),
-            "query": query
+            "query": query,
+            "mode": "semantic" if results is not None else "keyword"
         }
         
     except Exception as e:
@@ -229,6 +200,31 @@ async def search_conversations(
         traceback.print_exc()
         return {"results": [], "count": 0, "error": str(e)}
 
+async def transcribe_session_file(path: str, linker: ConversationLinker, profile_id: str, user_id: int, contact_id):
+    """Transcribe a whole recorded session (raw float32 PCM) and save it."""
+    file_size = os.path.getsize(path)
+    print(f"Transcribing audio session from disk: {file_size} bytes")
+
+    if file_size > 0 and asr_scheduler.ready:
+        duration_seconds = file_size / 4 / 16000
+        print(f"Total audio duration: {duration_seconds:.2f} seconds")
+
+        if duration_seconds > 0.5: # Minimum threshold
+            # Memory-mapped and cut at silences into segments of up to 30s, which
+            # are transcribed in parallel on replicas not busy with live subtitles
+            session = asr_scheduler.session(priority=PRIORITY_FINAL)
+            transcript, _ = await asyncio.to_thread(transcribe_long_form, session, path, asr_scheduler.replicas)
+            print(f"✓ Final Complete Transcript: {transcript}")
+
+            if transcript and transcript.strip():
+                result = linker.link_and_save(profile_id, transcript, user_id=user_id, contact_id=contact_id)
+                if result:
+                    print(f"✓ Saved to DB/Chroma")
+            else:
+                 print("⚠ Empty transcript")
+        else:
+            print("⚠ Audio too short")
+
 @router.websocket("/{user_id}/{profile_id}")
 async def websocket_asr(
     websocket: WebSocket, 
@@ -282,17 +278,8 @@ async def websocket_asr(
     except Exception as e:
         print(f"Error sending connection confirmation: {e}")
     
-    # ChromaDB collection - ensure it's available for storing voice-to-text embeddings
-    chroma_collection = None
-    try:
-        chroma_collection = get_conversation_collection()
-        print(f"✓ ChromaDB collection ready for storing voice-to-text embeddings")
-    except Exception as e:
-        print(f"⚠ Warning: ChromaDB not available: {e}")
-        print(f"⚠ Conversations will be saved to database only, without semantic search capability")
-    
-    # Initialize store and linker with database and ChromaDB
-    store = ConversationStore(db_session=db, chroma_collection=chroma_collection)
+    # Initialize store and linker with the database (ChromaDB indexing is queued in the background)
+    store = ConversationStore(db_session=db)
     linker = ConversationLinker(store)
     
     # Try to find contact_id from profile_id (name)
@@ -318,20 +305,35 @@ async def websocket_asr(
     session_audio_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pcm')
     start_time = asyncio.get_event_loop().time()
     
-    audio_buffer_ram = [] # Keep small buffer for real-time subtitles only
+    # Keep small buffer for real-time subtitles only (running window of 6s * 16000 = 96000 samples;
+    # we have full backup on disk)
+    audio_window = AudioRingBuffer(96000)
     chunk_counter = 0
     total_bytes_received = 0
     
     TRANSCRIBE_INTERVAL_CHUNKS = 5 # Slightly increased to batch better
-    RMS_THRESHOLD = 0.002 # Adjusted: 0.0003 was too sensitive, picking up noise. 0.005 is normal speech.
+    RMS_THRESHOLD = 0.002 # Noise floor: VAD can trigger on steady low-level noise
     
     last_activity_time = asyncio.get_event_loop().time()
     IDLE_TIMEOUT = 60.0 # Extended further
     last_transcript = ""  
+    
+    # Frame-level VAD: only speech reaches ASR, so Whisper's own VAD is turned off
+    segmenter = SpeechSegmenter()
+    speech_end_time = None
+    
+    # All of this connection's transcriptions run one at a time on the shared scheduler
+    asr_session = asr_scheduler.session(f"{user_id}/{profile_id}/{id(websocket)}", priority=PRIORITY_LIVE)
+    
+    # Streaming mode: per-connection incremental decoder and the text on screen
+    processor = OnlineASRProcessor(asr_session, vad_filter=False) if ASR_SUBTITLE_MODE == "streaming" and asr_scheduler.ready else None
+    subtitle_line = []
+    last_partial = ""
+    
     last_ping_time = asyncio.get_event_loop().time()
     PING_INTERVAL = 20.0 
 
-    if not asr_engine:
+    if not asr_scheduler.ready:
         print("❌ Error: ASR Engine is not initialized")
         try:
             await websocket.send_json({
@@ -383,22 +385,12 @@ async def websocket_asr(
             except Exception as e:
                 print(f"Error writing to temp file: {e}")
             
-            # 2. Process for Real-time Subtitles (Keep small RAM buffer)
+            # 2. Process for Real-time Subtitles (speech only, small RAM buffer)
             try:
                 # Convert bytes to numpy array (float32) for fast processing
                 chunk = np.frombuffer(data, dtype=np.float32)
-                
-                audio_buffer_ram.append(chunk)
+                vad_events = segmenter.process(chunk)
                 chunk_counter += 1
-                
-                # Manage RAM buffer size (Running window of ~6 seconds)
-                # If too large, pop from front (we have full backup on disk)
-                # 6s * 16000 = 96000 samples
-                current_ram_samples = sum(len(c) for c in audio_buffer_ram)
-                if current_ram_samples > 96000:
-                    # Remove chunks from beginning until we are under limit
-                    while len(audio_buffer_ram) > 1 and sum(len(c) for c in audio_buffer_ram) > 96000:
-                         audio_buffer_ram.pop(0)
 
                 # Log periodic
                 if chunk_counter % 50 == 0:
@@ -408,19 +400,88 @@ async def websocket_asr(
                 print(f"Error converting/buffering audio: {e}")
                 continue
             
+            try:
+                for kind, speech_audio in vad_events:
+                    if kind == "start":
+                        speech_end_time = None
+                    elif kind == "audio":
+                        if processor is not None:
+                            processor.insert_audio_chunk(speech_audio)
+                        else:
+                            # Oldest samples drop out once the window is full
+                            audio_window.append(speech_audio)
+                    elif kind == "end":
+                        # End of an utterance: its subtitle is final
+                        speech_end_time = current_time
+                        if processor is not None:
+                            tail = await asyncio.to_thread(processor.finalize)
+                            subtitle_line = (subtitle_line + tail.split())[-SUBTITLE_TAIL_WORDS:]
+                            last_partial = ""
+                            if subtitle_line:
+                                if tail:
+                                    print(f"✓ Subtitle: {tail}")
+                                await websocket.send_json({
+                                    "type": "subtitle",
+                                    "event": "final",
+                                    "text": " ".join(subtitle_line),
+                                    "partial": "",
+                                    "final": tail
+                                })
+                        elif len(audio_window) and audio_window.rms() > RMS_THRESHOLD:
+                            chunk_counter = 0
+                            transcript = await asr_scheduler.submit(ASREngine.transcribe_audio_chunk, audio_window.window(), False, session=asr_session.key)
+                            if transcript and transcript.strip() and transcript != last_transcript:
+                                last_transcript = transcript
+                                print(f"✓ Subtitle: {transcript}")
+                                await websocket.send_json({"type": "subtitle", "text": transcript})
+                        if processor is None:
+                            audio_window.clear()
+            except Exception as e:
+                print(f"Speech segment error: {e}")
+            
+            # Clear the subtitle once speech has been over for a while
+            if speech_end_time is not None and current_time - speech_end_time > SUBTITLE_HOLD_SEC:
+                speech_end_time = None
+                if processor is not None and subtitle_line:
+                    subtitle_line = []
+                    await websocket.send_json({"type": "subtitle", "event": "final", "text": "", "final": ""})
+                elif processor is None and last_transcript:
+                    last_transcript = ""
+                    await websocket.send_json({"type": "subtitle", "text": ""})
+            
+            # --- Streaming Transcription for Subtitles ---
+            if processor is not None:
+                if processor.ready():
+                    try:
+                        final, partial = await asyncio.to_thread(processor.process_iter)
+                        
+                        if final:
+                            subtitle_line = (subtitle_line + final.split())[-SUBTITLE_TAIL_WORDS:]
+                        if final or partial != last_partial:
+                            last_partial = partial
+                            event = {
+                                "type": "subtitle",
+                                "event": "final" if final else "partial",
+                                "text": " ".join(subtitle_line + ([partial] if partial else [])),
+                                "partial": partial
+                            }
+                            if final:
+                                event["final"] = final
+                                print(f"✓ Subtitle: {final}")
+                            await websocket.send_json(event)
+                    except Exception as e:
+                        print(f"Streaming transcribe error: {e}")
+                continue
+            
             # --- Incremental Transcription for Subtitles ---
-            if chunk_counter >= TRANSCRIBE_INTERVAL_CHUNKS and asr_engine:
+            if chunk_counter >= TRANSCRIBE_INTERVAL_CHUNKS and asr_scheduler.ready and segmenter.triggered:
                 chunk_counter = 0
                 try:
-                    # Create continuous buffer from RAM chunks
-                    current_window = np.concatenate(audio_buffer_ram)
-                    
-                    # Enhanced VAD: RMS
-                    rms = np.sqrt(np.mean(current_window**2))
-                    
-                    if len(current_window) > 8000 and rms > RMS_THRESHOLD:
-                         # Run ASR on threadpool
-                        transcript = await asyncio.to_thread(asr_engine.transcribe_audio_chunk, current_window)
+                    # Contiguous view of the speech window (no copy); nothing is appended
+                    # to it while this coroutine waits for the transcription
+                    if len(audio_window) > 8000 and audio_window.rms() > RMS_THRESHOLD:
+                         # Run ASR on the shared scheduler
+                        transcript = await asr_scheduler.submit(ASREngine.transcribe_audio_chunk, audio_window.window(), False, session=asr_session.key)
                         
                         if transcript and transcript.strip() and transcript != last_transcript:
                             last_transcript = transcript
@@ -429,16 +490,6 @@ async def websocket_asr(
                                 "type": "subtitle",
                                 "text": transcript
                             })
-                    else:
-                        # Clear subtitle if silence
-                         if rms <= RMS_THRESHOLD and last_transcript:
-                            # Only clear if we really think it's silent for a bit
-                            # Check if just the END is silent? No, straightforward RMS is okay for now.
-                            last_transcript = ""
-                            await websocket.send_json({
-                                "type": "subtitle",
-                                "text": ""
-                            })
 
                 except Exception as e:
                     print(f"Incremental transcribe error: {e}")
@@ -460,42 +511,25 @@ async def websocket_asr(
         session_audio_file.close() # Close handle to ensure flush
         
         try:
-            # Read full file back
-            file_size = os.path.getsize(session_audio_file.name)
-            print(f"Reading full audio session from disk: {file_size} bytes")
-            
-            if file_size > 0 and asr_engine:
-                 # Read raw bytes
-                with open(session_audio_file.name, "rb") as f:
-                    full_audio_bytes = f.read()
-                
-                # Convert to numpy
-                full_audio = np.frombuffer(full_audio_bytes, dtype=np.float32)
-                
-                duration_seconds = len(full_audio) / 16000
-                print(f"Total audio duration: {duration_seconds:.2f} seconds")
+            if processor is not None and ASR_FINAL_TRANSCRIPT == "incremental":
+                # Segments were committed during the session; only the tail is left to decode
+                # (behind any live subtitle work of other sessions)
+                asr_session.priority = PRIORITY_FINAL
+                tail = await asyncio.to_thread(processor.finalize)
+                transcript = processor.committed_text()
+                print(f"✓ Final Complete Transcript (tail: {tail!r}): {transcript}")
                 
-                if duration_seconds > 0.5: # Minimum threshold
-                    print(f"Transcribing full session...")
-                    # For very long audio, we might want to split? 
-                    # Faster-whisper handles reasonable lengths well (30s+). 
-                    # If > 30s, it handles it internally via sliding window if configured, 
-                    # but simple transcribe works good enough for minutes usually.
-                    
-                    transcript = await asyncio.to_thread(asr_engine.transcribe_audio_chunk, full_audio)
-                    print(f"✓ Final Complete Transcript: {transcript}")
-                    
-                    if transcript and transcript.strip():
-                        result = linker.link_and_save(profile_id, transcript, user_id=user_id, contact_id=contact_id)
-                        if result:
-                            print(f"✓ Saved to DB/Chroma")
-                    else:
-                         print("⚠ Empty transcript")
+                if transcript:
+                    result = linker.link_and_save(profile_id, transcript, user_id=user_id, contact_id=contact_id)
+                    if result:
+                        print(f"✓ Saved to DB/Chroma")
                 else:
-                    print("⚠ Audio too short")
+                    print("⚠ Empty transcript")
+            else:
+                await transcribe_session_file(session_audio_file.name, linker, profile_id, user_id, contact_id)
 
         except Exception as e:
-            print(f"❌ Error processing final audio file: {e}")
+            print(f"❌ Error processing final audio: {e}")
             import traceback
             traceback.print_exc()
         
@@ -10,6 +10,7 @@ from ..database import get_db
 from ..models import User, ChatMessage as ChatMessageModel
 from ..utils.auth import get_current_user
 from ..services.ai_service import ai_assistant
+from ..services.chroma_indexer import chroma_indexer
 
 router = APIRouter(
     prefix="/chat",
@@ -17,6 +18,20 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def index_chat_messages(user_id: int, conversation_id: str, messages):
+    """Queue chat messages for semantic search; indexing never delays the response."""
+    timestamp = datetime.now().isoformat()
+    chroma_indexer.enqueue_many([
+        (f"msg_{message.id}", message.content, {
+            "type": "chat_message",
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "role": message.role,
+            "timestamp": timestamp
+        })
+        for message in messages
+    ])
+
 # Pydantic models
 class ChatMessageRequest(BaseModel):
     message: str
@@ -85,38 +100,8 @@ async def send_chat_message(
         db.add(assistant_message)
         db.commit()
         
-        # Index messages in ChromaDB
-        try:
-            from app.chroma_client import get_conversation_collection
-            collection = get_conversation_collection()
-            
-            # Index user message
-            collection.add(
-                ids=[f"msg_{user_message.id}"],
-                documents=[user_message.content],
-                metadatas=[{
-                    "type": "chat_message",
-                    "user_id": current_user.id,
-                    "conversation_id": conversation_id,
-                    "role": "user",
-                    "timestamp": datetime.now().isoformat()
-                }]
-            )
-            
-            # Index assistant message
-            collection.add(
-                ids=[f"msg_{assistant_message.id}"],
-                documents=[assistant_message.content],
-                metadatas=[{
-                    "type": "chat_message",
-                    "user_id": current_user.id,
-                    "conversation_id": conversation_id,
-                    "role": "assistant",
-                    "timestamp": datetime.now().isoformat()
-                }]
-            )
-        except Exception as e:
-            print(f"Error indexing chat messages: {e}")
+        # Index messages in ChromaDB (in the background)
+        index_chat_messages(current_user.id, conversation_id, [user_message, assistant_message])
 
         return ChatResponse(
             response=ai_response,
@@ -187,42 +172,8 @@ async def send_chat_message_streaming(
                 db.add(assistant_message)
                 db.commit()
                 
-                # Index messages in ChromaDB
-                try:
-                    from app.chroma_client import get_conversation_collection
-                    collection = get_conversation_collection()
-                    
-                    # Index user message (we need to fetch it or reconstruct it, but we have the ID if we saved it earlier)
-                    # Actually user_message was saved before streaming started.
-                    # We can access user_message.id if it's in scope. 
-                    # user_message is defined in the outer scope, so it should be accessible.
-                    
-                    collection.add(
-                        ids=[f"msg_{user_message.id}"],
-                        documents=[user_message.content],
-                        metadatas=[{
-                            "type": "chat_message",
-                            "user_id": current_user.id,
-                            "conversation_id": conversation_id,
-                            "role": "user",
-                            "timestamp": datetime.now().isoformat()
-                        }]
-                    )
-                    
-                    # Index assistant message
-                    collection.add(
-                        ids=[f"msg_{assistant_message.id}"],
-                        documents=[assistant_message.content],
-                        metadatas=[{
-                            "type": "chat_message",
-                            "user_id": current_user.id,
-                            "conversation_id": conversation_id,
-                            "role": "assistant",
-                            "timestamp": datetime.now().isoformat()
-                        }]
-                    )
-                except Exception as e:
-                    print(f"Error indexing chat messages: {e}")
+                # Index messages in ChromaDB (in the background)
+                index_chat_messages(current_user.id, conversation_id, [user_message, assistant_message])
                 
                 yield "data: [DONE]\n\n"
             except Exception as e:
@@ -1,19 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, BackgroundTasks
 from fastapi.responses import Response
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
+import asyncio
 import base64
-import cv2
-import numpy as np
 
-from ..database import get_db
+from ..database import get_db, SessionLocal
 from ..models import Contact, User
 from ..utils.auth import get_current_user
-from ai_engine.face_engine import load_models, detect_and_embed
+from ai_engine.face_engine import embed_photo, photo_hash, embedding_cache, FACE_MODEL_VERSION
+from ai_engine.face_gallery import face_gallery
+from ai_engine.face_inference import face_inference, PRIORITY_ENROLL
 from ..chroma_client import get_face_collection
+from ..services.enrichment_service import enrichment_service
+from ..services.interaction_service import get_latest_interactions_before
+from ..services.blob_store import photo_store
 
 router = APIRouter(
     prefix="/contacts",
@@ -21,71 +26,78 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Load face recognition models once
-face_app = None
-
-def get_face_app():
-    global face_app
-    if face_app is None:
-        face_app = load_models()
-    return face_app
-
-def get_photo_url(contact_id: int, has_photo: bool, request: Request) -> Optional[str]:
+def get_photo_url(contact_id: int, has_photo: bool, request: Request, version: Optional[str] = None) -> Optional[str]:
     """Generate URL for contact photo endpoint"""
     if not has_photo:
         return None
     
     base_url = str(request.base_url).rstrip('/')
-    return f"{base_url}/contacts/{contact_id}/photo"
+    url = f"{base_url}/contacts/{contact_id}/photo"
+    # The photo key changes with the photo, so a versioned URL can be cached for good
+    if version:
+        url += f"?v={version[:16]}"
+    return url
 
-def get_effective_last_seen(contact_id: int, db: Session) -> Optional[datetime]:
+def get_effective_last_seen_map(contact_ids: List[int], db: Session) -> dict:
     """
-    Calculate the effective 'Last Met' time based on 1-hour minimum gap.
-    Returns the most recent interaction that is at least 1 hour old from current time.
-    All times are in IST (Indian Standard Time).
+    Calculate the effective 'Last Met' time based on 1-hour minimum gap for many contacts.
+    Returns {contact_id: time of the most recent interaction that is at least 1 hour old}
+    in IST (Indian Standard Time); contacts without one are absent.
     """
-    from ..models import Interaction
-    
-    # Fetch recent interactions (descending order)
-    interactions = db.query(Interaction).filter(
-        Interaction.contact_id == contact_id
-    ).order_by(Interaction.timestamp.desc()).limit(100).all()
-    
-    if not interactions:
-        return None
-    
-    # Get current time in IST
     ist_tz = ZoneInfo("Asia/Kolkata")
-    current_time = datetime.now(ist_tz)
-    cutoff_time = current_time - timedelta(hours=1)
+    cutoff_time = datetime.now(ist_tz) - timedelta(hours=1)
+    
+    latest = get_latest_interactions_before(db, contact_ids, cutoff_time)
     
-    # Find the most recent interaction that is at least 1 hour old
-    for interaction in interactions:
+    result = {}
+    for contact_id, interaction in latest.items():
         interaction_time = interaction.timestamp
-        
         # Ensure timezone info and convert to IST
         if interaction_time.tzinfo is None:
             # Assume UTC if no timezone
             interaction_time = interaction_time.replace(tzinfo=timezone.utc)
-        interaction_time = interaction_time.astimezone(ist_tz)
-        
-        # Return the first (most recent) interaction that's at least 1 hour old
-        if interaction_time < cutoff_time:
-            return interaction_time
-    
-    # No interaction found that's at least 1 hour old
-    return None
+        result[contact_id] = interaction_time.astimezone(ist_tz)
+    return result
+
+def get_effective_last_seen(contact_id: int, db: Session) -> Optional[datetime]:
+    """
+    Calculate the effective 'Last Met' time based on 1-hour minimum gap.
+    Returns the most recent interaction that is at least 1 hour old from current time.
+    All times are in IST (Indian Standard Time).
+    """
+    return get_effective_last_seen_map([contact_id], db).get(contact_id)
 
-def contact_to_response(contact: Contact, request: Request, db: Optional[Session] = None) -> dict:
-    """Convert a Contact ORM object to a response dict, handling binary photo data"""
+def contact_to_response(
+    contact: Contact,
+    request: Request,
+    db: Optional[Session] = None,
+    interaction_counts: Optional[dict] = None,
+    last_seen_map: Optional[dict] = None,
+    has_photo: Optional[bool] = None
+) -> dict:
+    """
+    Convert a Contact ORM object to a response dict, handling binary photo data.
+    List endpoints pass interaction_counts / last_seen_map (keyed by contact id)
+    and has_photo precomputed for the whole page instead of querying per contact.
+    """
     # Calculate total interactions if db session is provided
     total_interactions = 0
-    if db:
+    if interaction_counts is not None:
+        total_interactions = interaction_counts.get(contact.id, 0)
+    elif db:
         from ..models import Interaction
         total_interactions = db.query(Interaction).filter(
             Interaction.contact_id == contact.id
         ).count()
     
+    if last_seen_map is not None:
+        last_seen = last_seen_map.get(contact.id)
+    else:
+        last_seen = get_effective_last_seen(contact.id, db) if db else contact.last_seen
+    
+    if has_photo is None:
+        has_photo = contact.has_profile_photo
+    
     return {
         "id": contact.id,
         "user_id": contact.user_id,
@@ -99,67 +111,35 @@ def contact_to_response(contact: Contact, request: Request, db: Optional[Session
         "notes": contact.notes,
         "visit_frequency": contact.visit_frequency,
         "visit_frequency": contact.visit_frequency,
-        "last_seen": get_effective_last_seen(contact.id, db) if db else contact.last_seen,
+        "last_seen": last_seen,
         "is_active": contact.is_active,
         "profile_photo": None,  # Never return binary data
-        "profile_photo_url": get_photo_url(contact.id, contact.profile_photo is not None, request),
+        "profile_photo_url": get_photo_url(contact.id, has_photo, request, contact.profile_photo_key),
         "total_interactions": total_interactions
     }
 
-def sync_contact_to_chroma(contact_id: int, profile_photo: bytes, name: str, relationship: str, user_id: int):
+def embed_photos_cached(photos: List[bytes]) -> list:
     """
-    Sync a single contact's face embedding to ChromaDB.
-    Executed in background.
+    One embedding (or None if no face) per photo. Photos already in the
+    embedding cache are not re-embedded; the rest run on the inference pool.
     """
-    if not profile_photo:
-        print(f"No profile photo for contact {name}")
-        return
-    
+    db = SessionLocal()
     try:
-        import time
-        start_time = time.time()
-        
-        # Load face recognition models (should be pre-warmed on startup)
-        app = get_face_app()
-        
-        # Convert binary data to OpenCV image
-        nparr = np.frombuffer(profile_photo, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            print(f"Error: Could not decode image for {name}")
-            return
-        
-        # Extract embedding
-        data_list = detect_and_embed(app, img)
-        
-        if not data_list:
-            print(f"Error: No face detected for {name}")
-            return
-        
-        # Use the first detected face
-        data = data_list[0]
-        
-        # Get ChromaDB collection
-        collection = get_face_collection()
-        
-        # Upsert to ChromaDB with timeout handling (inherent in network request but we catch exceptions)
-        collection.upsert(
-            ids=[f"contact_{contact_id}"],
-            embeddings=[data["embedding"]],
-            metadatas=[{
-                "name": name,
-                "relation": relationship,
-                "contact_id": contact_id,
-                "user_id": user_id
-            }]
+        return embedding_cache.embed(
+            db,
+            photos,
+            lambda missing: [face_inference.run(embed_photo, photo, priority=PRIORITY_ENROLL) for photo in missing]
         )
-        
-        total_time = time.time() - start_time
-        print(f"✓ Successfully synced {name} to ChromaDB (background task, {total_time:.2f}s)")
-        
-    except Exception as e:
-        print(f"Error syncing contact {name} to ChromaDB: {e}")
+    finally:
+        db.close()
+
+def sync_contact_to_chroma(contact_id: int, profile_photo: bytes, name: str, relationship: str, user_id: int):
+    """
+    Sync a single contact's face embedding to ChromaDB, stored as its first
+    photo (contact_{id}_photo_0) like any other enrollment.
+    Executed in background.
+    """
+    sync_contact_to_chroma_multiple(contact_id, [profile_photo] if profile_photo else [], name, relationship, user_id)
 
 def sync_contact_to_chroma_multiple(contact_id: int, profile_photos: List[bytes], name: str, relationship: str, user_id: int):
     """
@@ -175,9 +155,6 @@ def sync_contact_to_chroma_multiple(contact_id: int, profile_photos: List[bytes]
         import time
         start_time = time.time()
         
-        # Load face recognition models (should be pre-warmed on startup)
-        app = get_face_app()
-        
         # Get ChromaDB collection
         collection = get_face_collection()
         
@@ -186,34 +163,25 @@ def sync_contact_to_chroma_multiple(contact_id: int, profile_photos: List[bytes]
         all_ids = []
         all_metadatas = []
         
-        for idx, photo_data in enumerate(profile_photos):
-            # Convert binary data to OpenCV image
-            nparr = np.frombuffer(photo_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                print(f"Error: Could not decode image {idx+1} for {name}")
-                continue
-            
-            # Extract embedding
-            data_list = detect_and_embed(app, img)
-            
-            if not data_list:
+        # Photos seen before (e.g. re-uploads) come straight from the embedding cache
+        photo_embeddings = embed_photos_cached(profile_photos)
+        
+        for idx, (photo_data, embedding) in enumerate(zip(profile_photos, photo_embeddings)):
+            if embedding is None:
                 print(f"Warning: No face detected in image {idx+1} for {name}")
                 continue
             
-            # Use the first detected face from each photo
-            data = data_list[0]
-            
             # Add to batch with unique ID for each photo
             all_ids.append(f"contact_{contact_id}_photo_{idx}")
-            all_embeddings.append(data["embedding"])
+            all_embeddings.append(embedding)
             all_metadatas.append({
                 "name": name,
                 "relation": relationship,
                 "contact_id": contact_id,
                 "user_id": user_id,
-                "photo_index": idx
+                "photo_index": idx,
+                "photo_hash": photo_hash(photo_data),
+                "model_version": FACE_MODEL_VERSION
             })
         
         if not all_embeddings:
@@ -227,6 +195,9 @@ def sync_contact_to_chroma_multiple(contact_id: int, profile_photos: List[bytes]
             metadatas=all_metadatas
         )
         
+        # Keep the in-memory recognition gallery in step with ChromaDB
+        face_gallery.upsert(user_id, all_ids, all_embeddings, all_metadatas)
+        
         total_time = time.time() - start_time
         print(f"✓ Successfully synced {len(all_embeddings)} embeddings for {name} to ChromaDB (background task, {total_time:.2f}s)")
         
@@ -240,6 +211,10 @@ def remove_contact_from_chroma(contact_id: int):
     Handles both single and multiple photo embeddings.
     Executed in background.
     """
+    # Drop from the in-memory recognition gallery first so the contact stops
+    # matching immediately, even if ChromaDB is unreachable
+    face_gallery.remove_contact(contact_id)
+    
     try:
         collection = get_face_collection()
         
@@ -264,6 +239,27 @@ def remove_contact_from_chroma(contact_id: int):
     except Exception as e:
         print(f"Error removing contact from ChromaDB: {e}")
 
+def update_contact_metadata_in_chroma(contact_id: int, name: str, relationship: str):
+    """
+    Update the name/relation stored with a contact's face embeddings
+    after the contact is edited without new photos.
+    Executed in background.
+    """
+    updates = {"name": name, "relation": relationship}
+    face_gallery.update_contact_metadata(contact_id, updates)
+    
+    try:
+        collection = get_face_collection()
+        results = collection.get(where={"contact_id": contact_id}, include=["metadatas"])
+        
+        if results and results['ids']:
+            collection.update(
+                ids=results['ids'],
+                metadatas=[{**metadata, **updates} for metadata in results['metadatas']]
+            )
+    except Exception as e:
+        print(f"Error updating contact metadata in ChromaDB: {e}")
+
 # Pydantic models
 class ContactBase(BaseModel):
     name: str
@@ -302,8 +298,38 @@ def get_contacts(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    contacts = db.query(Contact).filter(Contact.user_id == current_user.id, Contact.is_active == True).offset(skip).limit(limit).all()
-    return [contact_to_response(contact, request, db) for contact in contacts]
+    from ..models import Interaction
+    
+    # Photos live in the photo store; legacy in-row photos (deferred, never loaded
+    # here) only count until they are migrated
+    rows = db.query(
+        Contact,
+        or_(Contact.profile_photo_key.isnot(None), Contact.profile_photo.isnot(None)).label("has_photo")
+    ).filter(Contact.user_id == current_user.id, Contact.is_active == True).offset(skip).limit(limit).all()
+    
+    contact_ids = [contact.id for contact, _ in rows]
+    if not contact_ids:
+        return []
+    
+    # Interaction counts and effective last seen for the whole page in one query each
+    interaction_counts = dict(
+        db.query(Interaction.contact_id, func.count(Interaction.id)).filter(
+            Interaction.contact_id.in_(contact_ids)
+        ).group_by(Interaction.contact_id).all()
+    )
+    last_seen_map = get_effective_last_seen_map(contact_ids, db)
+    
+    return [
+        contact_to_response(
+            contact,
+            request,
+            db,
+            interaction_counts=interaction_counts,
+            last_seen_map=last_seen_map,
+            has_photo=has_photo
+        )
+        for contact, has_photo in rows
+    ]
 
 @router.post("/", response_model=ContactResponse)
 def create_contact(
@@ -340,8 +366,8 @@ async def create_contact_with_photo(
             photo_data = await p.read()
             all_photos.append(photo_data)
         
-        # Use the first photo for profile display
-        primary_photo = all_photos[0] if all_photos else None
+        # Use the first photo for profile display; the row only keeps its store key
+        primary_photo_key = await asyncio.to_thread(photo_store.put, all_photos[0]) if all_photos else None
         primary_filename = photo[0].filename if photo else None
         
         # Create contact with primary photo for display
@@ -354,7 +380,7 @@ async def create_contact_with_photo(
             email=email,
             notes=notes,
             visit_frequency=visit_frequency,
-            profile_photo=primary_photo,
+            profile_photo_key=primary_photo_key,
             profile_photo_filename=primary_filename,
             avatar=name[:2].upper(),
             color="indigo"
@@ -396,20 +422,50 @@ def get_contact(
 @router.get("/{contact_id}/photo")
 def get_contact_photo(
     contact_id: int,
+    request: Request,
+    size: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get the profile photo for a contact"""
+    """
+    Get the profile photo for a contact.
+    With ?size=N, returns the smallest pre-generated thumbnail at least N pixels
+    on its longer side. Responses carry an ETag and honour If-None-Match.
+    """
     contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == current_user.id).first()
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
     
-    if not contact.profile_photo:
+    if not contact.profile_photo_key and contact.profile_photo:
+        # Not migrated yet: move it to the photo store now
+        contact.profile_photo_key = photo_store.put(contact.profile_photo)
+        contact.profile_photo = None
+        db.commit()
+    
+    if not contact.profile_photo_key:
+        raise HTTPException(status_code=404, detail="No photo available")
+    
+    key = contact.profile_photo_key
+    # A versioned URL (see get_photo_url) always maps to the same bytes
+    if request.query_params.get("v") == key[:16]:
+        cache_control = "private, max-age=31536000, immutable"
+    else:
+        cache_control = "private, no-cache"
+    
+    # The served size is only known after resolving the request, so validate against
+    # the requested size; the same (key, size) always resolves to the same bytes
+    etag = f'"{key}-{size or "original"}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    data, served_size = photo_store.get(key, size)
+    if data is None:
         raise HTTPException(status_code=404, detail="No photo available")
     
-    # Determine media type from filename
+    # Thumbnails are always JPEG; otherwise determine media type from filename
     media_type = "image/jpeg"
-    if contact.profile_photo_filename:
+    if served_size is None and contact.profile_photo_filename:
         if contact.profile_photo_filename.lower().endswith('.png'):
             media_type = "image/png"
         elif contact.profile_photo_filename.lower().endswith('.gif'):
@@ -417,13 +473,14 @@ def get_contact_photo(
         elif contact.profile_photo_filename.lower().endswith('.webp'):
             media_type = "image/webp"
     
-    return Response(content=contact.profile_photo, media_type=media_type)
+    return Response(content=data, media_type=media_type, headers=headers)
 
 @router.put("/{contact_id}", response_model=ContactResponse)
 def update_contact(
     contact_id: int, 
     contact_update: ContactUpdate, 
     request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -436,6 +493,14 @@ def update_contact(
     
     db.commit()
     db.refresh(db_contact)
+    enrichment_service.invalidate(current_user.id, db_contact.id)
+    
+    background_tasks.add_task(
+        update_contact_metadata_in_chroma,
+        db_contact.id,
+        db_contact.name,
+        db_contact.relationship_detail or db_contact.relationship
+    )
     return contact_to_response(db_contact, request, db)
 
 @router.put("/{contact_id}/with-photo", response_model=ContactResponse)
@@ -486,12 +551,14 @@ async def update_contact_with_photo(
                 all_photos.append(photo_data)
             
             # Use first photo for profile display
-            db_contact.profile_photo = all_photos[0]
+            db_contact.profile_photo_key = await asyncio.to_thread(photo_store.put, all_photos[0])
+            db_contact.profile_photo = None
             db_contact.profile_photo_filename = photo[0].filename
             photo_updated = True
         
         db.commit()
         db.refresh(db_contact)
+        enrichment_service.invalidate(current_user.id, db_contact.id)
         
         # Sync to ChromaDB if photos were updated
         if photo_updated and all_photos:
@@ -506,6 +573,13 @@ async def update_contact_with_photo(
                 db_contact.relationship_detail or db_contact.relationship,
                 db_contact.user_id
             )
+        else:
+            background_tasks.add_task(
+                update_contact_metadata_in_chroma,
+                db_contact.id,
+                db_contact.name,
+                db_contact.relationship_detail or db_contact.relationship
+            )
 
         return contact_to_response(db_contact, request, db)
         
@@ -530,4 +604,5 @@ def delete_contact(
     # Hard delete from database
     db.delete(db_contact)
     db.commit()
+    enrichment_service.invalidate(current_user.id, contact_id)
     return {"message": "Contact deleted successfully"}
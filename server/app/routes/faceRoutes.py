@@ -1,22 +1,22 @@
 import asyncio
+import time
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, WebSocket, WebSocketDisconnect, Query, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-import cv2
-import numpy as np
-from ai_engine.face_engine import load_models, recognize_face, sync_embeddings_from_db
+from ai_engine.face_engine import recognize_face, recognize_face_tracked, sync_embeddings_from_db, decode_for_detection, FACE_DET_SIZE
+from ai_engine.face_inference import face_inference, FaceInferenceBusy, PRIORITY_LIVE
+from ai_engine.face_tracker import FaceTracker
+from ai_engine.latency_controller import DetSizeController
 from ..database import get_db
-from ..models import Contact, User
-from ..models import Contact, User
+from ..services.enrichment_service import enrichment_service
+from ..models import User
 from ..utils.auth import get_current_user, SECRET_KEY, ALGORITHM
 from jose import jwt, JWTError
 
 router = APIRouter()
 
-# Initialize models (lazy loading or global)
-# For better performance, we should load this once. 
-# In a real app, use a lifespan event or dependency injection.
-face_app = load_models()
+# Models are owned by the shared face_inference pool (started in the app lifespan),
+# so this router, the contacts router and enrollment all use the same sessions.
 
 # Images are stored via contacts page, not uploaded directly here
 
@@ -32,128 +32,58 @@ async def recognize_face_endpoint(
     try:
         # Read image directly from memory
         contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Large photos are decoded at reduced scale for detection; full resolution
+        # is only decoded later if a face needs an ArcFace crop
+        img = await asyncio.to_thread(decode_for_detection, contents)
         
         if img is None:
              raise HTTPException(status_code=400, detail="Invalid image data")
 
         # Pass user_id to restrict recognition to user's contacts
-        # Run CPU-bound face recognition in a separate thread to avoid blocking the event loop
-        result = await asyncio.to_thread(recognize_face, face_app, img, user_id=current_user.id)
+        # Run CPU-bound face recognition on the shared inference pool to avoid blocking the event loop
+        try:
+            result = await face_inference.submit(recognize_face, img, user_id=current_user.id, priority=PRIORITY_LIVE)
+        except FaceInferenceBusy:
+            raise HTTPException(status_code=503, detail="Face recognition is busy, try again shortly")
         
         # Ensure result is always a list
         if result is None:
             result = []
         
-        # If contacts are recognized, enrich with details (batch query for performance)
+        # If contacts are recognized, enrich with details (cached per user, see enrichment_service)
         if result:
-            from datetime import datetime, timezone
-            from zoneinfo import ZoneInfo
-            from ..models import Interaction
-            
-            # Collect all contact IDs for batch query
-            contact_ids = [res["contact_id"] for res in result if res.get("name") != "Unknown" and "contact_id" in res]
-            
-            if contact_ids:
-                from datetime import timedelta
-
-                # Batch query contacts
-                contacts = db.query(Contact).filter(Contact.id.in_(contact_ids)).all()
-                contact_map = {c.id: c for c in contacts}
-                
-                # Optimized: Fetch top interactions per contact
-                interaction_map = {} 
-                for cid in contact_ids:
-                    # Fetch recent interactions to find the most recent one that's at least 1 hour old
-                    recent = db.query(Interaction).filter(
-                        Interaction.contact_id == cid
-                    ).order_by(Interaction.timestamp.desc()).limit(20).all()
-                    
-                    if recent:
-                        formatted = []
-                        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=1)
-                        
-                        # Find the most recent interaction that is at least 1 hour old
-                        for r in recent:
-                            # Ensure timestamp has timezone info
-                            r_timestamp = r.timestamp
-                            if r_timestamp.tzinfo is None:
-                                r_timestamp = r_timestamp.replace(tzinfo=timezone.utc)
-                            
-                            if r_timestamp < cutoff_time:
-                                formatted.append({
-                                    "summary": r.summary,
-                                    "date": r_timestamp.isoformat(),
-                                    "timestamp": r_timestamp.isoformat()
-                                })
-                                # Only show the most recent one that's at least 1 hour old
-                                break 
-                        
-                        interaction_map[cid] = formatted
-                
-                # Enrich results
-                for res in result:
-                    if res.get("name") != "Unknown" and "contact_id" in res:
-                        contact_id = res["contact_id"]
-                        contact = contact_map.get(contact_id)
-                        
-                        if contact:
-                            # Capture PREVIOUS last_seen time
-                            last_seen_time = contact.last_seen
-                            
-                            # Get current time in IST
-                            ist_tz = ZoneInfo("Asia/Kolkata")
-                            current_time_ist = datetime.now(ist_tz)
-                            
-                            # Ensure timezone info - convert to IST if needed
-                            if last_seen_time:
-                                if last_seen_time.tzinfo is None:
-                                    # Assume UTC if no timezone
-                                    last_seen_time = last_seen_time.replace(tzinfo=timezone.utc)
-                                # Convert to IST for comparison
-                                last_seen_time = last_seen_time.astimezone(ist_tz)
-                            
-                            # Filter Last Seen: Only show if at least 1 hour ago
-                            cutoff_time = current_time_ist - timedelta(hours=1)
-                            
-                            if last_seen_time and last_seen_time < cutoff_time:
-                                res["last_seen_timestamp"] = last_seen_time.isoformat()
-                            else:
-                                res["last_seen_timestamp"] = None
-                            
-                            # Add history list
-                            history = interaction_map.get(contact_id, [])
-                            res["recent_interactions"] = history
-                            res["last_conversation_summary"] = history[0]["summary"] if history else None
-                            
-                            # Update last_seen to NOW in IST
-                            contact.last_seen = current_time_ist
-                
-                db.commit()
+            enrichment_service.enrich(db, current_user.id, result)
         
         return JSONResponse(content=result, status_code=200)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/sync-from-database")
 async def sync_faces_from_database(
+    incremental: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Sync face embeddings from database contacts.
-    This will rebuild the embeddings.json file from all contacts with profile photos.
+    This will rebuild the face embeddings in ChromaDB from all contacts with profile photos.
+    With incremental=true, contacts whose photo is already indexed by the current model are skipped.
     """
     try:
-        result = sync_embeddings_from_db(face_app, db)
+        # Photos are embedded at sync priority on the shared pool; run the loop
+        # itself off the event loop since it blocks on each photo
+        result = await asyncio.to_thread(sync_embeddings_from_db, face_inference, db, incremental=incremental)
         
         if result.get("success"):
             return JSONResponse(
                 content={
                     "message": f"Successfully synced {result['count']} face embeddings from database",
-                    "count": result["count"]
+                    "count": result["count"],
+                    "skipped": result["skipped"],
+                    "failed": result["failed"]
                 },
                 status_code=200
             )
@@ -165,11 +95,62 @@ async def sync_faces_from_database(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class LatestFrameSlot:
+    """
+    Single-slot, latest-wins frame buffer for the recognition WebSocket.
+    A receiver task keeps overwriting the slot with the newest frame, so when
+    inference is slower than the camera, stale frames are dropped instead of
+    queueing up in the socket.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.received_at = None
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def put(self, frame):
+        if self.frame is not None:
+            self.dropped += 1
+        self.frame = frame
+        self.received_at = time.perf_counter()
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Wait for the newest frame; returns (frame, received_at) or (None, None) once closed."""
+        await self._ready.wait()
+        if not self.closed:
+            self._ready.clear()
+        frame, received_at = self.frame, self.received_at
+        self.frame = None
+        if frame is None and self.closed:
+            return None, None
+        return frame, received_at
+
+async def receive_latest_frames(websocket: WebSocket, slot: LatestFrameSlot):
+    """Read frames off the socket as fast as they arrive, keeping only the newest."""
+    try:
+        while True:
+            slot.put(await websocket.receive_bytes())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket receive error: {e}")
+    finally:
+        slot.close()
+
 @router.websocket("/ws/recognize/{user_id}")
 async def websocket_recognize(
     websocket: WebSocket,
     user_id: int,
-    token: str = Query(None)
+    token: str = Query(None),
+    target_latency_ms: float = Query(None),
+    envelope: bool = Query(False)
 ):
     # Authenticate
     if not token:
@@ -191,105 +172,71 @@ async def websocket_recognize(
     
     # Get DB session
     db = next(get_db())
+    
+    # Track faces across this connection's frames so people who stay in view
+    # keep their identity without re-running ArcFace every frame
+    tracker = FaceTracker()
+    
+    # Frames are received in the background; inference always runs on the newest one
+    slot = LatestFrameSlot()
+    receiver = asyncio.create_task(receive_latest_frames(websocket, slot))
+
+    # Clients that declare a latency budget get the detector size adapted to it;
+    # the chosen settings are reported in a separate "settings" message
+    controller = DetSizeController(target_latency_ms, initial_size=FACE_DET_SIZE[0]) if target_latency_ms else None
 
     try:
+        if controller:
+            await websocket.send_json(controller.settings())
+
         while True:
-            # Receive image bytes
-            data = await websocket.receive_bytes()
+            # Wait for the newest image bytes
+            data, received_at = await slot.get()
+            if data is None:
+                break
             
-            # Decode image
-            nparr = np.frombuffer(data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # Decode image (reduced scale for large frames, off the event loop)
+            det_size = controller.det_size if controller else FACE_DET_SIZE
+            img = await asyncio.to_thread(decode_for_detection, data, det_size)
 
             if img is None:
                 continue
 
-            # Run recognition in thread pool
-            result = await asyncio.to_thread(recognize_face, face_app, img, user_id=user_id)
+            # Run recognition on the shared inference pool; at most one frame per
+            # connection is in flight, so wait for a slot rather than dropping it
+            timings = {}
+            result = await face_inference.submit(
+                recognize_face_tracked, img, tracker, user_id=user_id, det_size=det_size,
+                timings=timings, priority=PRIORITY_LIVE, wait=True
+            )
+            
+            # The controller sees detection time measured on the worker, not time
+            # spent queued behind enrollment or sync jobs
+            if controller and "detect_ms" in timings and controller.record(timings["detect_ms"]):
+                await websocket.send_json(controller.settings())
             
             if result is None:
                 result = []
 
-            # Enrich results (copy-paste logic from HTTP endpoint for now, can be refactored later)
+            # Enrich results; contact details are cached and last_seen writes coalesced
             if result:
-                from datetime import datetime, timezone
-                from zoneinfo import ZoneInfo
-                from ..models import Interaction, Contact
-                
-                contact_ids = [res["contact_id"] for res in result if res.get("name") != "Unknown" and "contact_id" in res]
-                
-                if contact_ids:
-                    from datetime import timedelta
-
-                    contacts = db.query(Contact).filter(Contact.id.in_(contact_ids)).all()
-                    contact_map = {c.id: c for c in contacts}
-                    
-                    # Optimized: Fetch top interactions per contact
-                    interaction_map = {} # contact_id -> list of summaries
-                    
-                    for cid in contact_ids:
-                        recent = db.query(Interaction).filter(
-                            Interaction.contact_id == cid
-                        ).order_by(Interaction.timestamp.desc()).limit(20).all()
-                        
-                        if recent:
-                            formatted = []
-                            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=1)
-                            
-                            for r in recent:
-                                # Ensure timestamp has timezone info
-                                r_timestamp = r.timestamp
-                                if r_timestamp.tzinfo is None:
-                                    r_timestamp = r_timestamp.replace(tzinfo=timezone.utc)
-                                
-                                if r_timestamp < cutoff_time:
-                                    formatted.append({
-                                        "summary": r.summary,
-                                        "date": r_timestamp.isoformat(),
-                                        "timestamp": r_timestamp.isoformat()
-                                    })
-                                    break # Only want the most recent one that's at least 1h old
-                            
-                            interaction_map[cid] = formatted
+                enrichment_service.enrich(db, user_id, result)
+
+            # Report freshness so clients can monitor lag. With envelope=true every
+            # message carries it, frames without faces included; otherwise the plain
+            # list is kept for older clients and each face carries it
+            latency_ms = round((time.perf_counter() - received_at) * 1000, 1)
+            if envelope:
+                await websocket.send_json({
+                    "results": result,
+                    "latency_ms": latency_ms,
+                    "dropped_frames": slot.dropped
+                })
+                continue
 
-                    for res in result:
-                        if res.get("name") != "Unknown" and "contact_id" in res:
-                            contact_id = res["contact_id"]
-                            contact = contact_map.get(contact_id)
-                            
-                            if contact:
-                                last_seen_time = contact.last_seen
-                                
-                                # Get current time in IST
-                                ist_tz = ZoneInfo("Asia/Kolkata")
-                                current_time_ist = datetime.now(ist_tz)
-                                
-                                # Ensure timezone info - convert to IST if needed
-                                if last_seen_time:
-                                    if last_seen_time.tzinfo is None:
-                                        # Assume UTC if no timezone
-                                        last_seen_time = last_seen_time.replace(tzinfo=timezone.utc)
-                                    # Convert to IST for comparison
-                                    last_seen_time = last_seen_time.astimezone(ist_tz)
-                                
-                                # Filter Last Seen: Only show if at least 1 hour ago
-                                cutoff_time = current_time_ist - timedelta(hours=1)
-                                
-                                if last_seen_time and last_seen_time < cutoff_time:
-                                    res["last_seen_timestamp"] = last_seen_time.isoformat()
-                                else:
-                                    res["last_seen_timestamp"] = None
-                                
-                                # Add history list
-                                history = interaction_map.get(contact_id, [])
-                                res["recent_interactions"] = history
-                                
-                                # Backward compatibility
-                                res["last_conversation_summary"] = history[0]["summary"] if history else None
-                                
-                                contact.last_seen = current_time_ist
-                    
-                    db.commit()
+            for res in result:
+                res["latency_ms"] = latency_ms
+                res["dropped_frames"] = slot.dropped
 
             # Send back result
             await websocket.send_json(result)
@@ -299,4 +246,6 @@ async def websocket_recognize(
     except Exception as e:
         print(f"WebSocket Error: {e}")
     finally:
+        receiver.cancel()
+        enrichment_service.flush(db, user_id)
         db.close()
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from typing import List, Optional, Any
 from pydantic import BaseModel
@@ -8,6 +9,9 @@ from zoneinfo import ZoneInfo
 from ..database import get_db
 from ..models import Interaction, User, Contact
 from ..utils.auth import get_current_user
+from ..services.enrichment_service import enrichment_service
+from ..services.interaction_service import keyword_search_interactions
+from ai_engine.text_embedder import text_embedder
 
 router = APIRouter(
     prefix="/interactions",
@@ -15,6 +19,14 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def get_contact_with_photo_flag(db: Session, contact_id: int):
+    """The contact and whether it has a photo, without loading the deferred legacy photo column."""
+    row = db.query(
+        Contact,
+        or_(Contact.profile_photo_key.isnot(None), Contact.profile_photo.isnot(None)).label("has_photo")
+    ).filter(Contact.id == contact_id).first()
+    return (row[0], row[1]) if row else (None, False)
+
 # Pydantic models
 class InteractionBase(BaseModel):
     contact_id: Optional[int] = None
@@ -57,34 +69,43 @@ def search_interactions(
     """
     try:
         from app.chroma_client import get_conversation_collection
-        collection = get_conversation_collection()
         
-        # Query ChromaDB for similar interactions
-        results = collection.query(
-            query_texts=[query],
-            n_results=limit,
-            where={"user_id": current_user.id}
-        )
+        results = None
+        try:
+            collection = get_conversation_collection()
+            
+            # Query ChromaDB for similar interactions
+            results = collection.query(
+                query_embeddings=text_embedder.embed([query]),
+                n_results=limit,
+                where={"user_id": current_user.id}
+            )
+        except Exception as e:
+            # ChromaDB is down or slow: keep search working with keyword matching
+            print(f"⚠ Semantic search unavailable ({e}); falling back to keyword search")
         
-        if not results or not results['ids'] or not results['ids'][0]:
-            return {"results": [], "count": 0, "query": query}
+        if results is None:
+            interaction_ids = keyword_search_interactions(db, current_user.id, query, limit)
+        else:
+            if not results or not results['ids'] or not results['ids'][0]:
+                return {"results": [], "count": 0, "query": query}
         
-        # Extract interaction IDs from ChromaDB results
-        interaction_ids = []
-        distances = results['distances'][0] if results.get('distances') else []
-        metadatas = results['metadatas'][0] if results.get('metadatas') else []
-        documents = results['documents'][0] if results.get('documents') else []
+            # Extract interaction IDs from ChromaDB results
+            interaction_ids = []
+            distances = results['distances'][0] if results.get('distances') else []
+            metadatas = results['metadatas'][0] if results.get('metadatas') else []
+            documents = results['documents'][0] if results.get('documents') else []
         
-        for i, chroma_id in enumerate(results['ids'][0]):
-            # Extract interaction_id from "interaction_{id}" format
-            if chroma_id.startswith("interaction_"):
-                interaction_id = int(chroma_id.split("_")[1])
-                interaction_ids.append({
-                    "id": interaction_id,
-                    "distance": distances[i] if i < len(distances) else None,
-                    "metadata": metadatas[i] if i < len(metadatas) else {},
-                    "snippet": documents[i][:200] if i < len(documents) else ""
-                })
+            for i, chroma_id in enumerate(results['ids'][0]):
+                # Extract interaction_id from "interaction_{id}" format
+                if chroma_id.startswith("interaction_"):
+                    interaction_id = int(chroma_id.split("_")[1])
+                    interaction_ids.append({
+                        "id": interaction_id,
+                        "distance": distances[i] if i < len(distances) else None,
+                        "metadata": metadatas[i] if i < len(metadatas) else {},
+                        "snippet": documents[i][:200] if i < len(documents) else ""
+                    })
         
         # Fetch full interaction details from database
         base_url = str(request.base_url).rstrip('/')
@@ -103,13 +124,13 @@ def search_interactions(
                 contact_photo_url = None
                 
                 if interaction.contact_id:
-                    contact = db.query(Contact).filter(Contact.id == interaction.contact_id).first()
+                    contact, has_photo = get_contact_with_photo_flag(db, interaction.contact_id)
                     if contact:
                         contact_avatar = contact.avatar
                         contact_relationship = contact.relationship_detail or contact.relationship
                         contact_color = contact.color
                         # Add photo URL if contact has a photo
-                        if contact.profile_photo:
+                        if has_photo:
                             contact_photo_url = f"{base_url}/contacts/{contact.id}/photo"
                 
                 result = {
@@ -136,7 +157,8 @@ def search_interactions(
         return {
             "results": search_results,
             "count": len(search_results),
-            "query": query
+            "query": query,
+            "mode": "semantic" if results is not None else "keyword"
         }
         
     except Exception as e:
@@ -175,13 +197,13 @@ def get_interactions(
     for interaction in interactions:
         resp = InteractionResponse.from_orm(interaction)
         if interaction.contact_id:
-            contact = db.query(Contact).filter(Contact.id == interaction.contact_id).first()
+            contact, has_photo = get_contact_with_photo_flag(db, interaction.contact_id)
             if contact:
                 resp.contact_avatar = contact.avatar
                 resp.contact_relationship = contact.relationship_detail or contact.relationship
                 resp.contact_color = contact.color
                 # Add photo URL if contact has a photo
-                if contact.profile_photo:
+                if has_photo:
                     base_url = str(request.base_url).rstrip('/')
                     resp.contact_photo_url = f"{base_url}/contacts/{contact.id}/photo"
         results.append(resp)
@@ -201,13 +223,13 @@ def get_interaction(
     
     resp = InteractionResponse.from_orm(interaction)
     if interaction.contact_id:
-        contact = db.query(Contact).filter(Contact.id == interaction.contact_id).first()
+        contact, has_photo = get_contact_with_photo_flag(db, interaction.contact_id)
         if contact:
             resp.contact_avatar = contact.avatar
             resp.contact_relationship = contact.relationship_detail or contact.relationship
             resp.contact_color = contact.color
             # Add photo URL if contact has a photo
-            if contact.profile_photo:
+            if has_photo:
                 base_url = str(request.base_url).rstrip('/')
                 resp.contact_photo_url = f"{base_url}/contacts/{contact.id}/photo"
             
@@ -238,10 +260,13 @@ def create_interaction(
     db.commit()
     db.refresh(db_interaction)
     
-    # Index in ChromaDB
+    # Recognition shows the contact's latest interaction, so drop the cached one
+    if db_interaction.contact_id:
+        enrichment_service.invalidate(current_user.id, db_interaction.contact_id)
+    
+    # Index in ChromaDB (queued; embedded in the background)
     try:
-        from app.chroma_client import get_conversation_collection
-        collection = get_conversation_collection()
+        from app.services.chroma_indexer import chroma_indexer
         
         # Prepare text content for embedding
         # We combine summary, full_details, and key_topics
@@ -251,19 +276,15 @@ def create_interaction(
         if db_interaction.key_topics:
             text_content += f"Topics: {', '.join(db_interaction.key_topics)}\n"
         
-        collection.add(
-            ids=[f"interaction_{db_interaction.id}"],
-            documents=[text_content],
-            metadatas=[{
-                "type": "interaction",
-                "interaction_id": db_interaction.id,
-                "user_id": current_user.id,
-                "contact_id": db_interaction.contact_id or -1,
-                "contact_name": db_interaction.contact_name or "Unknown",
-                "timestamp": db_interaction.timestamp.isoformat()
-            }]
-        )
-        print(f"Indexed interaction {db_interaction.id} in ChromaDB")
+        chroma_indexer.enqueue(f"interaction_{db_interaction.id}", text_content, {
+            "type": "interaction",
+            "interaction_id": db_interaction.id,
+            "user_id": current_user.id,
+            "contact_id": db_interaction.contact_id or -1,
+            "contact_name": db_interaction.contact_name or "Unknown",
+            "timestamp": db_interaction.timestamp.isoformat()
+        })
+        print(f"Queued interaction {db_interaction.id} for ChromaDB")
     except Exception as e:
         print(f"Error indexing interaction: {e}")
         # Don't fail the request if indexing fails, just log it
@@ -324,6 +345,7 @@ def sync_interactions_to_chroma(
         if ids:
             collection.upsert(
                 ids=ids,
+                embeddings=text_embedder.embed(documents),
                 documents=documents,
                 metadatas=metadatas
             )
@@ -0,0 +1,172 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+# Where the local backend keeps blobs (resolves to server/data/blobs by default)
+BLOB_STORE_DIR = os.getenv(
+    "BLOB_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "blobs")
+)
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+# Longest-side sizes generated for every stored photo
+PHOTO_THUMBNAIL_SIZES = sorted(int(size) for size in os.getenv("PHOTO_THUMBNAIL_SIZES", "64,128,256").split(","))
+
+
+class LocalBlobBackend:
+    """Blobs as files under a root directory, fanned out by the first two characters of the name."""
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = root
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def get(self, name: str):
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, name: str, data: bytes):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, name: str):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+# Other backends (e.g. object storage) register here under the name used in BLOB_STORE_BACKEND
+BLOB_BACKENDS = {
+    "local": LocalBlobBackend,
+}
+
+
+class PhotoStore:
+    """
+    Content-addressed photo storage: a photo is stored once under the sha256 of
+    its bytes, next to JPEG thumbnails for each of PHOTO_THUMBNAIL_SIZES.
+    Rows keep only the key, so loading a contact never loads image data, and
+    since a key's content never changes it doubles as an HTTP validator.
+    """
+
+    def __init__(self, backend, sizes=PHOTO_THUMBNAIL_SIZES):
+        self.backend = backend
+        self.sizes = sizes
+
+    @staticmethod
+    def key_for(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def exists(self, key: str) -> bool:
+        return self.backend.exists(key)
+
+    def put(self, data: bytes) -> str:
+        """Store a photo and its thumbnails; returns its key. Storing the same bytes twice is a no-op."""
+        key = self.key_for(data)
+        if not self.backend.exists(key):
+            self.backend.put(key, data)
+        for size in self.sizes:
+            if not self.backend.exists(f"{key}.{size}"):
+                self._make_thumbnail(key, data, size)
+        return key
+
+    def get(self, key: str, size: int = None):
+        """
+        Photo bytes for a key: the original when size is None, otherwise the
+        smallest thumbnail at least `size` pixels on its longer side (or the
+        original if no thumbnail is that large). Returns (data, size_served).
+        """
+        if size is not None:
+            size = next((s for s in self.sizes if s >= size), None)
+        if size is None:
+            return self.backend.get(key), None
+
+        thumbnail = self.backend.get(f"{key}.{size}")
+        if thumbnail is None:
+            # Generated on demand for photos stored before this size was configured
+            original = self.backend.get(key)
+            if original is None:
+                return None, size
+            thumbnail = self._make_thumbnail(key, original, size)
+            if thumbnail is None:
+                return original, None
+        return thumbnail, size
+
+    def _make_thumbnail(self, key, data, size):
+        try:
+            img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+            img.thumbnail((size, size))
+            out = io.BytesIO()
+            img.convert("RGB").save(out, format="JPEG", quality=85)
+        except Exception as e:
+            print(f"⚠ Could not create {size}px thumbnail for photo {key}: {e}")
+            return None
+        thumbnail = out.getvalue()
+        self.backend.put(f"{key}.{size}", thumbnail)
+        return thumbnail
+
+
+photo_store = PhotoStore(BLOB_BACKENDS[BLOB_STORE_BACKEND]())
+
+
+def read_contact_photo(contact) -> bytes:
+    """Original photo bytes for a Contact (or a row with profile_photo_key/profile_photo), or None."""
+    if contact.profile_photo_key:
+        return photo_store.get(contact.profile_photo_key)[0]
+    # Not migrated yet: the photo is still in the legacy column
+    return contact.profile_photo
+
+
+def migrate_contact_photos(batch_size: int = 50):
+    """
+    Move photos still stored in contacts.profile_photo into the photo store.
+    Safe to run repeatedly; each batch is committed as it completes.
+    """
+    from sqlalchemy.orm import undefer
+    from ..database import SessionLocal
+    from ..models import Contact
+
+    db = SessionLocal()
+    migrated = 0
+    try:
+        while True:
+            contacts = db.query(Contact).options(undefer(Contact.profile_photo)).filter(
+                Contact.profile_photo.isnot(None),
+                Contact.profile_photo_key.is_(None)
+            ).limit(batch_size).all()
+            if not contacts:
+                break
+
+            for contact in contacts:
+                contact.profile_photo_key = photo_store.put(contact.profile_photo)
+                contact.profile_photo = None
+            db.commit()
+            migrated += len(contacts)
+    except Exception as e:
+        print(f"⚠ Contact photo migration stopped: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+    if migrated:
+        print(f"✓ Moved {migrated} contact photos to the photo store")
+    return migrated
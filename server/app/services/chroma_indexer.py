@@ -0,0 +1,199 @@
+import collections
+import os
+import threading
+import time
+
+from ai_engine.text_embedder import text_embedder
+
+# Documents sent to Chroma per request, and the longest a document waits for a batch to fill
+CHROMA_INDEX_BATCH_SIZE = int(os.getenv("CHROMA_INDEX_BATCH_SIZE", "64"))
+CHROMA_INDEX_FLUSH_INTERVAL = float(os.getenv("CHROMA_INDEX_FLUSH_INTERVAL", "1.0"))
+# Documents held while Chroma is unreachable; beyond this the oldest are dropped
+CHROMA_INDEX_QUEUE_MAX = int(os.getenv("CHROMA_INDEX_QUEUE_MAX", "10000"))
+# Retry delay after a failed flush doubles from the first value up to the second
+CHROMA_INDEX_RETRY_MIN = 1.0
+CHROMA_INDEX_RETRY_MAX = float(os.getenv("CHROMA_INDEX_RETRY_MAX", "60"))
+
+
+def _conversation_collection():
+    from ..chroma_client import get_conversation_collection
+    return get_conversation_collection()
+
+
+# Collections documents can be queued for, by name
+COLLECTIONS = {
+    "conversations": _conversation_collection,
+}
+
+
+class _Document:
+    __slots__ = ("collection", "id", "document", "metadata", "queued_at")
+
+    def __init__(self, collection, doc_id, document, metadata):
+        self.collection = collection
+        self.id = doc_id
+        self.document = document
+        self.metadata = metadata
+        self.queued_at = time.monotonic()
+
+
+class ChromaIndexer:
+    """
+    Background indexing of text documents into Chroma.
+
+    Request handlers enqueue documents and return; a worker thread upserts
+    them in batches of up to batch_size, or whatever has arrived once the
+    oldest document has waited flush_interval seconds. When Chroma is
+    unavailable the batch goes back to the front of the queue and the worker
+    retries with exponential backoff. Upserts keep retries idempotent.
+    """
+
+    def __init__(self, batch_size: int = CHROMA_INDEX_BATCH_SIZE, flush_interval: float = CHROMA_INDEX_FLUSH_INTERVAL,
+                 max_queue: int = CHROMA_INDEX_QUEUE_MAX):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._in_flight = 0
+
+        # Metrics
+        self.indexed = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_flush_at = None
+        self.retry_delay = 0.0
+
+    def start(self):
+        """Start the worker thread (idempotent)."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="chroma-indexer", daemon=True)
+            self._thread.start()
+        print("✓ Chroma indexer started")
+
+    def stop(self, timeout: float = 5.0):
+        """Flush what is queued (giving up after timeout seconds) and stop the worker."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+            if self._queue:
+                print(f"⚠ Chroma indexer stopped with {len(self._queue)} documents not indexed")
+
+    def enqueue(self, doc_id: str, document: str, metadata: dict, collection: str = "conversations"):
+        """Queue one document for indexing; never blocks on Chroma."""
+        self.enqueue_many([(doc_id, document, metadata)], collection)
+
+    def enqueue_many(self, items, collection: str = "conversations"):
+        """Queue (id, document, metadata) tuples for indexing."""
+        if collection not in COLLECTIONS:
+            raise ValueError(f"Unknown Chroma collection: {collection}")
+        with self._cond:
+            for doc_id, document, metadata in items:
+                self._queue.append(_Document(collection, doc_id, document, metadata))
+            overflow = len(self._queue) - self.max_queue
+            for _ in range(max(0, overflow)):
+                self._queue.popleft()
+                self.dropped += 1
+            if overflow > 0:
+                print(f"⚠ Chroma index queue full; dropped {overflow} oldest documents")
+            self._cond.notify_all()
+        self.start()
+
+    def stats(self) -> dict:
+        with self._cond:
+            oldest = self._queue[0].queued_at if self._queue else None
+            return {
+                "running": self._thread is not None,
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                # Seconds the oldest waiting document has been queued
+                "lag_seconds": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+                "indexed": self.indexed,
+                "dropped": self.dropped,
+                "failures": self.failures,
+                "retry_delay": self.retry_delay,
+                "last_error": self.last_error,
+                "last_flush_at": self.last_flush_at,
+            }
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._queue:
+                    waited = time.monotonic() - self._queue[0].queued_at
+                    if len(self._queue) >= self.batch_size or waited >= self.flush_interval or self._stopping:
+                        break
+                    self._cond.wait(self.flush_interval - waited)
+                elif self._stopping:
+                    return None
+                else:
+                    self._cond.wait()
+
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            try:
+                self._flush(batch)
+            except Exception as e:
+                with self._cond:
+                    # Back to the front, in order, to be retried
+                    self._queue.extendleft(reversed(batch))
+                    self._in_flight = 0
+                    self.failures += 1
+                    self.last_error = str(e)
+                    self.retry_delay = min(CHROMA_INDEX_RETRY_MAX, max(CHROMA_INDEX_RETRY_MIN, self.retry_delay * 2))
+                    delay = self.retry_delay
+                    stopping = self._stopping
+                print(f"⚠ Chroma indexing failed ({e}); retrying in {delay:.1f}s")
+                if stopping:
+                    return
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopping, delay)
+                continue
+
+            with self._cond:
+                self._in_flight = 0
+                self.indexed += len(batch)
+                self.retry_delay = 0.0
+                self.last_error = None
+                self.last_flush_at = time.time()
+
+    def _flush(self, batch):
+        by_collection = collections.defaultdict(dict)
+        for doc in batch:
+            # A later write of the same id replaces an earlier one in the batch
+            by_collection[doc.collection][doc.id] = doc
+
+        for name, docs in by_collection.items():
+            docs = list(docs.values())
+            # Embedded here, off the request path (cached per text)
+            embeddings = text_embedder.embed([doc.document for doc in docs])
+            collection = COLLECTIONS[name]()
+            collection.upsert(
+                ids=[doc.id for doc in docs],
+                embeddings=embeddings,
+                documents=[doc.document for doc in docs],
+                metadatas=[doc.metadata for doc in docs]
+            )
+
+
+chroma_indexer = ChromaIndexer()
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import update
+
+from ..models import Contact
+from .interaction_service import get_latest_interactions_before
+
+# How long a contact's cached enrichment (last seen, last interaction) is served
+ENRICHMENT_CACHE_TTL = float(os.getenv("ENRICHMENT_CACHE_TTL", "60"))
+# Minimum seconds between last_seen writes for one contact
+LAST_SEEN_WRITE_INTERVAL = float(os.getenv("LAST_SEEN_WRITE_INTERVAL", "60"))
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+class _Entry:
+    def __init__(self, last_seen, interactions):
+        self.last_seen = last_seen
+        self.interactions = interactions
+        self.loaded_at = time.monotonic()
+        # Sighting not yet written to the database, and when we last wrote one
+        self.pending_seen = None
+        self.written_at = float("-inf")
+
+
+class EnrichmentService:
+    """
+    Adds last-seen and recent-interaction details to recognition results.
+
+    Recognition runs many times a second per client, so contact details are
+    cached per user for ENRICHMENT_CACHE_TTL seconds instead of being queried
+    on every frame, and last_seen is updated in memory on every sighting but
+    written to the database at most once per LAST_SEEN_WRITE_INTERVAL per
+    contact. Routes that create interactions or change contacts call
+    invalidate() so the next frame reloads them.
+    """
+
+    def __init__(self, ttl: float = ENRICHMENT_CACHE_TTL, write_interval: float = LAST_SEEN_WRITE_INTERVAL):
+        self.ttl = ttl
+        self.write_interval = write_interval
+        self._entries = {}  # user_id -> {contact_id: _Entry}
+        self._lock = threading.Lock()
+
+    def invalidate(self, user_id: int, contact_id: int = None):
+        """Drop cached details for one contact, or for all of a user's contacts."""
+        with self._lock:
+            entries = self._entries.get(user_id)
+            if not entries:
+                return
+            if contact_id is None:
+                # Keep unsaved sightings; they are re-attached on reload
+                self._entries[user_id] = {cid: e for cid, e in entries.items() if e.pending_seen}
+                for entry in self._entries[user_id].values():
+                    entry.loaded_at = float("-inf")
+            elif contact_id in entries:
+                entries[contact_id].loaded_at = float("-inf")
+
+    def enrich(self, db, user_id: int, results: list):
+        """
+        Fill last_seen_timestamp, recent_interactions and last_conversation_summary
+        on each recognized result and record the sighting.
+        """
+        contact_ids = list({res["contact_id"] for res in results if res.get("name") != "Unknown" and "contact_id" in res})
+        if not contact_ids:
+            return
+
+        entries = self._get_entries(db, user_id, contact_ids)
+
+        current_time_ist = datetime.now(IST)
+        # Filter Last Seen: Only show if at least 1 hour ago
+        cutoff_time = current_time_ist - timedelta(hours=1)
+
+        for res in results:
+            entry = entries.get(res.get("contact_id")) if res.get("name") != "Unknown" else None
+            if entry is None:
+                continue
+
+            last_seen_time = entry.last_seen
+            if last_seen_time and last_seen_time < cutoff_time:
+                res["last_seen_timestamp"] = last_seen_time.isoformat()
+            else:
+                res["last_seen_timestamp"] = None
+
+            # Add history list
+            history = entry.interactions
+            res["recent_interactions"] = history
+            # Backward compatibility
+            res["last_conversation_summary"] = history[0]["summary"] if history else None
+
+        # Update last_seen to NOW in IST (duplicates of one contact in a frame count once)
+        for contact_id in contact_ids:
+            entry = entries.get(contact_id)
+            if entry is not None:
+                entry.last_seen = current_time_ist
+                entry.pending_seen = current_time_ist
+
+        self._write_last_seen(db, user_id)
+
+    def flush(self, db, user_id: int):
+        """Write all of a user's pending sightings now (e.g. when a stream closes)."""
+        self._write_last_seen(db, user_id, force=True)
+
+    def _get_entries(self, db, user_id, contact_ids):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.setdefault(user_id, {})
+            stale = [cid for cid in contact_ids if cid not in cached or now - cached[cid].loaded_at > self.ttl]
+
+        if stale:
+            loaded = self._load(db, user_id, stale)
+            with self._lock:
+                for cid, entry in loaded.items():
+                    previous = cached.get(cid)
+                    if previous is not None:
+                        # Sightings not yet written are newer than the database
+                        entry.written_at = previous.written_at
+                        if previous.pending_seen:
+                            entry.pending_seen = previous.pending_seen
+                            entry.last_seen = max(entry.last_seen or previous.pending_seen, previous.pending_seen)
+                    cached[cid] = entry
+                for cid in set(stale) - loaded.keys():
+                    # Contact deleted or not owned by this user
+                    cached.pop(cid, None)
+
+        with self._lock:
+            return {cid: cached[cid] for cid in contact_ids if cid in cached}
+
+    def _load(self, db, user_id, contact_ids):
+        # Only the columns needed here; never the profile photo blob
+        rows = db.query(Contact.id, Contact.last_seen).filter(
+            Contact.id.in_(contact_ids),
+            Contact.user_id == user_id
+        ).all()
+
+        # Most recent interaction that's at least 1 hour old, for all contacts in one query
+        latest = get_latest_interactions_before(
+            db, [row.id for row in rows], datetime.now(timezone.utc) - timedelta(hours=1)
+        )
+
+        loaded = {}
+        for row in rows:
+            formatted = []
+            interaction = latest.get(row.id)
+            if interaction:
+                # Ensure timestamp has timezone info
+                r_timestamp = interaction.timestamp
+                if r_timestamp.tzinfo is None:
+                    r_timestamp = r_timestamp.replace(tzinfo=timezone.utc)
+                formatted.append({
+                    "summary": interaction.summary,
+                    "date": r_timestamp.isoformat(),
+                    "timestamp": r_timestamp.isoformat()
+                })
+
+            last_seen_time = row.last_seen
+            if last_seen_time:
+                if last_seen_time.tzinfo is None:
+                    # Assume UTC if no timezone
+                    last_seen_time = last_seen_time.replace(tzinfo=timezone.utc)
+                # Convert to IST for comparison
+                last_seen_time = last_seen_time.astimezone(IST)
+
+            loaded[row.id] = _Entry(last_seen_time, formatted)
+        return loaded
+
+    def _write_last_seen(self, db, user_id, force=False):
+        # Covers every cached contact of the user, so a sighting of someone who
+        # has since left the frame is still written once its interval is up
+        now = time.monotonic()
+        with self._lock:
+            due = {
+                cid: entry for cid, entry in self._entries.get(user_id, {}).items()
+                if entry.pending_seen and (force or now - entry.written_at >= self.write_interval)
+            }
+            writes = {cid: entry.pending_seen for cid, entry in due.items()}
+            for entry in due.values():
+                entry.pending_seen = None
+                entry.written_at = now
+
+        if not writes:
+            return
+
+        try:
+            for contact_id, seen_at in writes.items():
+                db.execute(update(Contact).where(Contact.id == contact_id).values(last_seen=seen_at))
+            db.commit()
+        except Exception as e:
+            print(f"⚠ Failed to update last_seen: {e}")
+            db.rollback()
+
+
+enrichment_service = EnrichmentService()
@@ -0,0 +1,245 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ai_engine.text_embedder import text_embedder
+from ..database import missing_unique_indexes
+from ..models import CONVERSATION_LOG_SOURCE, Contact, Interaction
+
+# Rows per INSERT ... VALUES statement and per existence check
+SYNC_INSERT_CHUNK = 500
+# Documents per Chroma upsert (each batch is embedded in one call)
+SYNC_CHROMA_BATCH = 100
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+def get_latest_interactions_before(db: Session, contact_ids: Iterable[int], cutoff: datetime) -> Dict[int, object]:
+    """
+    For each contact, the most recent interaction strictly older than cutoff.
+
+    One query for any number of contacts: interactions before the cutoff are
+    ranked per contact with ROW_NUMBER() and only the first of each is kept,
+    which the (contact_id, timestamp DESC) index serves directly.
+    Returns {contact_id: row} with row.id, row.contact_id, row.summary and
+    row.timestamp; contacts without such an interaction are absent.
+    """
+    contact_ids = list(set(contact_ids))
+    if not contact_ids:
+        return {}
+
+    ranked = db.query(
+        Interaction.id,
+        Interaction.contact_id,
+        Interaction.summary,
+        Interaction.timestamp,
+        func.row_number().over(
+            partition_by=Interaction.contact_id,
+            order_by=(Interaction.timestamp.desc(), Interaction.id.desc())
+        ).label("rank")
+    ).filter(
+        Interaction.contact_id.in_(contact_ids),
+        Interaction.timestamp < cutoff
+    ).subquery()
+
+    rows = db.query(
+        ranked.c.id,
+        ranked.c.contact_id,
+        ranked.c.summary,
+        ranked.c.timestamp
+    ).filter(ranked.c.rank == 1).all()
+
+    return {row.contact_id: row for row in rows}
+
+
+def sync_conversations(db: Session, user_id: int, conversations: List[dict], chroma_collection=None) -> Dict[str, int]:
+    """
+    Insert locally logged conversations that are not in the database yet as
+    interactions of user_id, and upsert them into the Chroma collection.
+
+    Contacts are resolved by name in one query, already-synced (contact_name,
+    timestamp) pairs are found with one query per chunk, and new rows are
+    inserted SYNC_INSERT_CHUNK at a time. The unique (user_id, contact_name,
+    timestamp) index over log rows makes the insert skip rows another sync
+    added meanwhile, so running it again is a no-op.
+
+    Entries without a usable timestamp are inserted at the current time,
+    unless a log row with the same contact name and transcript exists.
+    Returns {"count": rows inserted, "undated": how many of them had no timestamp}.
+    """
+    if "uq_interactions_log_user_contact_name_timestamp" in missing_unique_indexes:
+        print("⚠ Conversation sync is not fully idempotent: the unique interactions index is missing "
+              "(duplicate rows in the table), so concurrent syncs can insert duplicates")
+
+    # Valid entries keyed by their natural key; duplicates in the log count once
+    pending = {}
+    undated = {}
+    for conv in conversations:
+        profile_id = conv.get("profile_id")
+        transcript = conv.get("transcript")
+        if not profile_id or not transcript:
+            continue
+        try:
+            parsed = datetime.fromisoformat(conv.get("timestamp"))
+        except (TypeError, ValueError):
+            undated.setdefault((profile_id, transcript), conv)
+            continue
+        if parsed.tzinfo is None:
+            # The conversation store writes IST timestamps
+            parsed = parsed.replace(tzinfo=IST)
+        pending.setdefault(_natural_key(profile_id, parsed), (parsed, conv))
+
+    undated_keys = _date_undated_conversations(db, user_id, undated, pending)
+    if not pending:
+        return {"count": 0, "undated": 0}
+
+    names = list({name for name, _ in pending})
+    contact_ids = {}
+    for row in db.query(Contact.id, Contact.name).filter(
+        Contact.user_id == user_id,
+        Contact.name.in_(names),
+        Contact.is_active == True
+    ).order_by(Contact.id):
+        contact_ids.setdefault(row.name, row.id)
+
+    keys = list(pending)
+    inserted = []
+    for i in range(0, len(keys), SYNC_INSERT_CHUNK):
+        chunk = keys[i:i + SYNC_INSERT_CHUNK]
+        existing = {
+            _natural_key(row.contact_name, row.timestamp)
+            for row in db.query(Interaction.contact_name, Interaction.timestamp).filter(
+                Interaction.user_id == user_id,
+                tuple_(Interaction.contact_name, Interaction.timestamp).in_(
+                    [(name, pending[(name, instant)][0]) for name, instant in chunk]
+                )
+            )
+        }
+        values = []
+        for key in chunk:
+            if key in existing:
+                continue
+            name = key[0]
+            timestamp, conv = pending[key]
+            transcript = conv["transcript"]
+            values.append({
+                "user_id": user_id,
+                "contact_id": contact_ids.get(name),
+                "contact_name": name,
+                "summary": transcript[:200] + "..." if len(transcript) > 200 else transcript,
+                "full_details": transcript,
+                "timestamp": timestamp,
+                "source": CONVERSATION_LOG_SOURCE,
+            })
+        if not values:
+            continue
+
+        rows = db.execute(
+            insert(Interaction).values(values).on_conflict_do_nothing().returning(
+                Interaction.id, Interaction.contact_id, Interaction.contact_name, Interaction.timestamp
+            )
+        ).all()
+        db.commit()
+        inserted.extend(rows)
+
+    result = {
+        "count": len(inserted),
+        "undated": sum(1 for row in inserted if _natural_key(row.contact_name, row.timestamp) in undated_keys),
+    }
+    if not inserted:
+        return result
+
+    from .enrichment_service import enrichment_service
+    for contact_id in {row.contact_id for row in inserted if row.contact_id}:
+        enrichment_service.invalidate(user_id, contact_id)
+
+    if chroma_collection is not None:
+        for i in range(0, len(inserted), SYNC_CHROMA_BATCH):
+            batch = inserted[i:i + SYNC_CHROMA_BATCH]
+            convs = [pending[_natural_key(row.contact_name, row.timestamp)][1] for row in batch]
+            try:
+                chroma_collection.upsert(
+                    ids=[f"interaction_{row.id}" for row in batch],
+                    embeddings=text_embedder.embed([conv["transcript"] for conv in convs]),
+                    documents=[conv["transcript"] for conv in convs],
+                    metadatas=[{
+                        "type": "conversation",
+                        "interaction_id": row.id,
+                        "user_id": user_id,
+                        "contact_id": row.contact_id or -1,
+                        "contact_name": row.contact_name,
+                        "timestamp": conv.get("timestamp") or row.timestamp.isoformat()
+                    } for row, conv in zip(batch, convs)]
+                )
+            except Exception as e:
+                print(f"Error adding to ChromaDB: {e}")
+
+    return result
+
+
+def _date_undated_conversations(db: Session, user_id: int, undated: Dict[tuple, dict], pending: dict) -> set:
+    """
+    Add log entries without a timestamp to `pending` at the current time,
+    skipping those already synced (same contact name and transcript in a log
+    row). Returns the natural keys they were given.
+    """
+    if not undated:
+        return set()
+
+    items = list(undated)
+    synced = set()
+    for i in range(0, len(items), SYNC_INSERT_CHUNK):
+        chunk = items[i:i + SYNC_INSERT_CHUNK]
+        synced.update(
+            tuple(row) for row in db.query(Interaction.contact_name, Interaction.full_details).filter(
+                Interaction.user_id == user_id,
+                Interaction.source == CONVERSATION_LOG_SOURCE,
+                tuple_(Interaction.contact_name, Interaction.full_details).in_(chunk)
+            )
+        )
+
+    now = datetime.now(IST)
+    keys = set()
+    for n, (name, transcript) in enumerate(item for item in items if item not in synced):
+        # A microsecond apart, so two undated entries of one contact never share a natural key
+        timestamp = now + timedelta(microseconds=n)
+        key = _natural_key(name, timestamp)
+        pending.setdefault(key, (timestamp, undated[(name, transcript)]))
+        keys.add(key)
+    return keys
+
+
+def keyword_search_interactions(db: Session, user_id: int, query: str, limit: int = 10) -> List[dict]:
+    """
+    Fallback for semantic search while ChromaDB is unavailable: the newest
+    interactions whose summary, details or contact name contain the query.
+    Returns hits shaped like the semantic ones (no distance).
+    """
+    pattern = f"%{query.strip()}%"
+    interactions = db.query(Interaction).filter(
+        Interaction.user_id == user_id,
+        (Interaction.summary.ilike(pattern)
+         | Interaction.full_details.ilike(pattern)
+         | Interaction.contact_name.ilike(pattern))
+    ).order_by(Interaction.timestamp.desc()).limit(limit).all()
+
+    return [
+        {
+            "id": interaction.id,
+            "distance": None,
+            "metadata": {},
+            "snippet": (interaction.full_details or interaction.summary or "")[:200]
+        }
+        for interaction in interactions
+    ]
+
+
+def _natural_key(contact_name, timestamp):
+    # Same instant compares equal whatever zone it was written or read back in
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return contact_name, timestamp.astimezone(timezone.utc)
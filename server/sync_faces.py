@@ -1,7 +1,13 @@
 """
 Utility script to sync face embeddings from database contacts
 Run this after adding contacts with photos to update the face recognition database
+
+Usage:
+    python sync_faces.py                  # full: re-embed every photo
+    python sync_faces.py --incremental    # only new or changed photos
+    python sync_faces.py --workers 4      # embed across 4 processes
 """
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
@@ -14,19 +20,41 @@ load_dotenv()
 from ai_engine.face_engine import load_models, sync_embeddings_from_db
 from app.database import SessionLocal
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sync face embeddings from database contacts to ChromaDB")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--full", action="store_true", help="Re-embed every contact photo (default)")
+    mode.add_argument("--incremental", action="store_true", help="Skip photos already indexed by the current model")
+    parser.add_argument("--workers", type=int, default=0, help="Number of embedding processes (0 = embed in this process)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Contacts per database page and ChromaDB upsert")
+    return parser.parse_args()
+
 def main():
-    print("Loading face recognition models...")
-    face_app = load_models()
+    args = parse_args()
+    
+    face_app = None
+    if args.workers == 0:
+        print("Loading face recognition models...")
+        face_app = load_models()
     
     print("Connecting to the database...")
     db = SessionLocal()
     
     try:
-        print("Syncing face embeddings from database contacts...")
-        result = sync_embeddings_from_db(face_app, db)
+        mode = "incremental" if args.incremental else "full"
+        print(f"Syncing face embeddings from database contacts ({mode}, {args.workers or 'in-process'} workers)...")
+        result = sync_embeddings_from_db(
+            face_app,
+            db,
+            incremental=args.incremental,
+            workers=args.workers,
+            batch_size=args.batch_size
+        )
         
         if result.get("success"):
             print(f"\n✓ Successfully synced {result['count']} face embeddings!")
+            print(f"  Skipped (unchanged): {result['skipped']}, no face found: {result['failed']}")
+            print(f"  {result['elapsed_seconds']}s, {result['photos_per_second']} photos/s")
         else:
             print(f"\n✗ Error: {result.get('error')}")
     finally:
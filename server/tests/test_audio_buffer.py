@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from ai_engine.asr.audio_buffer import AudioRingBuffer
+
+
+def _samples(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_window_keeps_newest_samples_across_wraparound():
+    ring = AudioRingBuffer(4)
+    ring.append(_samples(1, 2, 3))
+    ring.append(_samples(4, 5, 6))
+
+    assert ring.window().tolist() == [3, 4, 5, 6]
+    assert len(ring) == 4
+    assert ring.energy == pytest.approx(9 + 16 + 25 + 36)
+
+
+def test_chunk_larger_than_capacity_keeps_its_tail():
+    ring = AudioRingBuffer(3)
+    ring.append(_samples(9, 9))
+
+    ring.append(_samples(1, 2, 3, 4, 5))
+
+    assert ring.window().tolist() == [3, 4, 5]
+    assert ring.energy == pytest.approx(9 + 16 + 25)
+
+
+def test_matches_a_naive_window_over_many_appends():
+    rng = np.random.default_rng(0)
+    ring = AudioRingBuffer(50)
+    history = np.zeros(0, dtype=np.float32)
+
+    for _ in range(3000):
+        chunk = rng.standard_normal(rng.integers(0, 70)).astype(np.float32)
+        ring.append(chunk)
+        history = np.concatenate([history, chunk])[-50:]
+
+        np.testing.assert_array_equal(ring.window(), history)
+        assert ring.energy == pytest.approx(float(np.dot(history, history)), rel=1e-4, abs=1e-4)
+
+
+def test_window_is_a_read_only_view():
+    ring = AudioRingBuffer(4)
+    ring.append(_samples(1, 2))
+
+    window = ring.window()
+
+    assert not window.flags.writeable
+    assert not window.flags.owndata
+
+
+def test_rms_and_clear():
+    ring = AudioRingBuffer(4)
+    assert ring.rms() == 0.0
+
+    ring.append(_samples(3, -3, 3, -3))
+    assert ring.rms() == pytest.approx(3.0)
+
+    ring.clear()
+    assert len(ring) == 0
+    assert ring.rms() == 0.0
+    ring.append(_samples(1))
+    assert ring.window().tolist() == [1]
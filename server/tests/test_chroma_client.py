@@ -0,0 +1,101 @@
+import types
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from app import chroma_client
+from app.chroma_client import ChromaUnavailableError, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable monotonic clock for the breaker's open/half-open timing."""
+    now = [1000.0]
+    monkeypatch.setattr(chroma_client, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _fail(breaker, error=None):
+    with pytest.raises(Exception):
+        with breaker.guard():
+            raise error or ConnectionError("connection refused")
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    _fail(breaker)
+    _fail(breaker)
+    assert breaker.state == "closed"
+
+    _fail(breaker)
+
+    assert breaker.state == "open"
+    with pytest.raises(ChromaUnavailableError, match="connection refused"):
+        with breaker.guard():
+            pytest.fail("call made while the circuit is open")
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    _fail(breaker)
+    with breaker.guard():
+        pass
+    _fail(breaker)
+
+    assert breaker.state == "closed"
+    assert breaker.stats()["consecutive_failures"] == 1
+
+
+def test_caller_errors_do_not_count(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+
+    _fail(breaker, ValueError("bad where clause"))
+    _fail(breaker, TypeError("bad argument"))
+
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    _fail(breaker)
+    clock[0] += 30
+
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
+    # Only one trial at a time; everyone else still fails fast
+    with pytest.raises(ChromaUnavailableError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+
+
+def test_failed_trial_reopens_for_a_full_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        _fail(breaker)
+    clock[0] += 30
+
+    # A single failure is enough while half-open
+    _fail(breaker, TimeoutError("timed out"))
+
+    assert breaker.state == "open"
+    assert breaker.stats()["last_error"] == "timed out"
+    clock[0] += 29
+    assert breaker.state == "open"
+    clock[0] += 1
+    assert breaker.state == "half_open"
+
+
+def test_trial_without_a_verdict_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    _fail(breaker)
+    clock[0] += 30
+
+    _fail(breaker, ValueError("bad argument"))
+
+    # Still half-open, and the next call may be the trial
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
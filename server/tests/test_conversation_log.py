@@ -0,0 +1,71 @@
+import json
+
+from ai_engine.asr.conversation_log import ConversationLog, migrate_json_conversations
+
+
+def _entry(profile_id, text):
+    return {"profile_id": profile_id, "text": text}
+
+
+def test_append_and_read_by_profile(tmp_path):
+    log = ConversationLog(str(tmp_path / "log.jsonl"))
+    log.append(_entry("p1", "hello"))
+    log.extend([_entry("p2", "hi"), _entry("p1", "naïve café")])
+
+    assert len(log) == 3
+    assert [e["text"] for e in log.read()] == ["hello", "hi", "naïve café"]
+    assert [e["text"] for e in log.read("p1")] == ["hello", "naïve café"]
+    assert log.read("missing") == []
+
+
+def test_index_is_rebuilt_on_reopen(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    first = ConversationLog(path)
+    first.extend([_entry("p1", "a"), _entry("p2", "b"), _entry("p1", "c")])
+    first.sync()
+
+    reopened = ConversationLog(path)
+
+    assert len(reopened) == 3
+    assert [e["text"] for e in reopened.read("p1")] == ["a", "c"]
+
+
+def test_partial_last_line_is_truncated_on_open(tmp_path):
+    path = tmp_path / "log.jsonl"
+    complete = json.dumps(_entry("p1", "kept")) + "\n"
+    path.write_bytes(complete.encode("utf-8") + b'{"profile_id": "p1", "te')
+
+    log = ConversationLog(str(path))
+
+    assert path.read_bytes() == complete.encode("utf-8")
+    assert len(log) == 1
+
+    # New entries start on a clean line and are indexed at the right offset
+    log.append(_entry("p1", "after"))
+    assert [e["text"] for e in log.read("p1")] == ["kept", "after"]
+    assert [e["text"] for e in log.read()] == ["kept", "after"]
+
+
+def test_unreadable_complete_line_is_skipped_not_truncated(tmp_path):
+    path = tmp_path / "log.jsonl"
+    lines = [json.dumps(_entry("p1", "a")), "not json", json.dumps(_entry("p1", "b"))]
+    path.write_text("\n".join(lines) + "\n")
+
+    log = ConversationLog(str(path))
+
+    assert len(log) == 2
+    assert [e["text"] for e in log.read("p1")] == ["a", "b"]
+    assert path.read_text().count("\n") == 3
+
+
+def test_migrate_json_conversations(tmp_path):
+    json_path = tmp_path / "conversations.json"
+    log_path = tmp_path / "conversations.jsonl"
+    json_path.write_text(json.dumps([_entry("p1", "a"), _entry("p2", "b")]))
+
+    assert migrate_json_conversations(str(json_path), str(log_path)) == 2
+
+    assert not json_path.exists()
+    assert (tmp_path / "conversations.json.migrated").exists()
+    assert [e["text"] for e in ConversationLog(str(log_path)).read()] == ["a", "b"]
+    assert migrate_json_conversations(str(json_path), str(log_path)) == 0
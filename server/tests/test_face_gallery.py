@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from ai_engine.face_gallery import FaceGallery
+
+
+def _gallery():
+    return FaceGallery(
+        ids=["a", "b"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+        metadatas=[{"contact_id": 1, "name": "Alice"}, {"contact_id": 2, "name": "Bob"}],
+    )
+
+
+def test_match_picks_most_similar_entry_per_query():
+    matches = _gallery().match([[0.1, 0.9, 0.0], [0.9, 0.1, 0.0]], threshold=0.5)
+
+    assert [m["name"] for m, _ in matches] == ["Bob", "Alice"]
+    for _, score in matches:
+        assert score == pytest.approx(0.9 / np.sqrt(0.82))
+
+
+def test_match_normalizes_queries_and_gallery():
+    gallery = FaceGallery(["a"], [[10.0, 0.0]], [{"name": "Alice"}])
+
+    (metadata, score), = gallery.match([[0.5, 0.0]], threshold=0.9)
+
+    assert metadata["name"] == "Alice"
+    assert score == pytest.approx(1.0)
+
+
+def test_match_threshold_is_exclusive():
+    # cos(45°) for both entries: the best score is reported but not a match
+    (metadata, score), = _gallery().match([[1.0, 1.0, 0.0]], threshold=np.sqrt(0.5) + 1e-6)
+    assert metadata is None
+    assert score == pytest.approx(np.sqrt(0.5))
+
+    (metadata, _), = _gallery().match([[1.0, 1.0, 0.0]], threshold=0.7)
+    assert metadata is not None
+
+
+def test_match_on_empty_gallery_or_no_queries():
+    assert FaceGallery().match([[1.0, 0.0]], threshold=0.5) == [(None, 0.0)]
+    assert _gallery().match([], threshold=0.5) == []
+
+
+def test_upserted_replaces_ids_and_leaves_original_untouched():
+    gallery = _gallery()
+
+    updated = gallery.upserted(["a", "c"], [[0.0, 0.0, 1.0], [0.0, 0.0, 2.0]],
+                               [{"contact_id": 1, "name": "Alice"}, {"contact_id": 3, "name": "Cara"}])
+
+    assert sorted(updated.ids) == ["a", "b", "c"]
+    assert len(gallery) == 2
+    (metadata, score), = updated.match([[1.0, 0.0, 0.0]], threshold=0.5)
+    assert metadata is None  # "a" no longer points along x
+    (metadata, _), = gallery.match([[1.0, 0.0, 0.0]], threshold=0.5)
+    assert metadata["name"] == "Alice"
+
+
+def test_without_contact_and_metadata_update():
+    gallery = _gallery()
+
+    assert gallery.without_contact(99) is gallery
+    remaining = gallery.without_contact(1)
+    assert remaining.ids == ["b"]
+    assert FaceGallery(["a"], [[1.0]], [{"contact_id": 1}]).without_contact(1).match([[1.0]], 0.5) == [(None, 0.0)]
+
+    renamed = gallery.with_contact_metadata(2, {"name": "Robert"})
+    assert [m["name"] for m in renamed.metadatas] == ["Alice", "Robert"]
+    assert gallery.metadatas[1]["name"] == "Bob"
+    assert renamed.loaded_at == gallery.loaded_at
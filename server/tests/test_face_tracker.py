@@ -0,0 +1,83 @@
+import pytest
+
+from ai_engine.face_tracker import FaceTracker, _centroid_distance, _iou
+
+
+def test_iou():
+    assert _iou([0, 0, 10, 10], [0, 0, 10, 10]) == pytest.approx(1.0)
+    assert _iou([0, 0, 10, 10], [5, 0, 15, 10]) == pytest.approx(50 / 150)
+    assert _iou([0, 0, 10, 10], [10, 0, 20, 10]) == 0.0
+
+
+def test_centroid_distance_is_relative_to_width():
+    assert _centroid_distance([0, 0, 10, 10], [3, 4, 13, 14]) == pytest.approx(0.5)
+
+
+def test_overlapping_box_keeps_its_track():
+    tracker = FaceTracker()
+    first, = tracker.update([[0, 0, 100, 100]])
+
+    second, = tracker.update([[10, 0, 110, 100]])
+
+    assert second is first
+    assert second.bbox == [10, 0, 110, 100]
+
+
+def test_fast_mover_is_reassociated_by_centroid():
+    tracker = FaceTracker(iou_threshold=0.3, max_centroid_distance=0.7)
+    first, = tracker.update([[0, 0, 100, 100]])
+
+    # IoU 0.25 is below the threshold, but the center moved only 0.6 widths
+    moved, = tracker.update([[60, 0, 160, 100]])
+    assert moved is first
+
+    # Too far for either rule: a new track
+    far, = tracker.update([[300, 0, 400, 100]])
+    assert far is not first
+
+
+def test_highest_iou_detection_takes_the_track():
+    tracker = FaceTracker()
+    track, = tracker.update([[0, 0, 100, 100]])
+
+    # Both overlap the track; the closer one gets it, the other starts a new track
+    looser, closer = tracker.update([[30, 0, 130, 100], [10, 0, 110, 100]])
+
+    assert closer is track
+    assert looser is not track
+    assert len(tracker.tracks) == 2
+
+
+def test_track_is_dropped_after_max_missed_frames():
+    tracker = FaceTracker(max_missed=2)
+    track, = tracker.update([[0, 0, 100, 100]])
+
+    tracker.update([])
+    tracker.update([])
+    assert track in tracker.tracks
+    tracker.update([])
+    assert track not in tracker.tracks
+
+    again, = tracker.update([[0, 0, 100, 100]])
+    assert again.track_id != track.track_id
+
+
+def test_needs_identity():
+    tracker = FaceTracker(refresh_interval=3, min_confidence=0.5)
+    track, = tracker.update([[0, 0, 100, 100]])
+    assert tracker.needs_identity(track)
+
+    tracker.set_identity(track, {"name": "Unknown", "confidence": 0.9})
+    assert tracker.needs_identity(track)
+
+    tracker.set_identity(track, {"name": "Alice", "confidence": 0.4})
+    assert tracker.needs_identity(track)
+
+    tracker.set_identity(track, {"name": "Alice", "confidence": 0.8})
+    assert not tracker.needs_identity(track)
+    tracker.update([[0, 0, 100, 100]])
+    tracker.update([[0, 0, 100, 100]])
+    assert tracker.identity_age(track) == 2
+    assert not tracker.needs_identity(track)
+    tracker.update([[0, 0, 100, 100]])
+    assert tracker.needs_identity(track)
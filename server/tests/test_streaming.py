@@ -0,0 +1,94 @@
+import numpy as np
+
+from ai_engine.asr.streaming import HypothesisBuffer, OnlineASRProcessor
+
+
+def _texts(words):
+    return [w[2] for w in words]
+
+
+def test_first_pass_commits_nothing():
+    hypothesis = HypothesisBuffer()
+    hypothesis.insert([(0.0, 0.4, "hello"), (0.4, 0.8, "world")], offset=0.0)
+
+    assert hypothesis.flush() == []
+    assert _texts(hypothesis.complete()) == ["hello", "world"]
+
+
+def test_agreed_prefix_is_committed():
+    hypothesis = HypothesisBuffer()
+    hypothesis.insert([(0.0, 0.4, "hello"), (0.4, 0.8, "word")], offset=0.0)
+    hypothesis.flush()
+
+    hypothesis.insert([(0.0, 0.4, "hello"), (0.4, 0.8, "world"), (0.8, 1.2, "again")], offset=0.0)
+    committed = hypothesis.flush()
+
+    # Agreement stops at the first differing word
+    assert _texts(committed) == ["hello"]
+    assert hypothesis.last_committed_time == 0.4
+    assert _texts(hypothesis.complete()) == ["world", "again"]
+
+
+def test_insert_shifts_words_to_session_time_and_skips_committed():
+    hypothesis = HypothesisBuffer()
+    hypothesis.insert([(0.0, 0.5, "one"), (0.5, 1.0, "two")], offset=10.0)
+    hypothesis.flush()
+    hypothesis.insert([(0.0, 0.5, "one"), (0.5, 1.0, "two")], offset=10.0)
+
+    assert hypothesis.flush() == [(10.0, 10.5, "one"), (10.5, 11.0, "two")]
+
+    # A later pass that still contains the committed words only keeps what follows them
+    hypothesis.insert([(0.0, 0.5, "one"), (0.5, 1.0, "two"), (1.0, 1.5, "three")], offset=10.0)
+    assert _texts(hypothesis.new) == ["three"]
+
+
+def test_repeated_ngram_at_the_overlap_is_dropped():
+    hypothesis = HypothesisBuffer()
+    for _ in range(2):
+        hypothesis.insert([(0.0, 0.5, "hello"), (0.5, 1.0, "world")], offset=0.0)
+        hypothesis.flush()
+    assert hypothesis.last_committed_time == 1.0
+
+    # The overlap re-decodes "world" with a slightly earlier start
+    hypothesis.insert([(0.95, 1.2, "world"), (1.2, 1.6, "again")], offset=0.0)
+
+    assert _texts(hypothesis.new) == ["again"]
+
+
+def test_pop_committed_drops_words_ending_before_time():
+    hypothesis = HypothesisBuffer()
+    for _ in range(2):
+        hypothesis.insert([(0.0, 0.5, "a"), (0.5, 1.0, "b"), (1.0, 1.5, "c")], offset=0.0)
+        hypothesis.flush()
+
+    hypothesis.pop_committed(1.0)
+
+    assert _texts(hypothesis.committed_in_buffer) == ["c"]
+
+
+class _ScriptedEngine:
+    """Returns the next scripted word list on each transcribe_words() call."""
+
+    def __init__(self, passes):
+        self.passes = list(passes)
+
+    def transcribe_words(self, audio, prompt="", vad_filter=True):
+        return self.passes.pop(0)
+
+
+def test_processor_commits_after_two_agreeing_passes_and_finalizes_the_rest():
+    engine = _ScriptedEngine([
+        [(0.0, 0.4, "good")],
+        [(0.0, 0.4, "good"), (0.4, 0.9, "morning")],
+        [(0.0, 0.4, "good"), (0.4, 0.9, "morning"), (0.9, 1.3, "everyone")],
+    ])
+    processor = OnlineASRProcessor(engine, sample_rate=100)
+    processor.insert_audio_chunk(np.zeros(100, dtype=np.float32))
+
+    assert processor.process_iter() == ("", "good")
+    assert processor.process_iter() == ("good", "morning")
+
+    processor.insert_audio_chunk(np.zeros(50, dtype=np.float32))
+    assert processor.finalize() == "morning everyone"
+    assert processor.committed_text() == "good morning everyone"
+    assert not processor.has_pending()